@@ -0,0 +1,136 @@
+"""合并写入的用户最后活动时间
+
+前端定时访问未读数接口，中间件借此记录用户的最后活动时间。判断是否在线只需要几分钟的精度，
+每个请求都写一次 User 行会在 SQLite 上反复抢占写锁。这里先把活动时间暂存在进程内存中，
+每隔 ACTIVITY_FLUSH_INTERVAL 秒用一条 UPDATE 批量写入；数据库中的值足够新时直接跳过。
+
+暂存区属于各个进程：有暂存的记录时会启动一个后台定时器，最迟在间隔结束时写入，
+不依赖之后是否还有请求；进程正常退出时也会写入。其他进程的 online_users() 只能看到
+已经写入数据库的记录，因此多进程部署时在线状态最多滞后 ACTIVITY_FLUSH_INTERVAL 秒。
+"""
+import atexit
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import User
+
+# 最后活动时间在该时间范围内（秒）视为在线
+ONLINE_WINDOW = 180
+# 数据库中的最后活动时间距今不超过该值（秒）时不再记录
+ACTIVITY_FRESHNESS = 60
+
+# 用户ID -> 尚未写入数据库的最后活动时间
+_pending = {}
+_lock = threading.Lock()
+_last_flush = None
+# 等待写入暂存记录的后台定时器
+_timer = None
+
+
+def _flush_interval():
+    return timedelta(seconds=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 30))
+
+
+def record_activity(user, now=None):
+    """记录用户的活动时间，距上次写入超过 ACTIVITY_FLUSH_INTERVAL 秒时批量写入数据库"""
+    now = now or timezone.now()
+    if user.last_activity and (now - user.last_activity).total_seconds() < ACTIVITY_FRESHNESS:
+        return
+    with _lock:
+        _pending[user.id] = now
+        due = _last_flush is None or now - _last_flush >= _flush_interval()
+        if not due:
+            _schedule_flush()
+    if due:
+        flush_activity(now)
+
+
+def _schedule_flush():
+    """启动后台定时器，在 ACTIVITY_FLUSH_INTERVAL 秒后写入暂存的记录（调用时需持有 _lock）"""
+    global _timer
+    if _timer is not None or _flush_interval() <= timedelta(0):
+        return
+    _timer = threading.Timer(_flush_interval().total_seconds(), _flush_from_timer)
+    _timer.daemon = True
+    _timer.start()
+
+
+def _flush_from_timer():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush_activity()
+    except Exception:
+        print("后台写入最后活动时间失败:")
+        traceback.print_exc()
+    finally:
+        # 定时器线程不经过请求流程，需要自行关闭数据库连接
+        connection.close()
+
+
+def flush_activity(now=None):
+    """把暂存的活动时间用一条 UPDATE 写入数据库，返回写入的用户数"""
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = now or timezone.now()
+    if not pending:
+        return 0
+    try:
+        User.objects.filter(id__in=pending).update(last_activity=Case(
+            *[When(id=user_id, then=Value(seen_at)) for user_id, seen_at in pending.items()],
+            output_field=DateTimeField(),
+        ))
+    except Exception:
+        # 写入失败时放回暂存区（保留较新的时间），稍后重试
+        with _lock:
+            for user_id, seen_at in pending.items():
+                if _pending.get(user_id) is None or _pending[user_id] < seen_at:
+                    _pending[user_id] = seen_at
+            _schedule_flush()
+        raise
+    return len(pending)
+
+
+@atexit.register
+def _flush_at_exit():
+    """进程退出前写入暂存的记录"""
+    try:
+        flush_activity()
+    except Exception:
+        traceback.print_exc()
+
+
+def discard_pending():
+    """丢弃暂存的记录并取消后台定时器（测试中使用）"""
+    global _timer
+    with _lock:
+        _pending.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+
+
+def last_seen(user):
+    """用户的最后活动时间，包括尚未写入数据库的记录"""
+    with _lock:
+        pending = _pending.get(user.id)
+    if pending and (not user.last_activity or pending > user.last_activity):
+        return pending
+    return user.last_activity
+
+
+def online_users(queryset=None, now=None):
+    """最后活动时间在 ONLINE_WINDOW 秒内的用户，查询前先写入暂存的活动时间"""
+    flush_activity()
+    now = now or timezone.now()
+    queryset = User.objects.all() if queryset is None else queryset
+    return queryset.filter(last_activity__gte=now - timedelta(seconds=ONLINE_WINDOW))
@@ -13,3 +13,4 @@ admin.site.register(Notification)
 admin.site.register(DeviceLogin)
 admin.site.register(Rating)
 admin.site.register(RatingComment)
+admin.site.register(ApiToken)
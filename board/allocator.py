@@ -0,0 +1,52 @@
+"""作业ID分配：优先复用已删除作业留下的最小ID"""
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import Assignment, FreeAssignmentId
+
+# 并发创建发生冲突时的最大重试次数
+MAX_ALLOCATE_ATTEMPTS = 10
+
+
+def _claim_free_id():
+    """从空闲表中取出最小的ID，没有可用ID时返回None
+
+    空闲表以ID为主键，取最小值走索引，删除时根据影响行数判断是否被其他请求抢先取走。
+    """
+    while True:
+        free_id = FreeAssignmentId.objects.order_by('id').values_list('id', flat=True).first()
+        if free_id is None:
+            return None
+        deleted, _ = FreeAssignmentId.objects.filter(id=free_id).delete()
+        if deleted:
+            return free_id
+
+
+def allocate_assignment_id():
+    """分配一个可用的作业ID（需在事务中调用，以便插入失败时回滚）"""
+    free_id = _claim_free_id()
+    if free_id is not None:
+        return free_id
+    max_id = Assignment.objects.aggregate(max_id=Max('id'))['max_id']
+    return (max_id or 0) + 1
+
+
+def save_assignment_with_free_id(assignment):
+    """使用可复用的最小ID保存新作业
+
+    分配和插入在同一个事务中完成，并发请求拿到相同ID时插入会失败并回滚，然后重新分配。
+    """
+    for _ in range(MAX_ALLOCATE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                assignment.id = allocate_assignment_id()
+                # 使用force_insert确保使用指定ID
+                assignment.save(force_insert=True)
+            return assignment
+        except IntegrityError:
+            # 空闲表中的ID已被占用时将其移除，避免反复冲突
+            if Assignment.objects.filter(id=assignment.id).exists():
+                FreeAssignmentId.objects.filter(id=assignment.id).delete()
+            assignment.id = None
+    raise IntegrityError('无法为作业分配可用ID，请稍后再试')
+
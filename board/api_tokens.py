@@ -0,0 +1,99 @@
+"""API令牌：为桌面客户端签发按设备区分的令牌，避免每次请求都执行密码哈希"""
+import hashlib
+import secrets
+import threading
+import time
+
+from django.utils import timezone
+
+from .models import ApiToken, User
+
+# 进程内令牌缓存的有效期（秒）。吊销令牌会立即清除本进程的缓存，
+# 其他进程中的缓存最多在该时间后失效
+TOKEN_CACHE_TTL = 300
+
+# 令牌哈希 -> (用户ID, 过期时间)。只缓存用户ID，每次命中都重新读取用户并检查是否仍然有效
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
+
+def hash_token(raw_token):
+    """计算令牌的哈希值，数据库中只保存哈希"""
+    return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+
+
+def issue_token(user, name=''):
+    """为用户签发新令牌，返回 (令牌记录, 原始令牌)，原始令牌只在此时可见"""
+    raw_token = secrets.token_urlsafe(32)
+    token = ApiToken.objects.create(user=user, name=name[:100], key_hash=hash_token(raw_token))
+    return token, raw_token
+
+
+def revoke_token(raw_token):
+    """吊销令牌，返回是否找到并删除了令牌"""
+    key_hash = hash_token(raw_token)
+    with _token_cache_lock:
+        _token_cache.pop(key_hash, None)
+    deleted, _ = ApiToken.objects.filter(key_hash=key_hash).delete()
+    return deleted > 0
+
+
+def authenticate_token(raw_token):
+    """根据令牌获取用户，令牌无效时返回None
+
+    命中缓存时只按主键读取用户（停用的用户不再通过认证）；未命中时按哈希值的唯一索引查询，
+    并顺便更新最后使用时间。
+    """
+    if not raw_token:
+        return None
+    key_hash = hash_token(raw_token)
+    now = time.monotonic()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(key_hash)
+    if cached and cached[1] > now:
+        user = User.objects.filter(id=cached[0], is_active=True).first()
+        if user is not None:
+            return user
+        with _token_cache_lock:
+            _token_cache.pop(key_hash, None)
+        return None
+
+    token = ApiToken.objects.select_related('user').filter(key_hash=key_hash).first()
+    if token is None or not token.user.is_active:
+        with _token_cache_lock:
+            _token_cache.pop(key_hash, None)
+        return None
+
+    ApiToken.objects.filter(id=token.id).update(last_used_at=timezone.now())
+    with _token_cache_lock:
+        _token_cache[key_hash] = (token.user_id, now + TOKEN_CACHE_TTL)
+    return token.user
+
+
+def get_request_token(request):
+    """从请求头中读取令牌，支持 Authorization: Token <令牌> 和 X-Api-Token: <令牌>"""
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if authorization.startswith('Token '):
+        return authorization[len('Token '):].strip()
+    return request.META.get('HTTP_X_API_TOKEN', '').strip()
+
+
+def forget_user_tokens(user_id):
+    """清除本进程中该用户所有令牌的缓存"""
+    with _token_cache_lock:
+        for key_hash in [key for key, (cached_id, _) in _token_cache.items() if cached_id == user_id]:
+            del _token_cache[key_hash]
+
+
+def revoke_user_tokens(user_id):
+    """吊销用户的全部令牌（修改密码后调用），返回吊销的数量"""
+    forget_user_tokens(user_id)
+    deleted, _ = ApiToken.objects.filter(user_id=user_id).delete()
+    return deleted
+
+
+def clear_token_cache():
+    """清空进程内令牌缓存"""
+    with _token_cache_lock:
+        _token_cache.clear()
@@ -0,0 +1,99 @@
+"""进程内的有界后台任务队列
+
+登录时记录设备信息需要解析User-Agent、查询IP位置（网络请求，最长等待5秒）并写入数据库，
+这些都不影响登录结果，可以交给后台线程处理，登录请求直接返回。队列长度有上限，
+队列已满时 submit 返回 False，由调用方决定如何降级。
+
+任务只保存在内存中，进程退出时尚未处理的任务会丢失。
+"""
+import queue
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import connection
+
+
+class BackgroundQueue:
+    """由固定数量的守护线程处理的有界任务队列，workers 为 0 时在调用线程中立即执行"""
+
+    def __init__(self, name, workers=2, maxsize=1000):
+        self.name = name
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'processed': 0, 'failed': 0, 'rejected': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _execute(self, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+            self._count('processed')
+        except Exception:
+            self._count('failed')
+            print(f"后台任务执行失败 ({self.name}):")
+            traceback.print_exc()
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                self._execute(func, args, kwargs)
+            finally:
+                # 工作线程不经过请求流程，需要自行关闭数据库连接
+                connection.close()
+                self._queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        """提交任务，队列已满时返回 False"""
+        if self.workers <= 0:
+            self._count('submitted')
+            self._execute(func, args, kwargs)
+            return True
+        self._start_workers()
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('submitted')
+        return True
+
+    def join(self):
+        """等待队列中的任务全部处理完毕"""
+        self._queue.join()
+
+    def stats(self):
+        """返回队列的运行指标：已提交、已处理、失败、被拒绝的任务数和当前排队数"""
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+
+_device_login_queue = None
+_device_login_queue_lock = threading.Lock()
+
+
+def device_login_queue():
+    """记录设备登录的后台队列，线程数和队列长度由 DEVICE_LOGIN_WORKERS 和 DEVICE_LOGIN_QUEUE_SIZE 设置"""
+    global _device_login_queue
+    with _device_login_queue_lock:
+        if _device_login_queue is None:
+            _device_login_queue = BackgroundQueue(
+                'device-login',
+                workers=getattr(settings, 'DEVICE_LOGIN_WORKERS', 2),
+                maxsize=getattr(settings, 'DEVICE_LOGIN_QUEUE_SIZE', 1000),
+            )
+        return _device_login_queue
@@ -0,0 +1,238 @@
+"""作业完成记录相关的批量操作"""
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, QuerySet
+from django.utils import timezone
+
+from .models import User, Assignment, CompletionRecord
+
+# 每批写入的完成记录数量，SQLite单条语句的参数个数有限，不宜过大
+FANOUT_BATCH_SIZE = 500
+
+
+def sparse_completion_enabled():
+    """是否启用稀疏完成记录模式
+
+    启用后只保存已完成（或被学生手动切换过）的记录，未完成状态由缺少记录推导得出。
+    """
+    return getattr(settings, 'SPARSE_COMPLETION_RECORDS', False)
+
+
+def _as_ids(objects):
+    """把模型实例、QuerySet或ID列表统一转换为ID列表"""
+    if hasattr(objects, 'values_list'):
+        return list(objects.values_list('id', flat=True))
+    return [obj if isinstance(obj, int) else obj.id for obj in objects]
+
+
+def fan_out_completion_records(assignments, students=None, batch_size=FANOUT_BATCH_SIZE, skip_if_sparse=True,
+                               update_counters=True):
+    """为作业和学生的每个组合创建未完成的完成记录
+
+    assignments 和 students 可以是QuerySet、模型实例列表或ID列表，
+    students 为空时默认使用所有学生。已存在的记录会被跳过。
+    所有记录在同一个事务中分批用 bulk_create 写入，返回统计信息字典。
+    稀疏模式下不需要预先创建记录，除非 skip_if_sparse=False（例如关闭稀疏模式前补齐记录）。
+    update_counters 为真时，同时把新增的记录数计入作业的 total_count（已存在的记录不重复计入）；
+    稀疏模式下没有记录可供判断，调用方需保证这些学生此前未计入（新作业或新学生）。
+    """
+    start = time.perf_counter()
+
+    assignment_ids = _as_ids(assignments)
+    if students is None:
+        students = User.objects.filter(user_type='student')
+    student_ids = _as_ids(students)
+
+    if isinstance(assignments, QuerySet):
+        counter_targets = assignments
+    else:
+        counter_targets = Assignment.objects.filter(id__in=assignment_ids)
+    counted_students = len(student_ids)
+
+    if skip_if_sparse and sparse_completion_enabled():
+        assignment_ids = []
+
+    # 按需生成记录，避免一次性在内存中构造所有对象
+    records = (
+        CompletionRecord(student_id=student_id, assignment_id=assignment_id, completed=False)
+        for assignment_id in assignment_ids
+        for student_id in student_ids
+    )
+
+    created = 0
+    batches = 0
+    with transaction.atomic():
+        # 已存在的记录会被 ignore_conflicts 跳过，计数器只计入实际新增的记录
+        existing = {}
+        if update_counters and assignment_ids:
+            existing = dict(
+                CompletionRecord.objects.filter(assignment__in=counter_targets, student__in=students)
+                .order_by().values('assignment_id').annotate(count=Count('id')).values_list('assignment_id', 'count')
+            )
+
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            CompletionRecord.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+            created += len(batch)
+            batches += 1
+
+        if update_counters and counted_students:
+            _add_to_total_counts(counter_targets, counted_students, existing)
+
+    # rows 为提交写入的记录数，已存在而被忽略的记录也计算在内
+    return {
+        'assignments': len(assignment_ids),
+        'students': len(student_ids),
+        'rows': created,
+        'batches': batches,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def _add_to_total_counts(counter_targets, counted_students, existing):
+    """把新增的学生人数计入作业的 total_count，existing 为各作业原有的记录数"""
+    if not existing:
+        counter_targets.update(total_count=F('total_count') + counted_students)
+        return
+    increments = defaultdict(list)
+    for assignment_id in counter_targets.values_list('id', flat=True):
+        increments[counted_students - existing.get(assignment_id, 0)].append(assignment_id)
+    for increment, ids in increments.items():
+        if not increment:
+            continue
+        for i in range(0, len(ids), FANOUT_BATCH_SIZE):
+            Assignment.objects.filter(id__in=ids[i:i + FANOUT_BATCH_SIZE]).update(
+                total_count=F('total_count') + increment
+            )
+
+
+def fan_out_for_new_student(student):
+    """为新注册的学生创建所有已有作业的完成记录"""
+    return fan_out_completion_records(Assignment.objects.all(), students=[student])
+
+
+def student_assignment_queryset(student):
+    """获取学生可见的作业，每个作业附带 completed 标记
+
+    稀疏模式下所有作业对学生可见，未完成状态通过反连接推导；
+    否则只返回学生拥有完成记录的作业。
+    """
+    completed_records = CompletionRecord.objects.filter(
+        student=student,
+        assignment=OuterRef('pk'),
+        completed=True
+    )
+    assignments = Assignment.objects.all()
+    if not sparse_completion_enabled():
+        assignments = assignments.filter(completion_records__student=student)
+    return assignments.annotate(completed=Exists(completed_records))
+
+
+def get_completion_record(student, assignment_id):
+    """获取学生某个作业的完成记录
+
+    稀疏模式下记录不存在时返回一个未保存的默认记录；作业不存在时抛出 CompletionRecord.DoesNotExist。
+    """
+    try:
+        return CompletionRecord.objects.get(student=student, assignment_id=assignment_id)
+    except CompletionRecord.DoesNotExist:
+        if sparse_completion_enabled() and Assignment.objects.filter(id=assignment_id).exists():
+            return CompletionRecord(student=student, assignment_id=assignment_id, completed=False)
+        raise
+
+
+def completion_records_for_assignment(assignment):
+    """获取作业的所有学生完成记录，稀疏模式下为缺失的学生补充未保存的默认记录"""
+    records = CompletionRecord.objects.filter(assignment=assignment).select_related('student')
+    if not sparse_completion_enabled():
+        return records
+
+    stored = {record.student_id: record for record in records}
+    students = User.objects.filter(user_type='student').order_by('student_id', 'username')
+    return [
+        stored.get(student.id) or CompletionRecord(student=student, assignment=assignment, completed=False)
+        for student in students
+    ]
+
+
+def compact_completion_records(dry_run=False):
+    """删除未完成的默认记录，返回删除（或将要删除）的记录数
+
+    非稀疏模式下 total_count 统计的是已有记录数，删除后在同一事务中重建计数器。
+    """
+    default_records = CompletionRecord.objects.filter(completed=False, completed_at__isnull=True)
+    if dry_run:
+        return default_records.count()
+    with transaction.atomic():
+        deleted, _ = default_records.delete()
+        if not sparse_completion_enabled():
+            recount_completion_counters()
+    return deleted
+
+
+def toggle_completion_record(record):
+    """切换完成记录的状态，并在同一事务中更新作业的完成计数器
+
+    切换前锁定数据库中的记录并以其中的状态为准，同一记录被并发切换时计数器不会朝同一方向重复调整。
+    """
+    with transaction.atomic():
+        stored = CompletionRecord.objects.select_for_update().filter(
+            student_id=record.student_id, assignment_id=record.assignment_id
+        ).first()
+        if stored is not None:
+            record.pk = stored.pk
+            record.completed = stored.completed
+        record.completed = not record.completed
+
+        # 如果标记为完成，记录完成时间
+        if record.completed:
+            record.completed_at = timezone.now()
+        else:
+            record.completed_at = None
+
+        record.save()
+        Assignment.objects.filter(id=record.assignment_id).update(
+            completed_count=F('completed_count') + (1 if record.completed else -1)
+        )
+    return record
+
+
+def release_student_counters(student):
+    """从学生相关作业的计数器中扣除该学生（在删除学生前调用）"""
+    completed_ids = CompletionRecord.objects.filter(student=student, completed=True).values('assignment_id')
+    with transaction.atomic():
+        Assignment.objects.filter(id__in=completed_ids).update(completed_count=F('completed_count') - 1)
+        if sparse_completion_enabled():
+            Assignment.objects.update(total_count=F('total_count') - 1)
+        else:
+            Assignment.objects.filter(
+                id__in=CompletionRecord.objects.filter(student=student).values('assignment_id')
+            ).update(total_count=F('total_count') - 1)
+
+
+def recount_completion_counters(dry_run=False):
+    """根据完成记录重建作业的完成计数器
+
+    返回计数器与实际情况不一致的作业列表，每个作业带有 live_completed_count 和 live_total_count。
+    dry_run 为真时只报告偏差，不修改数据。
+    """
+    drifted = [
+        assignment
+        for assignment in Assignment.objects.with_live_completion_stats().order_by('id')
+        if assignment.completed_count != assignment.live_completed_count
+        or assignment.total_count != assignment.live_total_count
+    ]
+    if not dry_run:
+        with transaction.atomic():
+            for assignment in drifted:
+                Assignment.objects.filter(id=assignment.id).update(
+                    completed_count=assignment.live_completed_count,
+                    total_count=assignment.live_total_count
+                )
+    return drifted
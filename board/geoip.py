@@ -0,0 +1,262 @@
+"""IP地理位置查询
+
+按顺序询问各个位置提供者，第一个给出结果的为准：
+
+- RangeDatabaseProvider：本地的IP段数据库（GEOIP_DATABASE），首次查询时载入内存，
+  之后用二分查找定位，不需要网络请求。
+- IpApiProvider：ip-api.com 的免费接口，只在 GEOIP_HTTP_FALLBACK 开启时（默认关闭）作为后备使用。
+
+私有、回环、链路本地、保留等非公网地址直接返回"本地网络"，查询结果保存在 LRU 缓存中。
+
+IP段数据库是UTF-8编码的文本文件，每行一个IP段，以逗号分隔起止地址（含）和位置，
+以 # 开头的行为注释，IPv4 与 IPv6 可以混合存放，IP段之间不能重叠：
+
+    1.0.1.0,1.0.3.255,中国 福建 福州
+    2001:250::,2001:250:ffff:ffff:ffff:ffff:ffff:ffff,中国 教育网
+
+可以用 python manage.py import_ip_ranges 从 "起始IP,结束IP,位置" 或 "CIDR,位置" 格式的文件生成。
+"""
+import ipaddress
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+
+LOCAL_NETWORK = '本地网络'
+UNKNOWN_LOCATION = '未知位置'
+
+
+def parse_ip(ip):
+    """把字符串解析为IP地址对象，IPv4映射的IPv6地址转换为IPv4，格式无效时返回 None"""
+    try:
+        address = ipaddress.ip_address(str(ip).strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def is_local_address(address):
+    """不属于公网的地址：私有、回环、链路本地、组播、保留和文档示例地址等"""
+    return not address.is_global or address.is_multicast
+
+
+def parse_ip_range(line):
+    """解析一行IP段："起始IP,结束IP,位置" 或 "CIDR,位置"，返回 (起始地址, 结束地址, 位置)，格式无效时抛出 ValueError"""
+    first = line.split(',', 1)[0].strip()
+    if '/' in first:
+        network, location = (part.strip() for part in line.split(',', 1))
+        network = ipaddress.ip_network(network, strict=False)
+        start, end = network[0], network[-1]
+    else:
+        start, end, location = (part.strip() for part in line.split(',', 2))
+        start, end = ipaddress.ip_address(start), ipaddress.ip_address(end)
+        if start.version != end.version or start > end:
+            raise ValueError('起止地址无效')
+    return start, end, location
+
+
+def load_ip_ranges(lines):
+    """读取IP段，返回 ({IP版本: 按起始地址排序的 [(起始, 结束, 位置)]}, 问题说明列表)
+
+    格式无效的行以及与前一个IP段重叠（包括嵌套）的IP段会被跳过并记入问题说明，
+    二分查找要求IP段互不重叠。
+    """
+    rows = {4: [], 6: []}
+    problems = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            start, end, location = parse_ip_range(line)
+        except ValueError:
+            problems.append(f"第 {line_no} 行格式无效，已跳过: {line}")
+            continue
+        rows[start.version].append((int(start), int(end), location, line_no))
+
+    ranges = {}
+    for version, version_rows in rows.items():
+        version_rows.sort()
+        kept = []
+        for start, end, location, line_no in version_rows:
+            if kept and start <= kept[-1][1]:
+                problems.append(f"第 {line_no} 行与已有IP段重叠，已跳过: "
+                                f"{ipaddress.ip_address(start)}-{ipaddress.ip_address(end)}")
+                continue
+            kept.append((start, end, location))
+        ranges[version] = kept
+    return ranges, problems
+
+
+class RangeDatabaseProvider:
+    """从IP段文件中查询位置，文件只在首次查询时载入一次"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tables = None
+
+    def _load(self):
+        # 每个IP版本一张表：(起始地址列表, 结束地址列表, 位置列表)，按起始地址排序
+        ranges = {4: [], 6: []}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                ranges, problems = load_ip_ranges(f)
+            for problem in problems:
+                print(f"IP段数据库{problem}")
+        except OSError as e:
+            print(f"无法读取IP段数据库 {self.path}: {e}")
+
+        return {
+            version: (
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+            )
+            for version, rows in ranges.items()
+        }
+
+    def tables(self):
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = self._load()
+        return self._tables
+
+    def lookup(self, address):
+        starts, ends, locations = self.tables()[address.version]
+        value = int(address)
+        index = bisect_right(starts, value) - 1
+        if index >= 0 and value <= ends[index]:
+            return locations[index] or None
+        return None
+
+
+class IpApiProvider:
+    """通过 ip-api.com 的免费服务查询位置，不需要API密钥"""
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def lookup(self, address):
+        try:
+            response = requests.get(f'http://ip-api.com/json/{address}?lang=zh-CN', timeout=self.timeout)
+            data = response.json()
+
+            if data['status'] != 'success':
+                print(f"IP位置查询失败: {data.get('message', '未知错误')}")
+                return None
+
+            # 返回城市和国家/地区
+            city = data.get('city', '')
+            country = data.get('country', '')
+            region = data.get('regionName', '')
+
+            location_parts = []
+            if country:
+                location_parts.append(country)
+            if region and region != city:  # 避免重复显示相同的城市和地区名
+                location_parts.append(region)
+            if city:
+                location_parts.append(city)
+            return ' '.join(location_parts) or None
+        except Exception as e:
+            print(f"IP位置查询异常: {str(e)}")
+            return None
+
+
+class Geolocator:
+    """依次询问各个提供者，结果保存在 LRU 缓存中
+
+    查不到位置的地址也会缓存，但只保留 miss_ttl 秒，之后重新查询（例如IP段数据库更新后或网络恢复后）。
+    """
+
+    def __init__(self, providers, cache_size=4096, miss_ttl=300):
+        self.providers = list(providers)
+        self.cache_size = cache_size
+        self.miss_ttl = miss_ttl
+        # 地址 -> (位置, 过期时间)，查到的位置不过期
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, address):
+        with self._lock:
+            entry = self._cache.get(address)
+            if entry is None:
+                return None
+            location, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._cache[address]
+                return None
+            self._cache.move_to_end(address)
+            return location
+
+    def _remember(self, address, location, ttl=None):
+        if self.cache_size <= 0:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._cache[address] = (location, expires_at)
+            self._cache.move_to_end(address)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def locate(self, ip):
+        """返回IP地址的位置描述；非公网地址为"本地网络"，查不到位置时为"未知位置"。"""
+        address = parse_ip(ip) if ip else None
+        if address is None:
+            return UNKNOWN_LOCATION if ip else LOCAL_NETWORK
+        if is_local_address(address):
+            return LOCAL_NETWORK
+
+        location = self._cached(address)
+        if location is not None:
+            return location
+        for provider in self.providers:
+            location = provider.lookup(address)
+            if location:
+                self._remember(address, location)
+                return location
+        if self.miss_ttl > 0:
+            self._remember(address, UNKNOWN_LOCATION, ttl=self.miss_ttl)
+        return UNKNOWN_LOCATION
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_geolocator = None
+_geolocator_lock = threading.Lock()
+
+
+def get_geolocator():
+    """按 GEOIP_DATABASE、GEOIP_HTTP_FALLBACK、GEOIP_CACHE_SIZE 和 GEOIP_MISS_CACHE_TTL 设置创建的全局查询器"""
+    global _geolocator
+    with _geolocator_lock:
+        if _geolocator is None:
+            providers = []
+            database = getattr(settings, 'GEOIP_DATABASE', None)
+            if database and os.path.exists(database):
+                providers.append(RangeDatabaseProvider(database))
+            if getattr(settings, 'GEOIP_HTTP_FALLBACK', False):
+                providers.append(IpApiProvider(timeout=getattr(settings, 'GEOIP_HTTP_TIMEOUT', 5)))
+            _geolocator = Geolocator(
+                providers,
+                cache_size=getattr(settings, 'GEOIP_CACHE_SIZE', 4096),
+                miss_ttl=getattr(settings, 'GEOIP_MISS_CACHE_TTL', 300),
+            )
+        return _geolocator
+
+
+def reset_geolocator():
+    """丢弃全局查询器，下次查询时按当前设置重新创建（设置变化后或测试中使用）"""
+    global _geolocator
+    with _geolocator_lock:
+        _geolocator = None
@@ -0,0 +1,195 @@
+"""每日作业快照，以及学生今日作业文本的生成和缓存"""
+import datetime
+import hashlib
+
+from django.core.cache import cache
+
+from .completion import sparse_completion_enabled
+from .models import Assignment, CompletionRecord
+
+# 科目的自定义排序顺序
+SUBJECT_ORDER = {
+    '其他': 0,
+    '语文': 1,
+    '数学': 2,
+    '英语': 3,
+    '物理': 4,
+    '化学': 5,
+    '生物': 6,
+    '历史': 7,
+    '地理': 8,
+    '政治': 9
+}
+
+# 每日作业快照的缓存有效期（秒）
+DAILY_SNAPSHOT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 缓存的作业文本有效期（秒）。版本号变化会使缓存立即失效，
+# 有效期只用于限制多进程部署中使用进程内缓存时可能出现的过期数据
+TODAY_HOMEWORK_CACHE_TIMEOUT = 600
+
+ASSIGNMENTS_VERSION_KEY = 'homework:assignments:version'
+
+
+def _student_version_key(student_id):
+    return f'homework:student:{student_id}:version'
+
+
+def _get_version(key):
+    """读取版本号，不存在时初始化为1"""
+    cache.add(key, 1, timeout=None)
+    return cache.get(key, 1)
+
+
+def _bump_version(key):
+    """版本号加一，使依赖该版本号的缓存全部失效"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+
+
+def bump_assignments_version():
+    """作业新增、修改或删除时调用"""
+    _bump_version(ASSIGNMENTS_VERSION_KEY)
+
+
+def bump_student_version(student_id):
+    """学生的隐藏科目或完成状态变化时调用"""
+    _bump_version(_student_version_key(student_id))
+
+
+def get_next_monday(today):
+    """今天是周五、六、日时返回下周一的日期，否则返回None"""
+    # 判断今天是周几（0是周一，6是周日）
+    today_weekday = today.weekday()
+    if today_weekday == 4:  # 周五
+        return today + datetime.timedelta(days=3)  # 加3天得到下周一
+    elif today_weekday == 5:  # 周六
+        return today + datetime.timedelta(days=2)  # 加2天得到下周一
+    elif today_weekday == 6:  # 周日
+        return today + datetime.timedelta(days=1)  # 加1天得到下周一
+    return None
+
+
+def build_daily_snapshot(date):
+    """计算某一天全班共用的作业快照
+
+    包含当天需要做的作业（开始日期<=当天，且截止日期>当天），每个作业带有 special_mark，
+    并按科目顺序、截止日期和创建时间（新的在前）排好序。
+    """
+    tomorrow = date + datetime.timedelta(days=1)
+    next_monday = get_next_monday(date)
+
+    assignments = list(Assignment.objects.filter(
+        start_date__lte=date,
+        end_date__gt=date
+    ).select_related('subject', 'teacher'))
+
+    for assignment in assignments:
+        # 添加特殊标记
+        assignment.special_mark = ""
+        if next_monday:
+            if assignment.end_date > next_monday:
+                assignment.special_mark = "周一不收"
+        elif assignment.end_date != tomorrow:
+            assignment.special_mark = "明不收"
+
+    assignments.sort(key=lambda a: (
+        SUBJECT_ORDER.get(a.subject.name, 100),  # 如果科目不在预定义列表中，放到最后
+        a.end_date,
+        -a.created_at.timestamp()
+    ))
+    return assignments
+
+
+def _snapshot_key(date):
+    return 'homework:snapshot:{}:{}'.format(date.isoformat(), _get_version(ASSIGNMENTS_VERSION_KEY))
+
+
+def get_daily_snapshot(date):
+    """获取某一天的作业快照，首次请求时计算并缓存，作业变化后自动重新计算"""
+    cache_key = _snapshot_key(date)
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = build_daily_snapshot(date)
+        cache.set(cache_key, snapshot, timeout=DAILY_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def warm_daily_snapshot(date):
+    """重新计算并缓存某一天的作业快照，返回快照中的作业数量"""
+    snapshot = build_daily_snapshot(date)
+    cache.set(_snapshot_key(date), snapshot, timeout=DAILY_SNAPSHOT_CACHE_TIMEOUT)
+    return len(snapshot)
+
+
+def student_assignments_for_date(student, date, hidden_subject_ids=None):
+    """在当天的作业快照上叠加学生的隐藏科目和完成状态，每个作业带有 completed 标记"""
+    if hidden_subject_ids is None:
+        hidden_subject_ids = student.hidden_subjects.values_list('id', flat=True)
+    hidden_subject_ids = set(hidden_subject_ids)
+
+    assignments = [a for a in get_daily_snapshot(date) if a.subject_id not in hidden_subject_ids]
+    if not assignments:
+        return []
+
+    completion = dict(CompletionRecord.objects.filter(
+        student=student,
+        assignment_id__in=[a.id for a in assignments]
+    ).values_list('assignment_id', 'completed'))
+
+    # 非稀疏模式下只有拥有完成记录的作业属于该学生
+    if not sparse_completion_enabled():
+        assignments = [a for a in assignments if a.id in completion]
+
+    for assignment in assignments:
+        assignment.completed = completion.get(assignment.id, False)
+    return assignments
+
+
+def build_today_homework_text(user, today):
+    """生成学生今天需要完成的作业文本（不含今天截止的作业）"""
+    # 按科目分组作业，快照已按科目顺序排好序
+    subject_assignments = {}
+    for assignment in student_assignments_for_date(user, today):
+        subject_assignments.setdefault(assignment.subject.name, []).append(assignment)
+
+    # 构建返回的字符串
+    result_str = ""
+    for subject_name, assignments in subject_assignments.items():
+        result_str += f"{subject_name}：\n"
+
+        # 接口文本中同一科目的作业按截止日期排序，截止日期相同时先布置的在前（与页面上新的在前不同）
+        assignments = sorted(assignments, key=lambda a: (a.end_date, a.created_at, a.id))
+
+        # 添加每个作业
+        for i, assignment in enumerate(assignments, 1):
+            mark = f" ({assignment.special_mark})" if assignment.special_mark else ""
+            result_str += f"{i}.{assignment.title}{mark}\n"
+
+    if not result_str:
+        result_str = "今天暂时没有需要完成的作业"
+
+    return result_str.strip()
+
+
+def get_today_homework_text(user, today):
+    """获取学生今天的作业文本及其ETag
+
+    结果按 (学生, 日期, 学生版本号, 作业版本号) 缓存，版本号由信号在数据变化时递增。
+    """
+    cache_key = 'homework:today:{}:{}:{}:{}'.format(
+        user.id,
+        today.isoformat(),
+        _get_version(_student_version_key(user.id)),
+        _get_version(ASSIGNMENTS_VERSION_KEY),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    text = build_today_homework_text(user, today)
+    etag = '"{}"'.format(hashlib.md5(text.encode('utf-8')).hexdigest())
+    cache.set(cache_key, (text, etag), timeout=TODAY_HOMEWORK_CACHE_TIMEOUT)
+    return text, etag
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from board.markup import backfill_plain_excerpts
+
+
+class Command(BaseCommand):
+    help = '为已有的热搜和评论生成纯文本摘要'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅统计需要更新的记录数，不修改数据'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批读取和更新的记录数（默认：500）'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        results = backfill_plain_excerpts(batch_size=options['batch_size'], dry_run=dry_run)
+
+        for name, count in results.items():
+            self.stdout.write(f"{name}: {count} 条记录{'需要更新' if dry_run else '已更新'}")
+
+        total = sum(results.values())
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，共有 {total} 条记录的摘要需要更新"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已更新 {total} 条记录的纯文本摘要"))
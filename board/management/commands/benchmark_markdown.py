@@ -0,0 +1,49 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from board.markup import benchmark_render
+from board.models import Comment, RatingComment, HotTopic
+
+# 数据库中没有内容时使用的示例文本
+SAMPLE_TEXTS = [
+    '这道题的答案是**42**，详见[课本](https://example.com)第3页。',
+    '# 解题思路\n\n1. 先求导\n2. 再令导数为零\n\n$$f\'(x) = 2x + 1$$',
+    '行内公式 $a^2 + b^2 = c^2$ 和代码 `print("hello")`\n\n> 引用老师的话',
+    '| 科目 | 作业 |\n| --- | --- |\n| 数学 | 练习册 |\n| 英语 | 背单词 |',
+]
+
+
+class Command(BaseCommand):
+    help = '比较每次新建渲染器与复用渲染器时单次Markdown渲染的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=200,
+            help='从每类内容中最多取多少条作为测试语料（默认：200）'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='每条语料重复渲染的次数（默认：5）'
+        )
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        texts = list(chain(
+            Comment.objects.order_by('-created_at').values_list('content', flat=True)[:limit],
+            RatingComment.objects.order_by('-created_at').values_list('content', flat=True)[:limit],
+            HotTopic.objects.order_by('-created_at').values_list('content', flat=True)[:limit],
+        ))
+        if not any(texts):
+            self.stdout.write('数据库中没有评论内容，使用示例文本')
+            texts = SAMPLE_TEXTS
+
+        result = benchmark_render(texts, repeat=options['repeat'])
+        self.stdout.write(f"语料: {result['texts']} 条，共渲染 {result['renders']} 次")
+        self.stdout.write(f"每次新建渲染器: {result['fresh_us']} 微秒/次")
+        self.stdout.write(f"复用渲染器: {result['pooled_us']} 微秒/次")
+        if result['pooled_us']:
+            self.stdout.write(self.style.SUCCESS(f"加速比: {result['fresh_us'] / result['pooled_us']:.2f}x"))
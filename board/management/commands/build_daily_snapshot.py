@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from board.homework import warm_daily_snapshot
+import datetime
+
+
+class Command(BaseCommand):
+    help = '预先计算每日作业快照（当天需要做的作业及特殊标记），供学生请求直接使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='快照的起始日期，格式为YYYY-MM-DD（默认：今天）'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='从起始日期开始计算的天数（默认：1天）'
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                start_date = datetime.datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('日期格式无效，应为YYYY-MM-DD')
+        else:
+            start_date = timezone.now().date()
+
+        if options['days'] <= 0:
+            raise CommandError('天数必须为正整数')
+
+        for offset in range(options['days']):
+            date = start_date + datetime.timedelta(days=offset)
+            count = warm_daily_snapshot(date)
+            self.stdout.write(f"{date}: {count} 个作业")
+
+        self.stdout.write(self.style.SUCCESS(f"已生成 {options['days']} 天的作业快照"))
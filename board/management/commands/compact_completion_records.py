@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from board.completion import compact_completion_records, fan_out_completion_records, sparse_completion_enabled
+from board.models import Assignment
+
+
+class Command(BaseCommand):
+    help = '压缩未完成的默认完成记录，用于切换到稀疏完成记录模式'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅显示将要删除的记录数量，不实际删除'
+        )
+        parser.add_argument(
+            '--expand',
+            action='store_true',
+            help='反向操作：为所有学生补齐缺失的完成记录（关闭稀疏模式前使用）'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='未启用稀疏模式时也删除默认记录（随后必须启用稀疏模式，否则学生将看不到未完成的作业）'
+        )
+
+    def handle(self, *args, **options):
+        if options['expand']:
+            stats = fan_out_completion_records(
+                Assignment.objects.all(), skip_if_sparse=False, update_counters=False
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"已为 {stats['students']} 名学生补齐 {stats['assignments']} 个作业的完成记录，耗时 {stats['elapsed_ms']} 毫秒"
+            ))
+            return
+
+        if options['dry_run']:
+            count = compact_completion_records(dry_run=True)
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，将删除 {count} 条未完成的默认记录"))
+            return
+
+        if not sparse_completion_enabled() and not options['force']:
+            raise CommandError(
+                '未启用稀疏完成记录模式（SPARSE_COMPLETION_RECORDS），删除默认记录会使学生看不到未完成的作业。'
+                '请先启用稀疏模式，或使用 --force 强制执行'
+            )
+
+        count = compact_completion_records()
+        self.stdout.write(self.style.SUCCESS(f"成功删除了 {count} 条未完成的默认记录"))
+
@@ -0,0 +1,55 @@
+import ipaddress
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from board.geoip import load_ip_ranges, reset_geolocator
+
+
+class Command(BaseCommand):
+    help = '从 "起始IP,结束IP,位置" 或 "CIDR,位置" 格式的文件生成排好序的本地IP段数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='IP段源文件（UTF-8编码），可以指定多个')
+        parser.add_argument(
+            '--output',
+            help='输出文件，默认为 GEOIP_DATABASE 设置的路径'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅检查源文件并统计IP段数量，不写入数据库文件'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'GEOIP_DATABASE', None)
+        if not output:
+            raise CommandError('未指定输出文件，请使用 --output 或设置 GEOIP_DATABASE')
+
+        lines = []
+        for source in options['sources']:
+            try:
+                with open(source, encoding='utf-8') as f:
+                    lines.extend(f)
+            except OSError as e:
+                raise CommandError(f'无法读取 {source}: {e}')
+
+        ranges, problems = load_ip_ranges(lines)
+        for problem in problems:
+            self.stdout.write(f"源数据{problem}")
+        total = sum(len(rows) for rows in ranges.values())
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，共 {total} 个IP段，跳过 {len(problems)} 条"))
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        temp_path = f'{output}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('# 由 import_ip_ranges 生成：起始IP,结束IP,位置\n')
+            for version in (4, 6):
+                for start, end, location in ranges[version]:
+                    f.write(f'{ipaddress.ip_address(start)},{ipaddress.ip_address(end)},{location}\n')
+        os.replace(temp_path, output)
+        reset_geolocator()
+        self.stdout.write(self.style.SUCCESS(f"已写入 {total} 个IP段到 {output}，跳过 {len(problems)} 条"))
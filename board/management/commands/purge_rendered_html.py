@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from board.markup import purge_stale_rendered_html
+
+
+class Command(BaseCommand):
+    help = '删除旧版本渲染器生成的Markdown渲染缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅统计将要删除的缓存数量，不实际删除'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        count = purge_stale_rendered_html(dry_run=dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，将删除 {count} 条过期的渲染缓存"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已删除 {count} 条过期的渲染缓存"))
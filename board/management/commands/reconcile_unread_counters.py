@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from board.unread_counters import reconcile_unread_counters
+
+
+class Command(BaseCommand):
+    help = '根据通知表校对用户的未读通知计数器，并报告存在偏差的计数器'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅报告偏差，不修改计数器'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        drifted = reconcile_unread_counters(dry_run=dry_run)
+
+        for user_id, notification_type, stored, live in drifted:
+            self.stdout.write(f"偏差: 用户ID {user_id} 的 {notification_type} 未读数 {stored} -> {live}")
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，发现 {len(drifted)} 个存在偏差的未读计数器"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已修正 {len(drifted)} 个存在偏差的未读计数器"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from board.completion import recount_completion_counters
+
+
+class Command(BaseCommand):
+    help = '根据完成记录重建作业的完成计数器，并报告存在偏差的作业'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅报告偏差，不修改计数器'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        drifted = recount_completion_counters(dry_run=dry_run)
+
+        for assignment in drifted:
+            self.stdout.write(
+                f"偏差: {assignment.title} (ID: {assignment.id}) "
+                f"完成 {assignment.completed_count} -> {assignment.live_completed_count}，"
+                f"总数 {assignment.total_count} -> {assignment.live_total_count}"
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，发现 {len(drifted)} 个计数器存在偏差的作业"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已修正 {len(drifted)} 个计数器存在偏差的作业"))
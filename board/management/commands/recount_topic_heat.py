@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from board.ranking import recount_topic_heat
+
+
+class Command(BaseCommand):
+    help = '根据点赞和评论重新汇总热搜的热度字段，并报告存在偏差的热搜'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='仅报告偏差，不修改热度字段'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        drifted = recount_topic_heat(dry_run=dry_run)
+
+        for topic, columns in drifted:
+            self.stdout.write(
+                f"偏差: {topic.title} (ID: {topic.id}) "
+                f"点赞 {topic.likes_total} -> {columns['likes_total']}，"
+                f"评论热度 {topic.comments_heat_sum:.4f} -> {columns['comments_heat_sum']:.4f}"
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"模拟运行完成，发现 {len(drifted)} 个热度字段存在偏差的热搜"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已修正 {len(drifted)} 个热度字段存在偏差的热搜"))
@@ -0,0 +1,420 @@
+"""Markdown文本的渲染和纯文本处理"""
+import hashlib
+import re
+import threading
+import time
+from html import escape
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import bleach
+import markdown
+from django.conf import settings
+from django.utils.text import Truncator
+
+from .models import HotTopic, Comment, RatingComment, RenderedHtml
+
+# 列表页展示的纯文本摘要最大长度，模板中会再按需要截断
+PLAIN_EXCERPT_LENGTH = 200
+
+# 文本过长可能导致内存问题，超出部分截断后再渲染
+MAX_TEXT_LENGTH = 50000
+
+MARKDOWN_EXTENSIONS = [
+    'markdown.extensions.extra',
+    'markdown.extensions.codehilite',
+    'markdown.extensions.toc',
+]
+
+# 允许的HTML标签和属性
+ALLOWED_TAGS = [
+    'a', 'abbr', 'acronym', 'b', 'blockquote', 'br', 'code', 'div', 'em',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'i', 'img', 'li', 'ol', 'p',
+    'pre', 'span', 'strong', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'ul'
+]
+
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'class', 'rel'],
+    'abbr': ['title'],
+    'acronym': ['title'],
+    'div': ['class', 'id', 'style'],
+    'h1': ['id', 'class'],
+    'h2': ['id', 'class'],
+    'h3': ['id', 'class'],
+    'h4': ['id', 'class'],
+    'h5': ['id', 'class'],
+    'h6': ['id', 'class'],
+    'img': ['src', 'alt', 'title', 'class', 'align'],
+    'li': ['class'],
+    'ol': ['class'],
+    'p': ['class'],
+    'pre': ['class'],
+    'span': ['class', 'style'],
+    'table': ['class', 'border'],
+    'td': ['class', 'colspan', 'rowspan'],
+    'th': ['class', 'colspan', 'rowspan', 'scope'],
+    'ul': ['class']
+}
+
+# 安全的URL协议
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto', 'tel']
+
+# 公式渲染配置：单个公式的最大长度和每篇文本最多处理的公式数量。
+# 公式输出为带 math-formula 类的元素，由页面使用本地的KaTeX（static/js/math-render.js）渲染
+MAX_BLOCK_FORMULA_LENGTH = 500
+MAX_INLINE_FORMULA_LENGTH = 300
+MAX_BLOCK_FORMULAS = 20
+MAX_INLINE_FORMULAS = 40
+# 简单模式直接以代码格式显示公式（服务器内存压力大时使用）
+USE_SIMPLE_FORMULA_MODE = False
+
+# 渲染逻辑本身有改动（而不仅是上面的配置）时手动增加该值，使已缓存的渲染结果失效
+RENDERER_REVISION = 2
+
+# 预先编译的公式正则表达式：行间公式 $$...$$ 和行内公式 $...$
+BLOCK_FORMULA_RE = re.compile(r"\$\$(.*?)\$\$", re.S)
+INLINE_FORMULA_RE = re.compile(r"\$(.*?)\$", re.S)
+
+# 每个线程复用的Markdown实例和净化器
+_renderer_local = threading.local()
+
+# 进程内保存的渲染结果数量
+RENDER_CACHE_SIZE = 1024
+
+# (渲染器版本, 内容哈希) -> HTML
+_render_cache = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+# 批量渲染时未命中缓存的文本达到该数量才分发到进程池（需在设置中配置 MARKDOWN_RENDER_WORKERS）
+PARALLEL_RENDER_THRESHOLD = 8
+_render_pool = None
+_render_pool_workers = 0
+_render_pool_lock = threading.Lock()
+
+
+def strip_markdown(text):
+    """将Markdown文本转换为纯文本（去除Markdown语法标记）"""
+    if not text:
+        return ""
+        
+    # 去除行间公式标记$$...$$，保留内部内容
+    text = re.sub(r"\$\$(.*?)\$\$", r"[\1]", text, flags=re.S)
+    
+    # 去除行内公式标记$...$，保留内部内容
+    text = re.sub(r"\$(.*?)\$", r"[\1]", text, flags=re.S)
+    
+    # 去除标题标记
+    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.M)
+    
+    # 去除粗体和斜体
+    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
+    text = re.sub(r"\*(.*?)\*", r"\1", text)
+    text = re.sub(r"__(.*?)__", r"\1", text)
+    text = re.sub(r"_(.*?)_", r"\1", text)
+    
+    # 去除行内代码和代码块
+    text = re.sub(r"`{1,3}(.*?)`{1,3}", r"\1", text, flags=re.S)
+
+    # 去除图片标记，用[图片]替代
+    text = re.sub(r"!\[.*?\]\(.*?\)", "[图片]", text)
+    
+    # 去除链接，保留链接文本
+    text = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", text)
+    
+    # 去除引用标记
+    text = re.sub(r"^>\s+", "", text, flags=re.M)
+    
+    # 去除分割线
+    text = re.sub(r"^-{3,}$", "", text, flags=re.M)
+    text = re.sub(r"^={3,}$", "", text, flags=re.M)
+    text = re.sub(r"^\*{3,}$", "", text, flags=re.M)
+    
+    # 去除列表标记
+    text = re.sub(r"^[\*\-+]\s+", "", text, flags=re.M)
+    text = re.sub(r"^\d+\.\s+", "", text, flags=re.M)
+    
+    return text.strip()
+
+
+def make_plain_excerpt(text, length=PLAIN_EXCERPT_LENGTH):
+    """把Markdown文本转换为截断后的纯文本摘要"""
+    return Truncator(strip_markdown(text)).chars(length)
+
+
+def backfill_plain_excerpts(batch_size=500, dry_run=False):
+    """为已有的热搜、热搜评论和评分评论补全纯文本摘要
+
+    只更新摘要与内容不一致的记录，返回 {模型名称: 需要更新的记录数}。
+    """
+    results = {}
+    for model in (HotTopic, Comment, RatingComment):
+        stale = []
+        for obj in model.objects.only('id', 'content', 'plain_excerpt').order_by('id').iterator(chunk_size=batch_size):
+            excerpt = make_plain_excerpt(obj.content)
+            if excerpt != obj.plain_excerpt:
+                obj.plain_excerpt = excerpt
+                stale.append(obj)
+        if not dry_run:
+            # bulk_update 不会触发 pre_save 信号，也不会修改热度等其他字段
+            model.objects.bulk_update(stale, ['plain_excerpt'], batch_size=batch_size)
+        results[model._meta.verbose_name] = len(stale)
+    return results
+
+
+def _compute_renderer_version():
+    """根据渲染配置计算渲染器版本，任一配置变化都会得到新的版本，从而使旧的渲染结果失效"""
+    config = repr((
+        RENDERER_REVISION, MAX_TEXT_LENGTH, MARKDOWN_EXTENSIONS, ALLOWED_TAGS, sorted(ALLOWED_ATTRIBUTES.items()),
+        ALLOWED_PROTOCOLS, MAX_BLOCK_FORMULA_LENGTH, MAX_INLINE_FORMULA_LENGTH,
+        MAX_BLOCK_FORMULAS, MAX_INLINE_FORMULAS, USE_SIMPLE_FORMULA_MODE, markdown.__version__, bleach.__version__,
+    ))
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()[:16]
+
+
+# 渲染配置都是模块常量，版本只需在导入时计算一次
+RENDERER_VERSION = _compute_renderer_version()
+
+
+def renderer_version():
+    """当前渲染器版本，用作渲染结果缓存的一部分键"""
+    return RENDERER_VERSION
+
+
+def content_hash(text):
+    """计算Markdown文本的哈希值，作为渲染结果的缓存键"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _block_formula_html(formula):
+    # 限制公式长度
+    if len(formula) > MAX_BLOCK_FORMULA_LENGTH:
+        return '<div class="alert alert-warning">公式过长，无法显示</div>'
+    if USE_SIMPLE_FORMULA_MODE:
+        return f'<div class="math-block"><code>$${escape(formula)}$$</code></div>'
+    return f'<div class="math-formula">{escape(formula)}</div>'
+
+
+def _inline_formula_html(formula):
+    # 限制公式长度
+    if len(formula) > MAX_INLINE_FORMULA_LENGTH:
+        return '<span class="text-warning">公式过长</span>'
+    if USE_SIMPLE_FORMULA_MODE:
+        return f'<code>${escape(formula)}$</code>'
+    return f'<span class="math-formula inline">{escape(formula)}</span>'
+
+
+def _extract_formulas(text):
+    """在Markdown转换前把公式替换为占位符，避免公式中的 _、* 和反斜杠被当作Markdown语法
+
+    返回 (替换后的文本, {占位符: 公式HTML})。
+    """
+    nonce = uuid.uuid4().hex
+    formulas = {}
+
+    def replacer(render):
+        def replace(match):
+            token = f'math{nonce}n{len(formulas)}n'
+            formulas[token] = render(match.group(1).strip())
+            return token
+        return replace
+
+    # 限制处理的公式数量，避免内存问题
+    text = BLOCK_FORMULA_RE.sub(replacer(_block_formula_html), text, count=MAX_BLOCK_FORMULAS)
+    text = INLINE_FORMULA_RE.sub(replacer(_inline_formula_html), text, count=MAX_INLINE_FORMULAS)
+    return text, formulas
+
+
+def _restore_formulas(html, formulas):
+    """把占位符替换回公式HTML，单独成段的行间公式不再包在 <p> 中"""
+    for token, formula_html in formulas.items():
+        html = html.replace(f'<p>{token}</p>', formula_html).replace(token, formula_html)
+    return html
+
+
+def _new_markdown():
+    return markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+
+
+def _new_cleaner():
+    return bleach.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS, strip=True)
+
+
+def _get_markdown(version):
+    """获取当前线程复用的Markdown实例，渲染配置变化后重新创建
+
+    Markdown实例不是线程安全的，因此每个线程各持有一个，每次使用前调用 reset()。
+    """
+    md = getattr(_renderer_local, 'markdown', None)
+    if md is None or _renderer_local.markdown_version != version:
+        md = _new_markdown()
+        _renderer_local.markdown = md
+        _renderer_local.markdown_version = version
+    return md.reset()
+
+
+def _get_cleaner(version):
+    """获取按当前净化策略预先构建的 bleach.Cleaner，渲染配置变化后重新创建"""
+    cleaner = getattr(_renderer_local, 'cleaner', None)
+    if cleaner is None or _renderer_local.cleaner_version != version:
+        cleaner = _new_cleaner()
+        _renderer_local.cleaner = cleaner
+        _renderer_local.cleaner_version = version
+    return cleaner
+
+
+def _render_with(md, cleaner, text):
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH] + "\n\n**内容过长，已截断显示**"
+
+    text, formulas = _extract_formulas(text)
+    html = _restore_formulas(md.convert(text), formulas)
+
+    # 使用bleach净化HTML内容
+    return cleaner.clean(html)
+
+
+def render_markdown(text):
+    """不经缓存直接把Markdown文本渲染为净化后的HTML，渲染出错时抛出异常
+
+    复用当前线程的Markdown实例和预先构建的净化器，避免每次渲染都重新加载扩展。
+    """
+    version = renderer_version()
+    return _render_with(_get_markdown(version), _get_cleaner(version), text)
+
+
+def benchmark_render(texts, repeat=5):
+    """比较每次新建渲染器与复用渲染器的单次渲染耗时（微秒），返回统计字典"""
+    texts = [text for text in texts if text]
+    if not texts:
+        return {'texts': 0, 'renders': 0, 'fresh_us': 0, 'pooled_us': 0}
+
+    def measure(render):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                render(text)
+        return (time.perf_counter() - start) * 1000000 / (repeat * len(texts))
+
+    fresh_us = measure(lambda text: _render_with(_new_markdown(), _new_cleaner(), text))
+    pooled_us = measure(render_markdown)
+    return {
+        'texts': len(texts),
+        'renders': repeat * len(texts),
+        'fresh_us': round(fresh_us, 1),
+        'pooled_us': round(pooled_us, 1),
+    }
+
+
+def _cache_get(key):
+    with _render_cache_lock:
+        html = _render_cache.get(key)
+        if html is not None:
+            _render_cache.move_to_end(key)
+        return html
+
+
+def _cache_set(key, html):
+    with _render_cache_lock:
+        _render_cache[key] = html
+        _render_cache.move_to_end(key)
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+
+
+def clear_render_cache():
+    """清空进程内的渲染结果缓存"""
+    with _render_cache_lock:
+        _render_cache.clear()
+
+
+def _render_or_error(text):
+    """渲染文本，返回 (HTML, 是否渲染成功)；渲染失败时返回提示信息"""
+    try:
+        return render_markdown(text), True
+    except MemoryError:
+        # 捕获内存错误，返回简化版本
+        return f"<p>内容过于复杂，无法渲染。原文：</p><pre>{text[:200]}...</pre>", False
+    except Exception as e:
+        # 捕获其他错误
+        return f"<p>渲染失败：{str(e)}</p><pre>{text[:200]}...</pre>", False
+
+
+def _get_render_pool(workers):
+    """获取渲染用的进程池，工作进程数变化时重新创建"""
+    global _render_pool, _render_pool_workers
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_workers != workers:
+            if _render_pool is not None:
+                _render_pool.shutdown(wait=False)
+            _render_pool = ProcessPoolExecutor(max_workers=workers)
+            _render_pool_workers = workers
+        return _render_pool
+
+
+def _render_cold(texts):
+    """渲染未命中缓存的文本，数量较多且配置了工作进程时分发到进程池"""
+    workers = getattr(settings, 'MARKDOWN_RENDER_WORKERS', 0)
+    if workers and len(texts) >= PARALLEL_RENDER_THRESHOLD:
+        return list(_get_render_pool(workers).map(_render_or_error, texts))
+    return [_render_or_error(text) for text in texts]
+
+
+def render_many(texts):
+    """批量把Markdown文本渲染为HTML，返回与输入顺序对应的列表
+
+    相同的文本只处理一次；先查进程内缓存，未命中的文本用一次查询从数据库读取，
+    仍未命中的文本才进行渲染，渲染结果批量写回数据库。渲染失败的结果不会被缓存。
+    """
+    texts = list(texts)
+    version = renderer_version()
+    digests = {text: content_hash(text) for text in texts if text}
+    results = {}
+
+    missing = {}
+    for text, digest in digests.items():
+        html = _cache_get((version, digest))
+        if html is None:
+            missing[digest] = text
+        else:
+            results[text] = html
+
+    if missing:
+        stored = RenderedHtml.objects.filter(
+            renderer_version=version, content_hash__in=list(missing)
+        ).values_list('content_hash', 'html')
+        for digest, html in stored:
+            text = missing.pop(digest)
+            results[text] = html
+            _cache_set((version, digest), html)
+
+    if missing:
+        cold = list(missing.items())
+        rendered = []
+        for (digest, text), (html, ok) in zip(cold, _render_cold([text for _, text in cold])):
+            results[text] = html
+            if ok:
+                rendered.append(RenderedHtml(content_hash=digest, renderer_version=version, html=html))
+                _cache_set((version, digest), html)
+        # 并发渲染同一文本时忽略唯一约束冲突
+        RenderedHtml.objects.bulk_create(rendered, ignore_conflicts=True)
+
+    return [results[text] if text else "" for text in texts]
+
+
+def convert_markdown_to_html(text):
+    """将Markdown文本转换为HTML，包括数学公式支持和HTML净化
+
+    渲染结果按内容哈希和渲染器版本保存在数据库中，并在进程内保留最近使用的结果，
+    相同的文本只需渲染一次。渲染失败时返回提示信息，且不会被缓存。
+    """
+    return render_many([text])[0]
+
+
+def purge_stale_rendered_html(dry_run=False):
+    """删除旧版本渲染器生成的渲染结果，返回删除（或将要删除）的记录数"""
+    stale = RenderedHtml.objects.exclude(renderer_version=renderer_version())
+    if dry_run:
+        return stale.count()
+    deleted, _ = stale.delete()
+    return deleted
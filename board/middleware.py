@@ -1,25 +1,23 @@
 from django.utils.deprecation import MiddlewareMixin
 import re
-from django.utils import timezone
 
+from .activity import record_activity
 
-class UserActivityMiddleware:
+
+class UserActivityMiddleware(MiddlewareMixin):
     """
     中间件：在用户访问通知计数API时更新其最后活动时间
-    """
 
-    def __init__(self, get_response):
-        self.get_response = get_response
+    继承 MiddlewareMixin 以同时支持同步和异步请求，ASGI 下长轮询挂起期间不会占用线程
+    """
 
-    def __call__(self, request):
-        # 请求处理前的代码
-        response = self.get_response(request)
-        # 请求处理后的代码
+    # 前端定时访问的未读数接口，访问即视为用户在线
+    ACTIVITY_PATHS = ('/api/notifications/unread-count/', '/api/notifications/unread-poll/')
 
+    def process_response(self, request, response):
         # 只有已登录用户才更新活动时间
-        if request.user.is_authenticated and request.path == '/api/notifications/unread-count/':
-            # 更新用户的最后活动时间
-            request.user.last_activity = timezone.now()
-            request.user.save(update_fields=['last_activity'])
+        if request.path in self.ACTIVITY_PATHS and request.user.is_authenticated:
+            # 记录用户的最后活动时间，由 record_activity 合并后批量写入
+            record_activity(request.user)
 
         return response
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:28
+
+from django.db import migrations, models
+
+
+def populate_free_ids(apps, schema_editor):
+    """根据现有作业一次性计算空闲ID"""
+    Assignment = apps.get_model('board', 'Assignment')
+    FreeAssignmentId = apps.get_model('board', 'FreeAssignmentId')
+    used_ids = set(Assignment.objects.values_list('id', flat=True))
+    max_id = max(used_ids) if used_ids else 0
+    FreeAssignmentId.objects.bulk_create(
+        [FreeAssignmentId(id=i) for i in range(1, max_id + 1) if i not in used_ids],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0014_user_last_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreeAssignmentId',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'verbose_name': '空闲作业ID',
+                'verbose_name_plural': '空闲作业ID',
+            },
+        ),
+        migrations.RunPython(populate_free_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    """根据现有完成记录初始化作业计数器"""
+    Assignment = apps.get_model('board', 'Assignment')
+    CompletionRecord = apps.get_model('board', 'CompletionRecord')
+    User = apps.get_model('board', 'User')
+
+    def record_count(**filters):
+        counts = CompletionRecord.objects.filter(assignment=OuterRef('pk'), **filters).order_by().values(
+            'assignment').annotate(c=Count('id')).values('c')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    if getattr(settings, 'SPARSE_COMPLETION_RECORDS', False):
+        total_count = Value(User.objects.filter(user_type='student').count())
+    else:
+        total_count = record_count()
+    Assignment.objects.update(completed_count=record_count(completed=True), total_count=total_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0015_freeassignmentid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='completed_count',
+            field=models.IntegerField(default=0, verbose_name='完成人数'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='total_count',
+            field=models.IntegerField(default=0, verbose_name='总人数'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0016_assignment_completion_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['start_date', 'end_date'], name='board_assig_start_d_55e983_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['end_date'], name='board_assig_end_dat_3fdf44_idx'),
+        ),
+    ]
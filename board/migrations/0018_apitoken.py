@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0017_assignment_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100, verbose_name='设备名称')),
+                ('key_hash', models.CharField(max_length=64, unique=True, verbose_name='令牌哈希')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='最后使用时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_tokens', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': 'API令牌',
+                'verbose_name_plural': 'API令牌',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:51
+
+import math
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_heat_columns(apps, schema_editor):
+    """根据现有点赞和评论初始化热搜的热度汇总字段"""
+    HotTopic = apps.get_model('board', 'HotTopic')
+    Comment = apps.get_model('board', 'Comment')
+
+    for topic in HotTopic.objects.annotate(num_likes=Count('likes')):
+        comments = Comment.objects.filter(topic=topic).order_by().annotate(
+            num_likes=Count('likes', distinct=True),
+            num_replies=Count('replies', distinct=True),
+        ).values_list('created_at', 'num_likes', 'num_replies')
+        comments_heat_sum = 0
+        for created_at, num_likes, num_replies in comments:
+            time_diff = created_at - topic.created_at
+            days = time_diff.days + time_diff.seconds / 86400
+            comments_heat_sum += (1 + num_likes + num_replies) * math.exp(0.15 * days)
+        HotTopic.objects.filter(id=topic.id).update(
+            likes_total=topic.num_likes,
+            comments_heat_sum=comments_heat_sum,
+            base_score=5 + topic.num_likes,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0018_apitoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hottopic',
+            name='base_score',
+            field=models.FloatField(default=5, verbose_name='基础热度'),
+        ),
+        migrations.AddField(
+            model_name='hottopic',
+            name='comments_heat_sum',
+            field=models.FloatField(default=0, verbose_name='评论热度总和'),
+        ),
+        migrations.AddField(
+            model_name='hottopic',
+            name='likes_total',
+            field=models.IntegerField(default=0, verbose_name='点赞总数'),
+        ),
+        migrations.RunPython(populate_heat_columns, migrations.RunPython.noop),
+    ]
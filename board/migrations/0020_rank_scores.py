@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:55
+
+import math
+from datetime import datetime
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _epoch_days(value):
+    time_diff = value - datetime(1970, 1, 1)
+    return time_diff.days + time_diff.seconds / 86400
+
+
+def populate_rank_scores(apps, schema_editor):
+    """为现有热搜、评论和评分计算排序分数 log(热度信号) + k * 发布时间（天）"""
+    HotTopic = apps.get_model('board', 'HotTopic')
+    Rating = apps.get_model('board', 'Rating')
+
+    for topic in HotTopic.objects.all():
+        rank_score = math.log(topic.base_score + topic.comments_heat_sum) + 0.1 * _epoch_days(topic.created_at)
+        HotTopic.objects.filter(id=topic.id).update(rank_score=rank_score)
+
+    for model_name in ('Comment', 'RatingComment'):
+        model = apps.get_model('board', model_name)
+        comments = model.objects.order_by().annotate(
+            num_likes=Count('likes', distinct=True),
+            num_replies=Count('replies', distinct=True),
+        )
+        for comment in comments:
+            rank_score = math.log(1 + comment.num_likes + comment.num_replies) + 0.15 * _epoch_days(comment.created_at)
+            model.objects.filter(id=comment.id).update(rank_score=rank_score)
+
+    ratings = Rating.objects.order_by().annotate(
+        num_ratings=Count('user_ratings', distinct=True),
+        num_comments=Count('comments', distinct=True),
+    )
+    for rating in ratings:
+        signals = 10 + rating.num_ratings + rating.num_comments * 2
+        rank_score = math.log(signals) + 0.05 * _epoch_days(rating.created_at)
+        Rating.objects.filter(id=rating.id).update(rank_score=rank_score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0019_hottopic_heat_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='rank_score',
+            field=models.FloatField(default=0, verbose_name='排序分数'),
+        ),
+        migrations.AddField(
+            model_name='hottopic',
+            name='rank_score',
+            field=models.FloatField(default=0, verbose_name='排序分数'),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='rank_score',
+            field=models.FloatField(db_index=True, default=0, verbose_name='排序分数'),
+        ),
+        migrations.AddField(
+            model_name='ratingcomment',
+            name='rank_score',
+            field=models.FloatField(default=0, verbose_name='排序分数'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['topic', 'rank_score'], name='board_comme_topic_i_6e88dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hottopic',
+            index=models.Index(fields=['is_pinned', 'rank_score'], name='board_hotto_is_pinn_aa7799_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ratingcomment',
+            index=models.Index(fields=['rating', 'rank_score'], name='board_ratin_rating__f17ae7_idx'),
+        ),
+        migrations.RunPython(populate_rank_scores, migrations.RunPython.noop),
+    ]
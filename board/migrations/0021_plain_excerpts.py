@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0020_rank_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='plain_excerpt',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='纯文本摘要'),
+        ),
+        migrations.AddField(
+            model_name='hottopic',
+            name='plain_excerpt',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='纯文本摘要'),
+        ),
+        migrations.AddField(
+            model_name='ratingcomment',
+            name='plain_excerpt',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='纯文本摘要'),
+        ),
+    ]
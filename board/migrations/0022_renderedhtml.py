@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0021_plain_excerpts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedHtml',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='内容哈希')),
+                ('renderer_version', models.CharField(max_length=16, verbose_name='渲染器版本')),
+                ('html', models.TextField(verbose_name='渲染结果')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '渲染缓存',
+                'verbose_name_plural': '渲染缓存',
+                'unique_together': {('content_hash', 'renderer_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0022_renderedhtml'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['topic', 'created_at', 'id'], name='board_comme_topic_i_2342f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hottopic',
+            index=models.Index(fields=['created_at', 'id'], name='board_hotto_created_ad91e5_idx'),
+        ),
+    ]
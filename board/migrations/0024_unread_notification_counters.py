@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def populate_unread_counters(apps, schema_editor):
+    """根据现有的未读通知初始化未读计数器"""
+    Notification = apps.get_model('board', 'Notification')
+    UnreadNotificationCounter = apps.get_model('board', 'UnreadNotificationCounter')
+
+    unread = Notification.objects.filter(is_read=False).order_by().values_list(
+        'recipient_id', 'type'
+    ).annotate(count=Count('id'))
+    UnreadNotificationCounter.objects.bulk_create([
+        UnreadNotificationCounter(user_id=user_id, type=notification_type, count=count)
+        for user_id, notification_type, count in unread
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0023_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('like', '点赞'), ('reply', '回复'), ('system', '系统')], max_length=10, verbose_name='通知类型')),
+                ('count', models.IntegerField(default=0, verbose_name='未读数量')),
+            ],
+            options={
+                'verbose_name': '未读通知计数',
+                'verbose_name_plural': '未读通知计数',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', 'type', 'created_at'], name='board_notif_recipie_c3440a_idx'),
+        ),
+        migrations.AddField(
+            model_name='unreadnotificationcounter',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to=settings.AUTH_USER_MODEL, verbose_name='用户'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='unreadnotificationcounter',
+            unique_together={('user', 'type')},
+        ),
+        migrations.RunPython(populate_unread_counters, migrations.RunPython.noop),
+    ]
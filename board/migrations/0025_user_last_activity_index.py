@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0024_unread_notification_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='最后活动时间'),
+        ),
+    ]
@@ -1,10 +1,11 @@
 import math
+import threading
 from datetime import datetime
 
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
-from django.db.models.signals import post_migrate
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -19,7 +20,7 @@ class User(AbstractUser):
     avatar = models.URLField(blank=True, null=True)
     student_id = models.CharField(max_length=10, blank=True, null=True, verbose_name='学号')
     hidden_subjects = models.ManyToManyField('Subject', blank=True, related_name='hidden_by_users')
-    last_activity = models.DateTimeField(blank=True, null=True, verbose_name='最后活动时间')
+    last_activity = models.DateTimeField(blank=True, null=True, db_index=True, verbose_name='最后活动时间')
 
     def __str__(self):
         if self.user_type == 'student' and self.student_id:
@@ -28,10 +29,45 @@ class User(AbstractUser):
 
     @property
     def is_online(self):
-        """判断用户是否在线，最后活动时间在3分钟内则视为在线"""
-        if not self.last_activity:
+        """判断用户是否在线，最后活动时间（包括尚未写入数据库的记录）在3分钟内则视为在线"""
+        from .activity import ONLINE_WINDOW, last_seen
+        seen_at = last_seen(self)
+        if not seen_at:
             return False
-        return (timezone.now() - self.last_activity).total_seconds() < 180  # 3分钟
+        return (timezone.now() - seen_at).total_seconds() < ONLINE_WINDOW
+
+
+class ApiToken(models.Model):
+    """桌面客户端等设备使用的API令牌，只保存令牌的哈希值"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens', verbose_name="用户")
+    name = models.CharField(max_length=100, blank=True, verbose_name="设备名称")
+    key_hash = models.CharField(max_length=64, unique=True, verbose_name="令牌哈希")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    last_used_at = models.DateTimeField(null=True, blank=True, verbose_name="最后使用时间")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "API令牌"
+        verbose_name_plural = "API令牌"
+
+    def __str__(self):
+        return f"{self.user.username} 的令牌 {self.name or self.id}"
+
+
+class RenderedHtml(models.Model):
+    """Markdown渲染结果缓存，按内容哈希和渲染器版本保存，渲染配置变化后旧版本的结果不再使用"""
+    content_hash = models.CharField(max_length=64, verbose_name="内容哈希")
+    renderer_version = models.CharField(max_length=16, verbose_name="渲染器版本")
+    html = models.TextField(verbose_name="渲染结果")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        unique_together = ['content_hash', 'renderer_version']
+        verbose_name = "渲染缓存"
+        verbose_name_plural = "渲染缓存"
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.renderer_version})"
 
 
 class Subject(models.Model):
@@ -41,6 +77,33 @@ class Subject(models.Model):
         return self.name
 
 
+class AssignmentQuerySet(models.QuerySet):
+    def with_completion_stats(self):
+        """根据作业上维护的完成计数器标注 completion_percentage，无需关联完成记录"""
+        return self.annotate(
+            completion_percentage=models.Case(
+                models.When(total_count=0, then=models.Value(0)),
+                default=models.F('completed_count') * 100 / models.F('total_count'),
+                output_field=models.IntegerField(),
+            )
+        )
+
+    def with_live_completion_stats(self):
+        """用一次聚合查询从完成记录实时统计 live_completed_count 和 live_total_count，用于校对计数器"""
+        from .completion import sparse_completion_enabled
+
+        if sparse_completion_enabled():
+            # 稀疏模式下没有记录的学生视为未完成，总人数即学生总数
+            live_total_count = models.Value(User.objects.filter(user_type='student').count(), output_field=models.IntegerField())
+        else:
+            live_total_count = models.Count('completion_records')
+
+        return self.annotate(
+            live_completed_count=models.Count('completion_records', filter=models.Q(completion_records__completed=True)),
+            live_total_count=live_total_count,
+        )
+
+
 class Assignment(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -49,12 +112,75 @@ class Assignment(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # 完成情况计数器，随完成记录的创建、切换和学生删除同步更新
+    completed_count = models.IntegerField(default=0, verbose_name='完成人数')
+    total_count = models.IntegerField(default=0, verbose_name='总人数')
+
+    objects = AssignmentQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title} - {self.subject.name}"
 
     class Meta:
         ordering = ['end_date']
+        indexes = [
+            # 按日期范围查询学生当天作业和日历标记
+            models.Index(fields=['start_date', 'end_date']),
+            models.Index(fields=['end_date']),
+        ]
+
+
+class FreeAssignmentId(models.Model):
+    """已删除作业留下的空闲ID，新作业优先复用其中最小的一个"""
+    id = models.BigIntegerField(primary_key=True)
+
+    class Meta:
+        verbose_name = "空闲作业ID"
+        verbose_name_plural = "空闲作业ID"
+
+    def __str__(self):
+        return str(self.id)
+
+
+class _ReleasedAssignmentIds:
+    """同一事务中被删除的作业ID，事务提交后一次写入空闲ID表"""
+
+    def __init__(self, using):
+        self.using = using
+        self.ids = set()
+        self.saved = False
+
+    def save(self):
+        self.saved = True
+        FreeAssignmentId.objects.using(self.using).bulk_create(
+            [FreeAssignmentId(id=assignment_id) for assignment_id in sorted(self.ids)],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+# 数据库别名 -> 当前事务中收集的作业ID，数据库连接属于各个线程，收集的ID也按线程保存
+_released_assignment_ids = threading.local()
+
+
+@receiver(post_delete, sender=Assignment)
+def release_assignment_id(sender, instance, using, **kwargs):
+    """作业被删除时（包括级联删除和批量删除）回收其ID
+
+    删除总是在事务中进行，同一事务中删除的ID先收集起来，提交后用一条 INSERT 写入，
+    批量删除和级联删除不必每个作业单独查询一次。事务回滚时不回收；
+    已被占用的空闲ID在分配时会被跳过，因此多回收也不会出错。
+    """
+    connection = transaction.get_connection(using)
+    batch = getattr(_released_assignment_ids, using, None)
+    # 提交或回滚后，登记的回调已从连接中移除，需要重新开始收集
+    if batch is None or batch.saved or not any(entry[1] == batch.save for entry in connection.run_on_commit):
+        batch = _ReleasedAssignmentIds(using)
+        setattr(_released_assignment_ids, using, batch)
+        batch.ids.add(instance.id)
+        transaction.on_commit(batch.save, using=using)
+    else:
+        batch.ids.add(instance.id)
 
 
 class CompletionRecord(models.Model):
@@ -74,6 +200,72 @@ class CompletionRecord(models.Model):
         return f"{student_info} - {self.assignment.title} ({status})"
 
 
+@receiver([post_save, post_delete], sender=Assignment)
+def invalidate_today_homework_for_assignment(sender, **kwargs):
+    """作业变化时使所有学生缓存的今日作业失效"""
+    from .homework import bump_assignments_version
+    bump_assignments_version()
+
+
+@receiver(post_save, sender=Subject)
+def invalidate_today_homework_for_subject(sender, **kwargs):
+    """科目改名后使缓存的作业快照和今日作业失效"""
+    from .homework import bump_assignments_version
+    bump_assignments_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_today_homework_for_teacher(sender, instance, created=False, update_fields=None, **kwargs):
+    """教师信息修改后使缓存的作业快照失效，快照中的作业带有教师信息"""
+    if created or instance.user_type != 'teacher':
+        return
+    # 登录时只更新 last_login，不影响快照
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    from .homework import bump_assignments_version
+    bump_assignments_version()
+
+
+@receiver([post_save, post_delete], sender=CompletionRecord)
+def invalidate_today_homework_for_record(sender, instance, **kwargs):
+    """完成状态变化时使该学生缓存的今日作业失效"""
+    from .homework import bump_student_version
+    bump_student_version(instance.student_id)
+
+
+@receiver(m2m_changed, sender=User.hidden_subjects.through)
+def invalidate_today_homework_for_hidden_subjects(sender, instance, action, reverse, **kwargs):
+    """隐藏科目变化时使相关学生缓存的今日作业失效"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .homework import bump_assignments_version, bump_student_version
+    if reverse:
+        # 从科目一侧修改时无法确定涉及的学生，直接使所有缓存失效
+        bump_assignments_version()
+    else:
+        bump_student_version(instance.id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_api_tokens_for_user(sender, instance, created=False, **kwargs):
+    """用户保存或删除后清除其令牌缓存；修改密码时吊销该用户的全部令牌"""
+    from .api_tokens import forget_user_tokens, revoke_user_tokens
+
+    # set_password() 设置的 _password 在 save() 完成后才被清空，post_save 中仍可据此判断密码是否修改
+    if not created and getattr(instance, '_password', None) is not None:
+        revoke_user_tokens(instance.id)
+    else:
+        forget_user_tokens(instance.id)
+
+
+@receiver(pre_delete, sender=User)
+def release_student_completion_counters(sender, instance, **kwargs):
+    """删除学生前，从相关作业的完成计数器中扣除该学生"""
+    if instance.user_type == 'student':
+        from .completion import release_student_counters
+        release_student_counters(instance)
+
+
 @receiver(post_migrate)
 def create_subjects(sender, **kwargs):
     """确保科目数据在应用迁移后存在"""
@@ -93,18 +285,48 @@ class HotTopic(models.Model):
     title = models.CharField(max_length=200, verbose_name="标题")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hot_topics', verbose_name="发布者")
     content = models.TextField(verbose_name="内容", blank=True, null=True)
+    # 保存时由内容生成的纯文本摘要，列表页直接读取，无需每次去除Markdown标记
+    plain_excerpt = models.CharField(max_length=200, blank=True, default='', verbose_name="纯文本摘要")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     is_pinned = models.BooleanField(default=False, verbose_name="是否置顶")
     is_anonymous = models.BooleanField(default=False, verbose_name="是否匿名")
+    # 热度计算所需的汇总数据，由点赞、评论和回复的变化同步更新，用于热搜排序
+    likes_total = models.IntegerField(default=0, verbose_name="点赞总数")
+    comments_heat_sum = models.FloatField(default=0, verbose_name="评论热度总和")
+    base_score = models.FloatField(default=5, verbose_name="基础热度")
+    # 与时间无关的排序分数 log(热度信号) + k * 发布时间（天），排序结果与实时热度一致
+    rank_score = models.FloatField(default=0, verbose_name="排序分数")
 
     class Meta:
         ordering = ['-is_pinned', '-created_at']
+        indexes = [
+            models.Index(fields=['is_pinned', 'rank_score']),
+            models.Index(fields=['created_at', 'id']),
+        ]
         verbose_name = "热搜"
         verbose_name_plural = "热搜"
 
+    # 由点赞和评论按增量维护的字段，保存实例时不写入，避免过期的实例覆盖数据库中的值
+    HEAT_FIELDS = ('likes_total', 'comments_heat_sum', 'base_score', 'rank_score')
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记下载入时的发布时间，保存后据此判断评论的折算权重是否需要重新汇总
+        instance._heat_key = instance.__dict__.get('created_at')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.HEAT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def likes_count(self):
         return self.likes.count()
@@ -151,31 +373,71 @@ class HotTopicLike(models.Model):
         return f"{self.user.username} 点赞了 {self.topic.title}"
 
 
+class CommentQuerySet(models.QuerySet):
+    def with_engagement(self):
+        """一次查询标注点赞数 num_likes 和回复数 num_replies，并关联查询作者
+
+        评论的 likes_count、replies_count 和 heat_score 会优先使用标注值，列表中不再逐条统计。
+        """
+        return self.select_related('author').annotate(
+            num_likes=models.Count('likes', distinct=True),
+            num_replies=models.Count('replies', distinct=True),
+        )
+
+    def with_liked_by(self, user):
+        """用 EXISTS 子查询标注当前用户是否点赞过每条评论，结果保存在 is_liked 字段中"""
+        if not user.is_authenticated:
+            return self.annotate(is_liked=models.Value(False, output_field=models.BooleanField()))
+        like_model = self.model.likes.rel.related_model
+        return self.annotate(
+            is_liked=models.Exists(like_model.objects.filter(comment=models.OuterRef('pk'), user=user))
+        )
+
+
 class Comment(models.Model):
     """热搜评论模型"""
     topic = models.ForeignKey(HotTopic, on_delete=models.CASCADE, related_name='comments', verbose_name="所属热搜")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments', verbose_name="评论者")
     content = models.TextField(verbose_name="评论内容")
+    plain_excerpt = models.CharField(max_length=200, blank=True, default='', verbose_name="纯文本摘要")
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name="引用评论")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="评论时间")
     is_anonymous = models.BooleanField(default=False, verbose_name="是否匿名")
+    rank_score = models.FloatField(default=0, verbose_name="排序分数")
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['topic', 'rank_score']),
+            models.Index(fields=['topic', 'created_at', 'id']),
+        ]
         verbose_name = "评论"
         verbose_name_plural = "评论"
 
     def __str__(self):
         return f"{self.author.username} 评论了 {self.topic.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记下载入时影响热搜热度的字段，保存后据此判断能否按增量更新
+        instance._heat_key = _comment_heat_key(instance)
+        return instance
     
     @property
     def likes_count(self):
-        """获取评论点赞数"""
+        """获取评论点赞数，优先使用 with_engagement() 的标注值"""
+        if hasattr(self, 'num_likes'):
+            return self.num_likes
         return self.likes.count()
     
     @property
     def replies_count(self):
-        """获取回复数"""
+        """获取回复数，优先使用 with_engagement() 的标注值"""
+        if hasattr(self, 'num_replies'):
+            return self.num_replies
         return self.replies.count()
     
     @property
@@ -214,6 +476,78 @@ class CommentLike(models.Model):
         return f"{self.user.username} 点赞了评论 {self.comment.id}"
 
 
+def _comment_heat_key(comment):
+    """影响热搜评论热度总和的评论字段：发布时间、所属热搜和上级评论"""
+    return tuple(comment.__dict__.get(field) for field in ('created_at', 'topic_id', 'parent_id'))
+
+
+@receiver([post_save, post_delete], sender=HotTopicLike)
+def update_topic_heat_for_like(sender, instance, signal, created=False, **kwargs):
+    """热搜点赞增删时按增量更新热搜的点赞总数、基础热度和排序分数"""
+    from .ranking import apply_topic_heat_delta
+    if signal is post_save and not created:
+        return
+    apply_topic_heat_delta(instance.topic_id, likes=1 if signal is post_save else -1)
+
+
+@receiver(pre_delete, sender=Comment)
+def remember_comment_topic_heat(sender, instance, **kwargs):
+    """删除前记下评论计入热搜热度的部分，级联删除时其上级评论在删除信号发出前可能已不存在"""
+    from .ranking import comment_topic_heat
+    instance._topic_heat = comment_topic_heat(instance)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def refresh_rank_for_comment(sender, instance, signal, created=False, **kwargs):
+    """评论或回复变化时更新评论、被回复的评论以及所属热搜的热度
+
+    新建和删除按增量更新热搜；修改了发布时间、所属热搜或上级评论时无法按增量计算，重新汇总相关热搜。
+    """
+    from .ranking import apply_topic_heat_delta, comment_topic_heat, refresh_comment_rank, refresh_topic_heat
+    if signal is post_save:
+        refresh_comment_rank(Comment, instance.id)
+        if created:
+            apply_topic_heat_delta(instance.topic_id, comments_heat=comment_topic_heat(instance))
+        else:
+            previous = getattr(instance, '_heat_key', None)
+            if previous != _comment_heat_key(instance):
+                refresh_topic_heat(instance.topic_id)
+                if previous and previous[1] != instance.topic_id:
+                    refresh_topic_heat(previous[1])
+                if previous and previous[2] and previous[2] != instance.parent_id:
+                    refresh_comment_rank(Comment, previous[2])
+        instance._heat_key = _comment_heat_key(instance)
+    else:
+        apply_topic_heat_delta(instance.topic_id, comments_heat=-getattr(instance, '_topic_heat', 0.0))
+    if instance.parent_id:
+        refresh_comment_rank(Comment, instance.parent_id)
+
+
+@receiver([post_save, post_delete], sender=CommentLike)
+def refresh_rank_for_comment_like(sender, instance, signal, created=False, **kwargs):
+    """评论点赞增删时更新评论的排序分数，并按增量更新所属热搜的热度"""
+    from .ranking import apply_topic_heat_delta, comment_like_heat, refresh_comment_rank
+    if signal is post_save and not created:
+        return
+    # 级联删除评论时点赞先于评论删除，此时评论仍然存在，点赞照常从热度中扣除
+    like_heat = comment_like_heat(instance.comment_id)
+    if like_heat is not None:
+        topic_id, heat = like_heat
+        refresh_comment_rank(Comment, instance.comment_id)
+        apply_topic_heat_delta(topic_id, comments_heat=heat if signal is post_save else -heat)
+
+
+@receiver(post_save, sender=HotTopic)
+def refresh_topic_heat_on_save(sender, instance, created, **kwargs):
+    """新建热搜时计算初始的排序分数；发布时间被修改会改变评论的折算权重，此时重新汇总热度字段"""
+    from .ranking import refresh_topic_heat, refresh_topic_rank
+    if created:
+        refresh_topic_rank(instance.id, instance.created_at)
+    elif getattr(instance, '_heat_key', None) != instance.created_at:
+        refresh_topic_heat(instance.id)
+    instance._heat_key = instance.created_at
+
+
 class Notification(models.Model):
     """用户通知模型"""
     TYPE_CHOICES = (
@@ -232,6 +566,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'type', 'created_at']),
+        ]
         verbose_name = "通知"
         verbose_name_plural = "通知"
 
@@ -239,6 +576,21 @@ class Notification(models.Model):
         return f"{self.get_type_display()} 通知给 {self.recipient.username}"
 
 
+class UnreadNotificationCounter(models.Model):
+    """用户每种类型的未读通知数量，读取未读数时不再统计通知表"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='unread_counters', verbose_name="用户")
+    type = models.CharField(max_length=10, choices=Notification.TYPE_CHOICES, verbose_name="通知类型")
+    count = models.IntegerField(default=0, verbose_name="未读数量")
+
+    class Meta:
+        unique_together = ('user', 'type')
+        verbose_name = "未读通知计数"
+        verbose_name_plural = "未读通知计数"
+
+    def __str__(self):
+        return f"{self.user.username} 的{self.get_type_display()}未读数: {self.count}"
+
+
 class DeviceLogin(models.Model):
     """设备登录记录模型"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_logins', verbose_name="用户")
@@ -265,6 +617,7 @@ class Rating(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     is_active = models.BooleanField(default=True, verbose_name="是否激活")
     is_anonymous = models.BooleanField(default=False, verbose_name="匿名发布")
+    rank_score = models.FloatField(default=0, db_index=True, verbose_name="排序分数")
 
     class Meta:
         ordering = ['-created_at']
@@ -290,12 +643,8 @@ class Rating(models.Model):
     @property
     def hot_comments(self):
         """获取热门评论，按照评论热度排序"""
-        # 获取所有评论
-        comments = list(self.comments.all())
-        # 使用Python排序，按照heat_score属性降序排序
-        comments.sort(key=lambda x: x.heat_score, reverse=True)
-        # 返回前3个评论
-        return comments[:3]
+        # 排序分数与评论热度的顺序一致，可以直接由数据库排序并返回前3个评论
+        return list(self.comments.order_by('-rank_score', '-created_at')[:3])
     
     @property
     def heat_score(self):
@@ -341,12 +690,19 @@ class RatingComment(models.Model):
     rating = models.ForeignKey(Rating, on_delete=models.CASCADE, related_name='comments', verbose_name="所属评分")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rating_comments', verbose_name="评论者")
     content = models.TextField(verbose_name="评论内容", help_text="支持Markdown语法")
+    plain_excerpt = models.CharField(max_length=200, blank=True, default='', verbose_name="纯文本摘要")
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name="引用评论")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="评论时间")
     is_anonymous = models.BooleanField(default=False, verbose_name="是否匿名")
+    rank_score = models.FloatField(default=0, verbose_name="排序分数")
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['rating', 'rank_score']),
+        ]
         verbose_name = "评分评论"
         verbose_name_plural = "评分评论"
 
@@ -355,12 +711,16 @@ class RatingComment(models.Model):
     
     @property
     def likes_count(self):
-        """获取评论点赞数"""
+        """获取评论点赞数，优先使用 with_engagement() 的标注值"""
+        if hasattr(self, 'num_likes'):
+            return self.num_likes
         return self.likes.count()
     
     @property
     def replies_count(self):
-        """获取回复数"""
+        """获取回复数，优先使用 with_engagement() 的标注值"""
+        if hasattr(self, 'num_replies'):
+            return self.num_replies
         return self.replies.count()
     
     @property
@@ -395,3 +755,70 @@ class RatingCommentLike(models.Model):
 
     def __str__(self):
         return f"{self.user.username} 点赞了评分评论 {self.comment.id}"
+
+
+@receiver(pre_save, sender=HotTopic)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=RatingComment)
+def update_plain_excerpt(sender, instance, **kwargs):
+    """保存热搜或评论前根据内容生成纯文本摘要"""
+    from .markup import make_plain_excerpt
+    instance.plain_excerpt = make_plain_excerpt(instance.content)
+
+
+@receiver(post_save, sender=Rating)
+def refresh_rank_on_rating_save(sender, instance, **kwargs):
+    """评分项目保存后重新计算排序分数"""
+    from .ranking import refresh_rating_rank
+    refresh_rating_rank(instance.id)
+
+
+@receiver([post_save, post_delete], sender=UserRating)
+def refresh_rank_for_user_rating(sender, instance, **kwargs):
+    """用户评分变化时更新评分项目的排序分数"""
+    from .ranking import refresh_rating_rank
+    refresh_rating_rank(instance.rating_id)
+
+
+@receiver([post_save, post_delete], sender=RatingComment)
+def refresh_rank_for_rating_comment(sender, instance, signal, **kwargs):
+    """评分评论或回复变化时更新评论、被回复的评论以及评分项目的排序分数"""
+    from .ranking import refresh_comment_rank, refresh_rating_rank
+    if signal is post_save:
+        refresh_comment_rank(RatingComment, instance.id)
+    if instance.parent_id:
+        refresh_comment_rank(RatingComment, instance.parent_id)
+    refresh_rating_rank(instance.rating_id)
+
+
+@receiver([post_save, post_delete], sender=RatingCommentLike)
+def refresh_rank_for_rating_comment_like(sender, instance, **kwargs):
+    """评分评论点赞变化时更新评论的排序分数"""
+    from .ranking import refresh_comment_rank
+    refresh_comment_rank(RatingComment, instance.comment_id)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_counter_on_save(sender, instance, created, **kwargs):
+    """新的未读通知使计数器加一，已有通知被修改时重新统计该类型的未读数"""
+    from .unread_counters import increment_unread, refresh_unread_counters
+    if not created:
+        refresh_unread_counters(instance.recipient_id, [instance.type])
+    elif not instance.is_read:
+        increment_unread(instance.recipient_id, instance.type)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_counter_on_delete(sender, instance, **kwargs):
+    """删除未读通知时重新统计该类型的未读数"""
+    from .unread_counters import refresh_unread_counters
+    if not instance.is_read:
+        # 删除用户时通知随之级联删除，此时不能再为该用户创建计数器
+        refresh_unread_counters(instance.recipient_id, [instance.type], create_missing=False)
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def notify_unread_count_changed(sender, instance, **kwargs):
+    """通知创建、修改或删除时唤醒接收者挂起的未读数长轮询请求"""
+    from .unread_channel import notify_unread_changed
+    notify_unread_changed(instance.recipient_id)
@@ -0,0 +1,100 @@
+"""基于 (created_at, id) 的游标分页
+
+Paginator 使用 OFFSET 翻页，每次请求还要额外执行 COUNT(*) 统计页数，越往后翻越慢。
+游标分页记录当前页首尾记录的 (created_at, id)，翻页时直接从该位置沿索引继续读取，
+任意位置翻页的代价都相同。游标对前端是不透明的字符串，总数只在需要时才统计。
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+# 每页默认条数
+PER_PAGE = 10
+
+NEXT = 'next'
+PREVIOUS = 'prev'
+
+
+class CursorPage:
+    """游标分页的一页数据，可以像 Paginator 的 Page 一样在模板中迭代"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # 只有要求统计总数时才有值，否则为 None
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(direction, obj):
+    """把翻页方向和记录的 (created_at, id) 编码为不透明的游标字符串"""
+    payload = json.dumps([direction, obj.created_at.isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (方向, created_at, id)，游标为空或无效时返回 None"""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, created_at, pk = json.loads(payload)
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate_by_cursor(queryset, cursor=None, per_page=PER_PAGE, with_count=False):
+    """按 (created_at, id) 从新到旧对查询集做游标分页，返回 CursorPage
+
+    cursor 为上一次返回的 next_cursor 或 previous_cursor，为空或无效时返回第一页；
+    with_count 为 True 时才额外执行 COUNT(*) 统计总数。
+    """
+    count = queryset.count() if with_count else None
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by('-created_at', '-id')[:per_page + 1])
+        has_next, has_previous = len(rows) > per_page, False
+        rows = rows[:per_page]
+    elif position[0] == NEXT:
+        _, created_at, pk = position
+        rows = list(queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        ).order_by('-created_at', '-id')[:per_page + 1])
+        has_next, has_previous = len(rows) > per_page, True
+        rows = rows[:per_page]
+    else:
+        # 向前翻页时按相反顺序读取，再翻转回从新到旧
+        _, created_at, pk = position
+        rows = list(queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        ).order_by('created_at', 'id')[:per_page + 1])
+        has_next, has_previous = True, len(rows) > per_page
+        rows = rows[:per_page][::-1]
+
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(NEXT, rows[-1]) if rows and has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, rows[0]) if rows and has_previous else None,
+        count=count,
+    )
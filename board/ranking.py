@@ -0,0 +1,301 @@
+"""热搜、评论和评分的热度汇总与排序
+
+各类热度都形如 (基础热度 + 信号) * e^(-k * (t - t0))，会随时间不断变化，无法建立索引。
+把它取对数后可以拆成 log(基础热度 + 信号) + k * t0 - k * t，前两项与当前时间无关，
+保存为 rank_score 后按其降序排列即与实时热度的顺序一致，实时热度只需为返回的记录计算。
+"""
+import math
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Func, OuterRef, Subquery, Value, Window
+from django.db.models.functions import Exp, Ln, RowNumber
+from django.utils import timezone
+
+from .models import HotTopic, Comment, Rating
+
+# 热搜的基础热度和衰减因子，与 HotTopic.heat_score 保持一致
+TOPIC_BASE_SCORE = 5
+TOPIC_DECAY = 0.1
+# 评论的衰减因子，与 Comment.heat_score 和 RatingComment.heat_score 保持一致
+COMMENT_DECAY = 0.15
+# 评分的基础热度、评论权重和衰减因子，与 Rating.heat_score 保持一致
+RATING_BASE_SCORE = 10
+RATING_COMMENT_WEIGHT = 2
+RATING_DECAY = 0.05
+
+# 首页展示的热搜数量
+HOT_TOPICS_LIMIT = 10
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+_JULIAN_UNIX_EPOCH = 2440587.5
+
+
+def _days_between(later, earlier):
+    """两个时间之间相差的天数（精确到秒），与热度属性的计算方式相同"""
+    time_diff = later - earlier
+    return time_diff.days + time_diff.seconds / 86400
+
+
+def epoch_days(value):
+    """把（不带时区的）时间转换为距1970年1月1日的天数"""
+    return _days_between(value, _UNIX_EPOCH)
+
+
+def julian_day(value):
+    """把（不带时区的）时间转换为儒略日，与SQLite的 julianday() 结果一致"""
+    return epoch_days(value) + _JULIAN_UNIX_EPOCH
+
+
+class JulianDay(Func):
+    """SQLite的 julianday() 函数，把时间字段转换为以天为单位的浮点数"""
+    function = 'julianday'
+    output_field = FloatField()
+
+
+def log_rank_score(signals, created_at, decay):
+    """计算与时间无关的排序分数 log(signals) + decay * 发布时间（天）"""
+    return math.log(signals) + decay * epoch_days(created_at)
+
+
+def rank_score_to_heat(rank_score, decay, now=None):
+    """由排序分数还原出当前时刻的热度"""
+    return math.exp(rank_score - decay * epoch_days(now or timezone.now()))
+
+
+def comment_heat_weight(comment_created_at, topic_created_at):
+    """评论热度折算到热搜发布时刻的权重
+
+    评论热度 (1 + 点赞数 + 回复数) * e^(-0.15 * (t - tc)) 可以拆成
+    e^(-0.15 * (t - t0)) * e^(0.15 * (tc - t0))，后一项与当前时间无关，可以预先存储。
+    """
+    return math.exp(COMMENT_DECAY * _days_between(comment_created_at, topic_created_at))
+
+
+def compute_topic_heat_columns(topic):
+    """根据点赞和评论重新计算热搜的热度汇总字段，返回字段字典
+
+    热搜的评论热度衰减得比热搜本身快，rank_score 取评论尚未衰减时的热度，
+    是实时热度在对数空间中的上界，没有评论时与实时热度完全一致。
+    """
+    likes_total = topic.likes.count()
+    comments = Comment.objects.filter(topic=topic).order_by().annotate(
+        num_likes=Count('likes', distinct=True),
+        num_replies=Count('replies', distinct=True),
+    ).values_list('created_at', 'num_likes', 'num_replies')
+    comments_heat_sum = sum(
+        (1 + num_likes + num_replies) * comment_heat_weight(created_at, topic.created_at)
+        for created_at, num_likes, num_replies in comments
+    )
+    base_score = TOPIC_BASE_SCORE + likes_total
+    return {
+        'likes_total': likes_total,
+        'comments_heat_sum': comments_heat_sum,
+        'base_score': base_score,
+        'rank_score': log_rank_score(base_score + comments_heat_sum, topic.created_at, TOPIC_DECAY),
+    }
+
+
+def refresh_topic_heat(topic_id):
+    """重新汇总并保存单个热搜的热度字段，热搜不存在时忽略
+
+    需要统计热搜的全部评论，只用于发布时间被修改等无法按增量更新的情况，日常的点赞和评论
+    通过 apply_topic_heat_delta 更新。
+    """
+    try:
+        topic = HotTopic.objects.only('id', 'created_at').get(id=topic_id)
+    except HotTopic.DoesNotExist:
+        return
+    HotTopic.objects.filter(id=topic_id).update(**compute_topic_heat_columns(topic))
+
+
+def _topic_created_at(topic_id):
+    return HotTopic.objects.filter(id=topic_id).values_list('created_at', flat=True).first()
+
+
+def refresh_topic_rank(topic_id, created_at):
+    """由保存的基础热度和评论热度总和重新计算热搜的排序分数，与 log_rank_score 的结果相同"""
+    HotTopic.objects.filter(id=topic_id).update(
+        rank_score=Ln(F('base_score') + F('comments_heat_sum')) + Value(TOPIC_DECAY * epoch_days(created_at))
+    )
+
+
+def apply_topic_heat_delta(topic_id, likes=0, comments_heat=0.0):
+    """按增量更新热搜的热度汇总字段，再由保存的字段重新计算排序分数，热搜不存在时忽略
+
+    likes 为点赞数的变化，comments_heat 为评论热度总和的变化（已折算到热搜发布时刻）。
+    """
+    created_at = _topic_created_at(topic_id)
+    if created_at is None:
+        return
+    with transaction.atomic():
+        HotTopic.objects.filter(id=topic_id).update(
+            likes_total=F('likes_total') + likes,
+            base_score=F('base_score') + likes,
+            comments_heat_sum=F('comments_heat_sum') + comments_heat,
+        )
+        refresh_topic_rank(topic_id, created_at)
+
+
+def comment_like_heat(comment_id):
+    """评论的一个点赞计入所属热搜评论热度总和的部分，返回 (热搜ID, 热度)，评论不存在时返回 None"""
+    row = Comment.objects.filter(id=comment_id).values_list('topic_id', 'created_at', 'topic__created_at').first()
+    if row is None:
+        return None
+    topic_id, created_at, topic_created_at = row
+    return topic_id, comment_heat_weight(created_at, topic_created_at)
+
+
+def comment_topic_heat(comment):
+    """评论本身计入所属热搜评论热度总和的部分：自身的 1，以及作为回复为上级评论增加的 1
+
+    评论的点赞和回复由各自的增删单独计入，这里不包括。
+    """
+    topic_created_at = _topic_created_at(comment.topic_id)
+    if topic_created_at is None:
+        return 0.0
+    heat = comment_heat_weight(comment.created_at, topic_created_at)
+    if comment.parent_id:
+        parent_created_at = Comment.objects.filter(id=comment.parent_id).values_list('created_at', flat=True).first()
+        if parent_created_at is not None:
+            heat += comment_heat_weight(parent_created_at, topic_created_at)
+    return heat
+
+
+def recount_topic_heat(dry_run=False):
+    """根据点赞和评论重新汇总所有热搜的热度字段
+
+    返回汇总字段与实际情况不一致的 (热搜, 重新计算的字段字典) 列表。dry_run 为真时只报告偏差，不修改数据。
+    """
+    drifted = []
+    for topic in HotTopic.objects.order_by('id'):
+        columns = compute_topic_heat_columns(topic)
+        if any(not math.isclose(getattr(topic, field), value, rel_tol=1e-9, abs_tol=1e-9)
+               for field, value in columns.items()):
+            drifted.append((topic, columns))
+    if not dry_run:
+        with transaction.atomic():
+            for topic, columns in drifted:
+                HotTopic.objects.filter(id=topic.id).update(**columns)
+    return drifted
+
+
+def refresh_comment_rank(model, comment_id):
+    """重新计算热搜评论或评分评论的排序分数，评论不存在时忽略"""
+    row = model.objects.filter(id=comment_id).annotate(
+        num_likes=Count('likes', distinct=True),
+        num_replies=Count('replies', distinct=True),
+    ).values_list('created_at', 'num_likes', 'num_replies').first()
+    if row is None:
+        return
+    created_at, num_likes, num_replies = row
+    model.objects.filter(id=comment_id).update(
+        rank_score=log_rank_score(1 + num_likes + num_replies, created_at, COMMENT_DECAY)
+    )
+
+
+def refresh_rating_rank(rating_id):
+    """重新计算评分项目的排序分数，评分项目不存在时忽略"""
+    row = Rating.objects.filter(id=rating_id).annotate(
+        num_ratings=Count('user_ratings', distinct=True),
+        num_comments=Count('comments', distinct=True),
+    ).values_list('created_at', 'num_ratings', 'num_comments').first()
+    if row is None:
+        return
+    created_at, num_ratings, num_comments = row
+    signals = RATING_BASE_SCORE + num_ratings + num_comments * RATING_COMMENT_WEIGHT
+    Rating.objects.filter(id=rating_id).update(rank_score=log_rank_score(signals, created_at, RATING_DECAY))
+
+
+def heat_expression(now=None):
+    """用汇总字段表示当前热度的SQL表达式
+
+    热度 = (基础热度 + 评论热度总和 * e^(-0.15 * 天数)) * e^(-0.1 * 天数)，
+    与 HotTopic.heat_score 的结果相同，但不需要逐条查询点赞和评论。
+    """
+    now = now or timezone.now()
+    age = Value(julian_day(now), output_field=FloatField()) - JulianDay('created_at')
+    comments_heat = F('comments_heat_sum') * Exp(Value(-COMMENT_DECAY) * age)
+    return (F('base_score') + comments_heat) * Exp(Value(-TOPIC_DECAY) * age)
+
+
+def hot_topics_by_heat(limit=HOT_TOPICS_LIMIT, now=None):
+    """按热度获取热搜列表，置顶的排在最前面，每个热搜附带 heat 字段
+
+    非置顶热搜沿 rank_score 索引从高到低分批读取，只为读到的记录计算实时热度；
+    当已选出的第 limit 名热度不低于下一批记录的热度上界时即可停止。
+    limit 为 None 时返回全部热搜。
+    """
+    now = now or timezone.now()
+    topics = HotTopic.objects.annotate(heat=heat_expression(now))
+    if limit is None:
+        return list(topics.order_by('-is_pinned', '-heat', '-created_at'))
+
+    def by_heat(items):
+        return sorted(items, key=lambda topic: (topic.heat, topic.created_at), reverse=True)
+
+    pinned = list(topics.filter(is_pinned=True).order_by('-heat', '-created_at')[:limit])
+    needed = limit - len(pinned)
+    if needed <= 0:
+        return pinned
+
+    candidates = topics.filter(is_pinned=False).order_by('-rank_score', '-id')
+    batch_size = needed * 2
+    selected = []
+    offset = 0
+    while True:
+        batch = list(candidates[offset:offset + batch_size])
+        selected = by_heat(selected + batch)[:needed]
+        if len(batch) < batch_size:
+            break
+        # 之后的记录热度都不会超过本批最后一条记录的排序分数对应的热度
+        bound = rank_score_to_heat(batch[-1].rank_score, TOPIC_DECAY, now)
+        if len(selected) == needed and selected[-1].heat >= bound:
+            break
+        offset += batch_size
+    return pinned + selected
+
+
+def _top_comment_ids_by_window(topic_ids):
+    """用 ROW_NUMBER() OVER (PARTITION BY topic ...) 一次查询出每个热搜热度最高的顶级评论ID"""
+    ranked = Comment.objects.filter(topic_id__in=topic_ids, parent__isnull=True).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('topic_id')],
+            order_by=[F('rank_score').desc(), F('created_at').desc(), F('id').desc()],
+        )
+    ).order_by().values('id', 'row_number')
+    # Django 不支持直接过滤窗口函数的结果，需要在外层查询中筛选每组的第一条
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM ({sql}) ranked WHERE row_number = 1', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _top_comment_ids_by_subquery(topic_ids):
+    """不支持窗口函数时，用关联子查询沿 (topic, rank_score) 索引取每个热搜的第一条评论"""
+    top_comment = Comment.objects.filter(topic=OuterRef('pk'), parent__isnull=True).order_by(
+        '-rank_score', '-created_at', '-id'
+    ).values('id')[:1]
+    return [
+        comment_id
+        for comment_id in HotTopic.objects.filter(id__in=topic_ids).annotate(
+            top_comment_id=Subquery(top_comment)
+        ).order_by().values_list('top_comment_id', flat=True)
+        if comment_id is not None
+    ]
+
+
+def top_comments_for_topics(topics):
+    """批量获取每个热搜热度最高的顶级评论，返回 {热搜ID: 评论} 字典，没有评论的热搜不在字典中
+
+    topics 可以是热搜实例或ID的列表，整页热搜只需要两次查询，评论附带点赞数和回复数。
+    """
+    topic_ids = [topic if isinstance(topic, int) else topic.id for topic in topics]
+    if not topic_ids:
+        return {}
+    if connection.features.supports_over_clause:
+        comment_ids = _top_comment_ids_by_window(topic_ids)
+    else:
+        comment_ids = _top_comment_ids_by_subquery(topic_ids)
+    return {comment.topic_id: comment for comment in Comment.objects.with_engagement().filter(id__in=comment_ids)}
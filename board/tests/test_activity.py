@@ -0,0 +1,91 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from board import activity
+from board.activity import flush_activity, online_users, record_activity
+from board.models import User
+
+
+class ActivityTrackerTests(TestCase):
+    """测试合并写入的最后活动时间"""
+
+    def setUp(self):
+        flush_activity()
+        self.user = User.objects.create_user(username='active', password='testpassword', user_type='student')
+        self.other = User.objects.create_user(username='idle', password='testpassword', user_type='student')
+
+    def tearDown(self):
+        activity.discard_pending()
+
+    def test_buffered_until_interval(self):
+        """写入间隔内的活动只暂存在内存中，之后用一条 UPDATE 写入"""
+        now = timezone.now()
+        with self.assertNumQueries(0):
+            record_activity(self.user, now)
+            record_activity(self.other, now)
+        self.assertTrue(self.user.is_online)
+        self.assertIsNone(User.objects.get(id=self.user.id).last_activity)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_activity(), 2)
+        self.assertEqual(User.objects.get(id=self.user.id).last_activity, now)
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=30)
+    def test_timer_flushes_without_next_request(self):
+        """暂存记录后启动定时器，之后没有请求也会在间隔结束时写入"""
+        now = timezone.now()
+        record_activity(self.user, now)
+        timer = activity._timer
+        self.assertIsNotNone(timer)
+        self.assertEqual(timer.interval, 30)
+        # 同一间隔内只启动一个定时器
+        record_activity(self.other, now)
+        self.assertIs(activity._timer, timer)
+
+        timer.cancel()
+        with mock.patch.object(activity.connection, 'close'):
+            timer.function()
+        self.assertIsNone(activity._timer)
+        self.assertEqual(activity._pending, {})
+        self.assertEqual(User.objects.get(id=self.user.id).last_activity, now)
+        self.assertEqual(User.objects.get(id=self.other.id).last_activity, now)
+
+    def test_failed_flush_keeps_pending(self):
+        """写入失败时暂存的记录放回，由定时器稍后重试"""
+        now = timezone.now()
+        record_activity(self.user, now)
+        with mock.patch.object(User.objects, 'filter', side_effect=RuntimeError('locked')):
+            with self.assertRaises(RuntimeError):
+                flush_activity()
+        self.assertEqual(activity._pending, {self.user.id: now})
+        self.assertIsNotNone(activity._timer)
+
+    def test_fresh_activity_skipped(self):
+        """数据库中的活动时间足够新时不再记录"""
+        self.user.last_activity = timezone.now() - datetime.timedelta(seconds=10)
+        record_activity(self.user)
+        self.assertEqual(activity._pending, {})
+
+    def test_flush_when_due(self):
+        """距上次写入超过间隔时立即批量写入"""
+        later = timezone.now() + datetime.timedelta(minutes=1)
+        with self.assertNumQueries(1):
+            record_activity(self.user, later)
+        self.assertEqual(User.objects.get(id=self.user.id).last_activity, later)
+
+    def test_online_users(self):
+        """在线用户查询包括尚未写入的活动，不包括很久以前活动的用户"""
+        User.objects.filter(id=self.other.id).update(last_activity=timezone.now() - datetime.timedelta(minutes=10))
+        record_activity(self.user)
+        self.assertEqual(list(online_users()), [self.user])
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=0)
+    def test_middleware_records_poll(self):
+        """访问未读数接口时记录最后活动时间"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('unread_notifications_count'))
+        self.assertTrue(User.objects.get(id=self.user.id).is_online)
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.test import TestCase
+from board.allocator import allocate_assignment_id, save_assignment_with_free_id
+from board.models import Assignment, FreeAssignmentId, User, Subject
+import datetime
+
+
+class AssignmentIdAllocatorTest(TestCase):
+    """测试作业ID分配"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='allocteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.subject = Subject.objects.create(name='测试科目')
+
+    def new_assignment(self, title='作业'):
+        today = datetime.date.today()
+        return Assignment(
+            title=title,
+            description='描述',
+            subject=self.subject,
+            teacher=self.teacher,
+            start_date=today,
+            end_date=today + datetime.timedelta(days=1)
+        )
+
+    def test_allocate_appends_when_no_gaps(self):
+        """测试没有空缺时分配最大ID+1"""
+        first = save_assignment_with_free_id(self.new_assignment())
+        second = save_assignment_with_free_id(self.new_assignment())
+
+        self.assertEqual(second.id, first.id + 1)
+
+    def test_deleted_id_is_reused(self):
+        """测试删除作业后其ID被优先复用"""
+        assignments = [save_assignment_with_free_id(self.new_assignment(f'作业{i}')) for i in range(4)]
+        freed_ids = sorted([assignments[1].id, assignments[2].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            assignments[2].delete()
+            assignments[1].delete()
+
+        self.assertEqual(sorted(FreeAssignmentId.objects.values_list('id', flat=True)), freed_ids)
+
+        reused = save_assignment_with_free_id(self.new_assignment())
+        self.assertEqual(reused.id, freed_ids[0])
+        self.assertEqual(list(FreeAssignmentId.objects.values_list('id', flat=True)), freed_ids[1:])
+
+    def test_queryset_delete_releases_ids(self):
+        """测试批量删除（如清理旧作业）也会回收ID"""
+        assignments = [save_assignment_with_free_id(self.new_assignment(f'作业{i}')) for i in range(3)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            Assignment.objects.filter(id__in=[a.id for a in assignments[:2]]).delete()
+        # 事务提交前不写入，提交后一次写入全部ID
+        self.assertEqual(FreeAssignmentId.objects.count(), 0)
+        self.assertEqual(len(callbacks), 1)
+
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(FreeAssignmentId.objects.count(), 2)
+        self.assertEqual(allocate_assignment_id(), assignments[0].id)
+
+    def test_cascade_delete_releases_ids(self):
+        """测试删除科目时级联删除的作业也会回收ID"""
+        assignments = [save_assignment_with_free_id(self.new_assignment(f'作业{i}')) for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.delete()
+
+        self.assertEqual(sorted(FreeAssignmentId.objects.values_list('id', flat=True)), [a.id for a in assignments])
+
+    def test_rolled_back_delete_keeps_ids(self):
+        """测试删除被回滚时不回收ID，之后的删除仍然正常回收"""
+        assignments = [save_assignment_with_free_id(self.new_assignment(f'作业{i}')) for i in range(2)]
+        released_id = assignments[1].id
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    assignments[0].delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            assignments[1].delete()
+
+        self.assertEqual(list(FreeAssignmentId.objects.values_list('id', flat=True)), [released_id])
+
+    def test_stale_free_id_is_skipped(self):
+        """测试空闲表中已被占用的ID会被清除并重新分配"""
+        existing = save_assignment_with_free_id(self.new_assignment())
+        FreeAssignmentId.objects.create(id=existing.id)
+
+        created = save_assignment_with_free_id(self.new_assignment())
+
+        self.assertEqual(created.id, existing.id + 1)
+        self.assertFalse(FreeAssignmentId.objects.filter(id=existing.id).exists())
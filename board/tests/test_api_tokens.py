@@ -0,0 +1,138 @@
+import datetime
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from board.api_tokens import authenticate_token, clear_token_cache, hash_token, issue_token
+from board.completion import fan_out_completion_records
+from board.models import ApiToken, Assignment, Subject, User
+
+
+class ApiTokenTests(TestCase):
+    """测试设备令牌的签发、使用和吊销"""
+
+    def setUp(self):
+        clear_token_cache()
+        self.student = User.objects.create_user(
+            username='tokenstudent',
+            password='testpassword',
+            user_type='student'
+        )
+        teacher = User.objects.create_user(
+            username='tokenteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        subject = Subject.objects.get_or_create(name='语文')[0]
+        today = datetime.date.today()
+        assignment = Assignment.objects.create(
+            title='令牌作业',
+            description='描述',
+            subject=subject,
+            teacher=teacher,
+            start_date=today,
+            end_date=today + datetime.timedelta(days=2)
+        )
+        fan_out_completion_records([assignment])
+        self.client = Client()
+
+    def issue(self):
+        response = self.client.post(
+            reverse('issue_api_token'),
+            data=json.dumps({'username': 'tokenstudent', 'password': 'testpassword', 'device_name': '桌面客户端'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['token']
+
+    def test_issue_token_stores_hash_only(self):
+        """测试签发令牌时只保存哈希值"""
+        raw_token = self.issue()
+
+        token = ApiToken.objects.get(user=self.student)
+        self.assertEqual(token.name, '桌面客户端')
+        self.assertEqual(token.key_hash, hash_token(raw_token))
+        self.assertNotEqual(token.key_hash, raw_token)
+
+    def test_issue_token_invalid_credentials(self):
+        """测试密码错误时不签发令牌"""
+        response = self.client.post(
+            reverse('issue_api_token'),
+            data=json.dumps({'username': 'tokenstudent', 'password': 'wrong'}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(ApiToken.objects.exists())
+
+    def test_today_homework_with_token_skips_password_hasher(self):
+        """测试使用令牌获取作业时不调用密码认证"""
+        raw_token = self.issue()
+
+        with patch('board.views.authenticate') as mock_authenticate:
+            response = self.client.get(reverse('get_today_homework'), HTTP_AUTHORIZATION=f'Token {raw_token}')
+            post_response = self.client.post(reverse('get_today_homework'), HTTP_X_API_TOKEN=raw_token)
+
+        mock_authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('令牌作业', response.content.decode('utf-8'))
+        self.assertEqual(post_response.status_code, 200)
+
+    def test_token_cache_skips_token_lookup(self):
+        """测试令牌缓存命中时只按主键读取用户，不查询令牌表也不更新使用时间"""
+        _, raw_token = issue_token(self.student, '测试')
+        self.assertEqual(authenticate_token(raw_token), self.student)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate_token(raw_token), self.student)
+
+    def test_deactivated_user_rejected_on_cache_hit(self):
+        """测试用户被停用后，已缓存的令牌立即失效"""
+        _, raw_token = issue_token(self.student, '测试')
+        self.assertEqual(authenticate_token(raw_token), self.student)
+
+        User.objects.filter(id=self.student.id).update(is_active=False)
+        self.assertIsNone(authenticate_token(raw_token))
+
+    def test_password_change_revokes_tokens(self):
+        """测试修改密码后吊销该用户的全部令牌，普通保存不影响令牌"""
+        _, raw_token = issue_token(self.student, '测试')
+        self.assertEqual(authenticate_token(raw_token), self.student)
+
+        self.student.first_name = '改名'
+        self.student.save()
+        self.assertEqual(authenticate_token(raw_token), self.student)
+
+        self.student.set_password('newpassword')
+        self.student.save()
+        self.assertFalse(ApiToken.objects.exists())
+        self.assertIsNone(authenticate_token(raw_token))
+
+    def test_non_string_device_name(self):
+        """测试设备名称不是字符串时仍能签发令牌"""
+        response = self.client.post(
+            reverse('issue_api_token'),
+            data=json.dumps({'username': 'tokenstudent', 'password': 'testpassword', 'device_name': 12345}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ApiToken.objects.get(user=self.student).name, '12345')
+
+    def test_revoked_token_rejected(self):
+        """测试吊销后的令牌无法使用"""
+        raw_token = self.issue()
+
+        response = self.client.post(reverse('revoke_api_token'), HTTP_AUTHORIZATION=f'Token {raw_token}')
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(ApiToken.objects.exists())
+
+        response = self.client.get(reverse('get_today_homework'), HTTP_AUTHORIZATION=f'Token {raw_token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_without_token_not_allowed(self):
+        """测试不带令牌的GET请求仍然不允许"""
+        response = self.client.get(reverse('get_today_homework'))
+
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,105 @@
+import threading
+
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from board.background import BackgroundQueue
+from board.models import User, DeviceLogin, Notification
+
+
+class BackgroundQueueTests(SimpleTestCase):
+    """测试有界的后台任务队列"""
+
+    def test_processes_jobs_and_counts_failures(self):
+        """任务在后台线程中执行，失败的任务计入指标且不影响后续任务"""
+        done = []
+
+        def fail():
+            raise ValueError('boom')
+
+        jobs = BackgroundQueue('test', workers=2, maxsize=10)
+        self.assertTrue(jobs.submit(done.append, 1))
+        self.assertTrue(jobs.submit(fail))
+        self.assertTrue(jobs.submit(done.append, 2))
+        jobs.join()
+        self.assertEqual(sorted(done), [1, 2])
+        self.assertEqual(jobs.stats(), {'submitted': 3, 'processed': 2, 'failed': 1, 'rejected': 0, 'queued': 0})
+
+    def test_rejects_when_full(self):
+        """队列已满时拒绝新任务"""
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        jobs = BackgroundQueue('test', workers=1, maxsize=1)
+        jobs.submit(block)
+        started.wait(5)
+        self.assertTrue(jobs.submit(lambda: None))
+        self.assertFalse(jobs.submit(lambda: None))
+        release.set()
+        jobs.join()
+        self.assertEqual(jobs.stats()['rejected'], 1)
+        self.assertEqual(jobs.stats()['processed'], 2)
+
+    def test_inline_without_workers(self):
+        """线程数为 0 时在调用线程中立即执行"""
+        done = []
+        jobs = BackgroundQueue('test', workers=0)
+        self.assertTrue(jobs.submit(done.append, threading.current_thread()))
+        self.assertEqual(done, [threading.current_thread()])
+
+
+class DeferredDeviceLoginTests(TestCase):
+    """测试登录时在后台记录设备信息"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='loginuser', password='testpassword', user_type='student')
+        self.jobs = BackgroundQueue('test', workers=0)
+
+    def login(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('login'), {'username': 'loginuser', 'password': 'testpassword'},
+                HTTP_USER_AGENT='Mozilla/5.0', REMOTE_ADDR='8.8.8.8',
+            )
+
+    @patch('board.views.get_location_from_ip', return_value='美国')
+    def test_login_submits_job(self, mock_location):
+        """登录请求只提交任务，设备记录和通知由任务创建"""
+        submitted = []
+        with patch.object(self.jobs, 'submit', side_effect=lambda *args: submitted.append(args) or True), \
+                patch('board.views.device_login_queue', return_value=self.jobs):
+            response = self.login()
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(len(submitted), 1)
+        mock_location.assert_not_called()
+        self.assertFalse(DeviceLogin.objects.filter(user=self.user).exists())
+
+        func, *args = submitted[0]
+        self.assertTrue(func(*args))
+        device_login = DeviceLogin.objects.get(user=self.user)
+        self.assertEqual((device_login.ip_address, device_login.location), ('8.8.8.8', '美国'))
+        self.assertEqual(device_login.login_time, args[-1])
+        self.assertTrue(Notification.objects.filter(recipient=self.user, type='system').exists())
+
+    @patch('board.views.get_location_from_ip', return_value='美国')
+    def test_failed_record_counts_as_failed(self, mock_location):
+        """设备登录记录失败时计入队列的失败数"""
+        with patch('board.views.device_login_queue', return_value=self.jobs), \
+                patch('board.views.DeviceLogin.objects.create', side_effect=RuntimeError('database is locked')):
+            self.login()
+        self.assertEqual(self.jobs.stats()['failed'], 1)
+        self.assertEqual(self.jobs.stats()['processed'], 0)
+
+    @patch('board.views.get_location_from_ip')
+    def test_full_queue_records_without_location(self, mock_location):
+        """队列已满时在请求中记录，跳过IP位置查询"""
+        with patch.object(self.jobs, 'submit', return_value=False), \
+                patch('board.views.device_login_queue', return_value=self.jobs):
+            self.login()
+        mock_location.assert_not_called()
+        self.assertEqual(DeviceLogin.objects.get(user=self.user).location, '未知位置')
@@ -1,9 +1,9 @@
 from io import StringIO
-from django.test import TestCase
-from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
 from django.utils import timezone
 from django.db import connection
-from board.models import Assignment, CompletionRecord, User, Subject
+from board.models import Assignment, CompletionRecord, User, Subject, HotTopic, Comment, Notification, UnreadNotificationCounter
 import datetime
 
 class CleanupOldAssignmentsCommandTest(TestCase):
@@ -139,4 +139,186 @@ class CleanupOldAssignmentsCommandTest(TestCase):
         # 验证两个作业都被删除了
         self.assertEqual(Assignment.objects.count(), 0)
         self.assertIn('成功删除了 2 个旧作业', output) 
-        
\ No newline at end of file
+        
+
+class CompactCompletionRecordsCommandTest(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(username='compactteacher', password='testpassword', user_type='teacher')
+        self.student = User.objects.create_user(username='compactstudent', password='testpassword', user_type='student')
+        subject = Subject.objects.create(name='测试科目')
+        today = timezone.now().date()
+        self.assignments = [
+            Assignment.objects.create(
+                title=f'作业{i}',
+                description='描述',
+                subject=subject,
+                teacher=teacher,
+                start_date=today,
+                end_date=today + datetime.timedelta(days=1)
+            )
+            for i in range(3)
+        ]
+        CompletionRecord.objects.create(student=self.student, assignment=self.assignments[0], completed=True,
+                                        completed_at=timezone.now())
+        CompletionRecord.objects.create(student=self.student, assignment=self.assignments[1], completed=False)
+        CompletionRecord.objects.create(student=self.student, assignment=self.assignments[2], completed=False)
+
+    def test_compact_dry_run(self):
+        """测试模拟运行不删除记录"""
+        out = StringIO()
+        call_command('compact_completion_records', dry_run=True, stdout=out)
+
+        self.assertIn('将删除 2 条', out.getvalue())
+        self.assertEqual(CompletionRecord.objects.count(), 3)
+
+    def test_compact_refused_without_sparse_mode(self):
+        """测试未启用稀疏模式时拒绝删除默认记录，加 --force 才执行"""
+        with self.assertRaises(CommandError):
+            call_command('compact_completion_records', stdout=StringIO())
+        self.assertEqual(CompletionRecord.objects.count(), 3)
+
+        call_command('compact_completion_records', force=True, stdout=StringIO())
+        self.assertEqual(CompletionRecord.objects.count(), 1)
+
+    @override_settings(SPARSE_COMPLETION_RECORDS=True)
+    def test_compact_and_expand(self):
+        """测试压缩默认记录后可以重新补齐"""
+        out = StringIO()
+        call_command('compact_completion_records', stdout=out)
+
+        self.assertIn('成功删除了 2 条', out.getvalue())
+        self.assertEqual(list(CompletionRecord.objects.values_list('completed', flat=True)), [True])
+
+        call_command('compact_completion_records', expand=True, stdout=StringIO())
+        self.assertEqual(CompletionRecord.objects.count(), 3)
+        self.assertEqual(CompletionRecord.objects.filter(completed=True).count(), 1)
+
+
+class RecountCompletionsCommandTest(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(username='recountteacher', password='testpassword', user_type='teacher')
+        student = User.objects.create_user(username='recountstudent', password='testpassword', user_type='student')
+        subject = Subject.objects.create(name='测试科目')
+        today = timezone.now().date()
+        self.assignment = Assignment.objects.create(
+            title='计数作业',
+            description='描述',
+            subject=subject,
+            teacher=teacher,
+            start_date=today,
+            end_date=today + datetime.timedelta(days=1)
+        )
+        CompletionRecord.objects.create(student=student, assignment=self.assignment, completed=True)
+
+    def test_recount_dry_run(self):
+        """测试模拟运行只报告偏差"""
+        out = StringIO()
+        call_command('recount_completions', dry_run=True, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('偏差: 计数作业', output)
+        self.assertIn('发现 1 个', output)
+        self.assertEqual(Assignment.objects.get(id=self.assignment.id).completed_count, 0)
+
+    def test_recount_fixes_counters(self):
+        """测试实际运行修正计数器"""
+        call_command('recount_completions', stdout=StringIO())
+
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 1)
+        self.assertEqual(self.assignment.total_count, 1)
+
+
+class RecountTopicHeatCommandTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='heatauthor', password='testpassword', user_type='student')
+        self.topic = HotTopic.objects.create(title='热度热搜', author=author, content='内容')
+        Comment.objects.create(topic=self.topic, author=author, content='评论')
+        HotTopic.objects.filter(id=self.topic.id).update(comments_heat_sum=0)
+
+    def test_recount_dry_run(self):
+        """测试模拟运行只报告偏差"""
+        out = StringIO()
+        call_command('recount_topic_heat', dry_run=True, stdout=out)
+
+        self.assertIn('偏差: 热度热搜', out.getvalue())
+        self.assertIn('发现 1 个', out.getvalue())
+        self.assertEqual(HotTopic.objects.get(id=self.topic.id).comments_heat_sum, 0)
+
+    def test_recount_fixes_columns(self):
+        """测试实际运行修正热度字段"""
+        call_command('recount_topic_heat', stdout=StringIO())
+
+        self.assertAlmostEqual(HotTopic.objects.get(id=self.topic.id).comments_heat_sum, 1, places=4)
+
+
+class ReconcileUnreadCountersCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='unreaduser', password='testpassword', user_type='student')
+        for i in range(3):
+            Notification.objects.create(recipient=self.user, type='like', content=f'通知{i}')
+        # 模拟绕过信号修改通知造成的偏差
+        Notification.objects.filter(recipient=self.user).update(type='reply')
+
+    def test_reconcile_dry_run(self):
+        """测试模拟运行只报告偏差"""
+        out = StringIO()
+        call_command('reconcile_unread_counters', dry_run=True, stdout=out)
+
+        self.assertIn(f'用户ID {self.user.id} 的 like 未读数 3 -> 0', out.getvalue())
+        self.assertIn('发现 2 个', out.getvalue())
+        self.assertEqual(UnreadNotificationCounter.objects.get(user=self.user, type='like').count, 3)
+
+    def test_reconcile_fixes_counters(self):
+        """测试实际运行修正计数器"""
+        call_command('reconcile_unread_counters', stdout=StringIO())
+
+        counters = dict(UnreadNotificationCounter.objects.filter(user=self.user).values_list('type', 'count'))
+        self.assertEqual(counters, {'like': 0, 'reply': 3})
+
+
+class BackfillPlainExcerptsCommandTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='excerptauthor', password='testpassword', user_type='student')
+        self.topic = HotTopic.objects.create(title='摘要热搜', author=author, content='# 标题\n\n**粗体**内容')
+        self.comment = Comment.objects.create(topic=self.topic, author=author, content='[链接](https://example.com)')
+        # 模拟新增字段之前就存在的记录
+        HotTopic.objects.update(plain_excerpt='')
+        Comment.objects.update(plain_excerpt='')
+
+    def test_backfill_dry_run(self):
+        """测试模拟运行只统计需要更新的记录"""
+        out = StringIO()
+        call_command('backfill_plain_excerpts', dry_run=True, stdout=out)
+
+        self.assertIn('共有 2 条记录', out.getvalue())
+        self.assertEqual(HotTopic.objects.get(id=self.topic.id).plain_excerpt, '')
+
+    def test_backfill_fills_excerpts(self):
+        """测试实际运行生成纯文本摘要，再次运行不会重复更新"""
+        call_command('backfill_plain_excerpts', stdout=StringIO())
+
+        self.topic.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.topic.plain_excerpt, '标题\n\n粗体内容')
+        self.assertEqual(self.comment.plain_excerpt, '链接')
+
+        out = StringIO()
+        call_command('backfill_plain_excerpts', stdout=out)
+        self.assertIn('已更新 0 条记录', out.getvalue())
+
+
+class BenchmarkMarkdownCommandTest(TestCase):
+    def test_benchmark_reports_latency(self):
+        """测试基准测试命令使用数据库中的评论作为语料并输出两种方式的耗时"""
+        author = User.objects.create_user(username='benchauthor', password='testpassword', user_type='student')
+        topic = HotTopic.objects.create(title='基准热搜', author=author, content='**内容**')
+        Comment.objects.create(topic=topic, author=author, content='评论 $x^2$')
+
+        out = StringIO()
+        call_command('benchmark_markdown', repeat=1, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('语料: 2 条', output)
+        self.assertIn('每次新建渲染器', output)
+        self.assertIn('复用渲染器', output)
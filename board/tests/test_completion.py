@@ -0,0 +1,289 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from board.completion import (
+    fan_out_completion_records, fan_out_for_new_student, student_assignment_queryset,
+    completion_records_for_assignment, toggle_completion_record, recount_completion_counters,
+    compact_completion_records
+)
+from board.models import Assignment, CompletionRecord, User, Subject
+import datetime
+import json
+
+
+class FanOutCompletionRecordsTest(TestCase):
+    """测试完成记录批量创建"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='fanoutteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'fanoutstudent{i}',
+                password='testpassword',
+                user_type='student'
+            )
+            for i in range(5)
+        ]
+        self.subject = Subject.objects.create(name='测试科目')
+        today = datetime.date.today()
+        self.assignments = [
+            Assignment.objects.create(
+                title=f'作业{i}',
+                description='描述',
+                subject=self.subject,
+                teacher=self.teacher,
+                start_date=today,
+                end_date=today + datetime.timedelta(days=1)
+            )
+            for i in range(3)
+        ]
+
+    def test_fan_out_all_students(self):
+        """测试为所有学生创建记录并返回统计信息"""
+        stats = fan_out_completion_records(self.assignments, batch_size=4)
+
+        self.assertEqual(CompletionRecord.objects.count(), 15)
+        self.assertFalse(CompletionRecord.objects.filter(completed=True).exists())
+        self.assertEqual(stats['assignments'], 3)
+        self.assertEqual(stats['students'], 5)
+        self.assertEqual(stats['rows'], 15)
+        self.assertEqual(stats['batches'], 4)
+        self.assertIn('elapsed_ms', stats)
+
+    def test_fan_out_skips_existing_records(self):
+        """测试已存在的记录不会重复创建，也不会被重置"""
+        CompletionRecord.objects.create(
+            student=self.students[0],
+            assignment=self.assignments[0],
+            completed=True
+        )
+
+        fan_out_completion_records(self.assignments)
+
+        self.assertEqual(CompletionRecord.objects.count(), 15)
+        self.assertTrue(CompletionRecord.objects.get(
+            student=self.students[0], assignment=self.assignments[0]
+        ).completed)
+
+    def test_fan_out_for_new_student(self):
+        """测试新学生获得所有已有作业的记录"""
+        stats = fan_out_for_new_student(self.students[0])
+
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(CompletionRecord.objects.filter(student=self.students[0]).count(), 3)
+
+    def test_fan_out_updates_total_counters(self):
+        """测试批量创建记录时同步更新作业总人数"""
+        fan_out_completion_records(self.assignments)
+
+        for assignment in Assignment.objects.all():
+            self.assertEqual(assignment.total_count, 5)
+            self.assertEqual(assignment.completed_count, 0)
+
+    def test_fan_out_without_students(self):
+        """测试没有学生时不写入任何记录"""
+        stats = fan_out_completion_records(self.assignments, students=[])
+
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(stats['batches'], 0)
+        self.assertEqual(CompletionRecord.objects.count(), 0)
+
+
+
+class CompletionCountersTest(TestCase):
+    """测试作业完成计数器的维护"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='counterteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'counterstudent{i}',
+                password='testpassword',
+                user_type='student'
+            )
+            for i in range(3)
+        ]
+        self.subject = Subject.objects.create(name='测试科目')
+        today = datetime.date.today()
+        self.assignment = Assignment.objects.create(
+            title='计数作业',
+            description='描述',
+            subject=self.subject,
+            teacher=self.teacher,
+            start_date=today,
+            end_date=today + datetime.timedelta(days=1)
+        )
+        fan_out_completion_records([self.assignment])
+
+    def record(self, student):
+        return CompletionRecord.objects.get(student=student, assignment=self.assignment)
+
+    def test_toggle_updates_completed_counter(self):
+        """测试切换完成状态时更新完成人数"""
+        toggle_completion_record(self.record(self.students[0]))
+        toggle_completion_record(self.record(self.students[1]))
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 2)
+
+        toggle_completion_record(self.record(self.students[0]))
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 1)
+        self.assertEqual(self.assignment.total_count, 3)
+
+    def test_toggle_stale_copies_keeps_counter_consistent(self):
+        """测试两个请求各自读取同一记录后先后切换，计数器与记录状态一致"""
+        first, second = self.record(self.students[0]), self.record(self.students[0])
+        toggle_completion_record(first)
+        toggle_completion_record(second)
+
+        self.assertFalse(second.completed)
+        self.assertFalse(self.record(self.students[0]).completed)
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 0)
+        self.assertEqual(recount_completion_counters(), [])
+
+    def test_repeated_fan_out_does_not_overcount(self):
+        """测试重复补齐记录时已存在的记录不重复计入总人数"""
+        new_student = User.objects.create_user(username='counterstudent3', password='testpassword', user_type='student')
+        fan_out_completion_records([self.assignment])
+        fan_out_completion_records(Assignment.objects.all(), students=[new_student])
+
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.total_count, 4)
+        self.assertEqual(recount_completion_counters(), [])
+
+    def test_compact_recounts_in_dense_mode(self):
+        """测试非稀疏模式下压缩默认记录后重建总人数"""
+        toggle_completion_record(self.record(self.students[0]))
+        self.assertEqual(compact_completion_records(), 2)
+
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.completed_count, self.assignment.total_count), (1, 1))
+        self.assertEqual(recount_completion_counters(), [])
+
+    def test_student_deletion_updates_counters(self):
+        """测试删除学生时从计数器中扣除"""
+        toggle_completion_record(self.record(self.students[0]))
+
+        self.students[0].delete()
+        self.students[1].delete()
+
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 0)
+        self.assertEqual(self.assignment.total_count, 1)
+
+    def test_recount_reports_and_fixes_drift(self):
+        """测试校对计数器时报告并修正偏差"""
+        Assignment.objects.filter(id=self.assignment.id).update(completed_count=7)
+
+        drifted = recount_completion_counters(dry_run=True)
+        self.assertEqual([a.id for a in drifted], [self.assignment.id])
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 7)
+
+        recount_completion_counters()
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.completed_count, 0)
+        self.assertEqual(recount_completion_counters(), [])
+
+
+@override_settings(SPARSE_COMPLETION_RECORDS=True)
+class SparseCompletionTest(TestCase):
+    """测试稀疏完成记录模式"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='sparseteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.student = User.objects.create_user(
+            username='sparsestudent',
+            password='testpassword',
+            user_type='student'
+        )
+        self.other_student = User.objects.create_user(
+            username='sparsestudent2',
+            password='testpassword',
+            user_type='student'
+        )
+        self.subject = Subject.objects.create(name='测试科目')
+        today = datetime.date.today()
+        self.assignment = Assignment.objects.create(
+            title='稀疏作业',
+            description='描述',
+            subject=self.subject,
+            teacher=self.teacher,
+            start_date=today,
+            end_date=today + datetime.timedelta(days=1)
+        )
+
+    def test_fan_out_skipped(self):
+        """测试稀疏模式下不创建默认记录"""
+        stats = fan_out_completion_records([self.assignment])
+
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(CompletionRecord.objects.count(), 0)
+
+    def test_student_assignments_without_records(self):
+        """测试没有记录的作业对学生可见且为未完成"""
+        assignments = list(student_assignment_queryset(self.student))
+
+        self.assertEqual(assignments, [self.assignment])
+        self.assertFalse(assignments[0].completed)
+
+    def test_toggle_creates_record(self):
+        """测试切换完成状态时按需创建记录"""
+        self.client.login(username='sparsestudent', password='testpassword')
+        response = self.client.post(
+            reverse('toggle_assignment'),
+            data=json.dumps({'assignment_id': self.assignment.id}),
+            content_type='application/json'
+        )
+
+        self.assertTrue(response.json()['completed'])
+        self.assertEqual(CompletionRecord.objects.count(), 1)
+        self.assertTrue(student_assignment_queryset(self.student).get().completed)
+        self.assertFalse(student_assignment_queryset(self.other_student).get().completed)
+
+    def test_counters_count_all_students(self):
+        """测试稀疏模式下总人数为学生总数，学生增删时同步更新"""
+        fan_out_completion_records([self.assignment])
+        toggle_completion_record(CompletionRecord(student=self.student, assignment=self.assignment))
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.completed_count, self.assignment.total_count), (1, 2))
+
+        self.student.delete()
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.completed_count, self.assignment.total_count), (0, 1))
+        self.assertEqual(recount_completion_counters(), [])
+
+    def test_toggle_nonexistent_assignment(self):
+        """测试切换不存在的作业返回404"""
+        self.client.login(username='sparsestudent', password='testpassword')
+        response = self.client.post(
+            reverse('toggle_assignment'),
+            data=json.dumps({'assignment_id': 9999}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_stats_and_records_include_all_students(self):
+        """测试统计和完成列表包含没有记录的学生"""
+        CompletionRecord.objects.create(student=self.student, assignment=self.assignment, completed=True)
+
+        assignment = Assignment.objects.with_live_completion_stats().get(pk=self.assignment.pk)
+        records = completion_records_for_assignment(self.assignment)
+
+        self.assertEqual(assignment.live_completed_count, 1)
+        self.assertEqual(assignment.live_total_count, 2)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(sum(1 for record in records if record.completed), 1)
@@ -1,6 +1,7 @@
-from django.test import TestCase, Client, RequestFactory
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from board.geoip import reset_geolocator
 from board.models import DeviceLogin
 from board.views import record_device_login, get_location_from_ip, test_device_detection
 from unittest.mock import patch, MagicMock
@@ -22,6 +23,8 @@ class DeviceDetectionTests(TestCase):
         # 创建测试客户端
         self.client = Client()
         self.factory = RequestFactory()
+        reset_geolocator()
+        self.addCleanup(reset_geolocator)
     
     @patch('board.views.user_agents_parse')
     def test_record_device_login(self, mock_user_agents):
@@ -50,7 +53,8 @@ class DeviceDetectionTests(TestCase):
         self.assertEqual(login_record.ip_address, '127.0.0.1')
         self.assertEqual(login_record.location, '本地网络')
     
-    @patch('board.views.requests.get')
+    @override_settings(GEOIP_HTTP_FALLBACK=True)
+    @patch('board.geoip.requests.get')
     def test_get_location_from_ip(self, mock_get):
         """测试IP地理位置查询"""
         # 测试本地IP
@@ -0,0 +1,148 @@
+import ipaddress
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch, MagicMock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from board.geoip import (
+    Geolocator, RangeDatabaseProvider, IpApiProvider, get_geolocator, load_ip_ranges, reset_geolocator,
+    LOCAL_NETWORK, UNKNOWN_LOCATION,
+)
+
+DATABASE = """# 测试用IP段
+8.8.8.0,8.8.8.255,美国 加利福尼亚
+1.0.1.0,1.0.3.255,中国 福建 福州
+114.114.114.0,114.114.114.255,中国 江苏 南京
+not-an-ip,1.2.3.4,无效行
+2001:250::,2001:250:ffff:ffff:ffff:ffff:ffff:ffff,中国 教育网
+"""
+
+
+class GeoipTests(SimpleTestCase):
+    """测试本地IP段数据库和位置查询"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ip_ranges.csv')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(DATABASE)
+        self.database = RangeDatabaseProvider(self.path)
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_range_lookup(self):
+        """二分查找命中IP段的起止边界，段外的地址查不到"""
+        locator = Geolocator([self.database])
+        self.assertEqual(locator.locate('1.0.1.0'), '中国 福建 福州')
+        self.assertEqual(locator.locate('1.0.3.255'), '中国 福建 福州')
+        self.assertEqual(locator.locate('8.8.8.8'), '美国 加利福尼亚')
+        self.assertEqual(locator.locate('2001:250:1::1'), '中国 教育网')
+        self.assertEqual(locator.locate('::ffff:114.114.114.114'), '中国 江苏 南京')
+        self.assertEqual(locator.locate('1.0.4.0'), UNKNOWN_LOCATION)
+        self.assertEqual(locator.locate('1.0.0.255'), UNKNOWN_LOCATION)
+
+    def test_non_global_addresses(self):
+        """私有、回环、链路本地、运营商级NAT、组播和保留地址都视为本地网络"""
+        provider = MagicMock()
+        locator = Geolocator([provider])
+        for ip in ('127.0.0.1', '10.1.2.3', '172.16.5.4', '192.168.1.1', '169.254.1.1', '100.64.0.1',
+                   '224.0.0.1', '240.0.0.1', '0.0.0.0', '::1', 'fe80::1', 'fd00::1', ''):
+            self.assertEqual(locator.locate(ip), LOCAL_NETWORK, ip)
+        provider.lookup.assert_not_called()
+        self.assertEqual(locator.locate('not-an-ip'), UNKNOWN_LOCATION)
+
+    def test_fallback_and_cache(self):
+        """本地查不到时询问后备提供者，查到的结果一直缓存，查不到的地址缓存 miss_ttl 秒"""
+        fallback = MagicMock()
+        locator = Geolocator([self.database, fallback], miss_ttl=60)
+        fallback.lookup.side_effect = lambda address: '日本 东京' if str(address) == '133.0.0.1' else None
+        self.assertEqual(locator.locate('133.0.0.1'), '日本 东京')
+        self.assertEqual(locator.locate('133.0.0.1'), '日本 东京')
+        self.assertEqual(fallback.lookup.call_count, 1)
+
+        with patch('board.geoip.time.monotonic', return_value=1000):
+            self.assertEqual(locator.locate('133.0.0.2'), UNKNOWN_LOCATION)
+            self.assertEqual(locator.locate('133.0.0.2'), UNKNOWN_LOCATION)
+        self.assertEqual(fallback.lookup.call_count, 2)
+        with patch('board.geoip.time.monotonic', return_value=1061):
+            self.assertEqual(locator.locate('133.0.0.2'), UNKNOWN_LOCATION)
+            self.assertEqual(locator.locate('133.0.0.1'), '日本 东京')
+        self.assertEqual(fallback.lookup.call_count, 3)
+
+        self.assertEqual(locator.locate('8.8.8.8'), '美国 加利福尼亚')
+        self.assertEqual(fallback.lookup.call_count, 3)
+
+    def test_overlapping_ranges_skipped(self):
+        """与前一个IP段重叠或嵌套的IP段被跳过，外层IP段中的地址仍然可以查到"""
+        ranges, problems = load_ip_ranges([
+            '10.0.0.0,10.0.0.255,外层',
+            '10.0.0.16,10.0.0.31,嵌套',
+            '10.0.0.200,10.0.1.55,部分重叠',
+            '10.0.2.0/24,网段',
+        ])
+        self.assertEqual([row[2] for row in ranges[4]], ['外层', '网段'])
+        self.assertEqual(len(problems), 2)
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('8.8.8.8,8.8.8.8,嵌套\n')
+        self.assertEqual(self.database.lookup(ipaddress.ip_address('8.8.8.20')), '美国 加利福尼亚')
+
+    def test_import_command(self):
+        """导入命令生成排好序的IP段数据库，支持CIDR格式"""
+        source = os.path.join(self.tmpdir, 'source.csv')
+        output = os.path.join(self.tmpdir, 'out', 'ip_ranges.csv')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write('8.8.8.0/24,美国\n1.0.1.0,1.0.3.255,中国 福建\n1.0.2.0,1.0.2.9,重叠\n')
+        out = StringIO()
+        call_command('import_ip_ranges', source, output=output, stdout=out)
+        self.assertIn('已写入 2 个IP段', out.getvalue())
+
+        locator = Geolocator([RangeDatabaseProvider(output)])
+        self.assertEqual(locator.locate('8.8.8.8'), '美国')
+        self.assertEqual(locator.locate('1.0.2.5'), '中国 福建')
+
+    def test_cache_evicts_least_recently_used(self):
+        """缓存超过上限时淘汰最久未使用的地址"""
+        provider = MagicMock()
+        provider.lookup.side_effect = lambda address: f'位置{address}'
+        locator = Geolocator([provider], cache_size=2)
+        locator.locate('8.8.8.1')
+        locator.locate('8.8.8.2')
+        locator.locate('8.8.8.1')
+        locator.locate('8.8.8.3')
+        provider.lookup.reset_mock()
+        locator.locate('8.8.8.1')
+        locator.locate('8.8.8.3')
+        provider.lookup.assert_not_called()
+        locator.locate('8.8.8.2')
+        provider.lookup.assert_called_once()
+
+    def test_database_loaded_once(self):
+        """IP段文件只在首次查询时读取一次"""
+        with patch('builtins.open', wraps=open) as mock_open:
+            self.assertEqual(self.database.lookup(ipaddress.ip_address('8.8.8.8')), '美国 加利福尼亚')
+            self.assertEqual(self.database.lookup(ipaddress.ip_address('1.0.1.1')), '中国 福建 福州')
+        self.assertEqual(mock_open.call_count, 1)
+
+    @patch('board.geoip.requests.get')
+    def test_http_provider(self, mock_get):
+        """在线查询失败时返回 None，交给下一个提供者或返回未知位置"""
+        mock_get.return_value.json.return_value = {'status': 'fail', 'message': 'reserved range'}
+        self.assertIsNone(IpApiProvider().lookup('8.8.8.8'))
+        mock_get.side_effect = OSError('timeout')
+        self.assertIsNone(IpApiProvider().lookup('8.8.8.8'))
+
+    def test_settings(self):
+        """按设置创建全局查询器，默认不使用在线查询"""
+        self.addCleanup(reset_geolocator)
+        with override_settings(GEOIP_DATABASE=self.path):
+            reset_geolocator()
+            locator = get_geolocator()
+            self.assertEqual([type(p) for p in locator.providers], [RangeDatabaseProvider])
+            self.assertEqual(locator.locate('114.114.114.114'), '中国 江苏 南京')
+        with override_settings(GEOIP_DATABASE=os.path.join(self.tmpdir, 'missing.csv'), GEOIP_HTTP_FALLBACK=True):
+            reset_geolocator()
+            self.assertEqual([type(p) for p in get_geolocator().providers], [IpApiProvider])
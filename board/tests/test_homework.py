@@ -0,0 +1,201 @@
+import datetime
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from board.completion import fan_out_completion_records, toggle_completion_record
+from board.homework import get_daily_snapshot, get_today_homework_text, student_assignments_for_date
+from board.models import Assignment, CompletionRecord, Subject, User
+
+
+class TodayHomeworkCacheTests(TestCase):
+    """测试今日作业文本的缓存和失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(
+            username='cachestudent',
+            password='testpassword',
+            user_type='student'
+        )
+        self.teacher = User.objects.create_user(
+            username='cacheteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.chinese = Subject.objects.get_or_create(name='语文')[0]
+        self.math = Subject.objects.get_or_create(name='数学')[0]
+        self.today = datetime.date.today()
+        self.add_assignment('语文作业', self.chinese)
+        self.client = Client()
+
+    def add_assignment(self, title, subject):
+        assignment = Assignment.objects.create(
+            title=title,
+            description='描述',
+            subject=subject,
+            teacher=self.teacher,
+            start_date=self.today,
+            end_date=self.today + datetime.timedelta(days=1)
+        )
+        fan_out_completion_records([assignment])
+        return assignment
+
+    def test_cached_text_skips_queries(self):
+        """测试第二次获取时直接使用缓存"""
+        text, etag = get_today_homework_text(self.student, self.today)
+        self.assertIn('语文作业', text)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_today_homework_text(self.student, self.today), (text, etag))
+
+    def test_new_assignment_invalidates_cache(self):
+        """测试新增作业后缓存失效"""
+        get_today_homework_text(self.student, self.today)
+        self.add_assignment('数学作业', self.math)
+
+        text, _ = get_today_homework_text(self.student, self.today)
+        self.assertIn('数学作业', text)
+
+    def test_hidden_subjects_invalidate_cache(self):
+        """测试修改隐藏科目后缓存失效"""
+        _, etag = get_today_homework_text(self.student, self.today)
+        self.student.hidden_subjects.add(self.chinese)
+
+        text, new_etag = get_today_homework_text(self.student, self.today)
+        self.assertNotIn('语文作业', text)
+        self.assertNotEqual(etag, new_etag)
+
+    def test_toggle_invalidates_student_cache(self):
+        """测试切换完成状态会更新该学生的缓存版本"""
+        get_today_homework_text(self.student, self.today)
+        toggle_completion_record(CompletionRecord.objects.get(student=self.student))
+
+        # 缓存失效后重新查询隐藏科目和作业
+        with self.assertNumQueries(2):
+            get_today_homework_text(self.student, self.today)
+
+    def test_subject_rename_invalidates_cache(self):
+        """测试科目改名后缓存失效"""
+        get_today_homework_text(self.student, self.today)
+        self.chinese.name = '国文'
+        self.chinese.save()
+
+        text, _ = get_today_homework_text(self.student, self.today)
+        self.assertIn('国文：', text)
+
+    def test_teacher_rename_invalidates_snapshot(self):
+        """测试教师改名后快照重新计算"""
+        get_daily_snapshot(self.today)
+        self.teacher.username = 'renamedteacher'
+        self.teacher.save()
+
+        self.assertEqual(get_daily_snapshot(self.today)[0].teacher.username, 'renamedteacher')
+
+    def test_same_due_date_oldest_first(self):
+        """测试接口文本中截止日期相同的作业按布置先后排列"""
+        self.add_assignment('语文作业二', self.chinese)
+
+        text, _ = get_today_homework_text(self.student, self.today)
+        self.assertEqual(text, '语文：\n1.语文作业\n2.语文作业二')
+
+    def test_if_none_match_returns_304(self):
+        """测试轮询客户端携带ETag时返回304"""
+        request_data = json.dumps({'username': 'cachestudent', 'password': 'testpassword'})
+        response = self.client.post(reverse('get_today_homework'), data=request_data,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.post(reverse('get_today_homework'), data=request_data,
+                                    content_type='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class DailySnapshotTests(TestCase):
+    """测试全班共用的每日作业快照"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(
+            username='snapshotteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'snapshotstudent{i}',
+                password='testpassword',
+                user_type='student'
+            )
+            for i in range(2)
+        ]
+        self.chinese = Subject.objects.get_or_create(name='语文')[0]
+        self.math = Subject.objects.get_or_create(name='数学')[0]
+        # 使用固定的周三，避免周末的特殊标记规则
+        self.date = datetime.date(2025, 3, 19)
+        self.math_assignment = self.add_assignment('数学作业', self.math, days=1)
+        self.chinese_assignment = self.add_assignment('语文作业', self.chinese, days=3)
+        self.add_assignment('过期作业', self.chinese, days=-1)
+
+    def add_assignment(self, title, subject, days):
+        assignment = Assignment.objects.create(
+            title=title,
+            description='描述',
+            subject=subject,
+            teacher=self.teacher,
+            start_date=self.date - datetime.timedelta(days=2),
+            end_date=self.date + datetime.timedelta(days=days)
+        )
+        fan_out_completion_records([assignment])
+        return assignment
+
+    def test_snapshot_contents_and_order(self):
+        """测试快照只包含当天有效的作业，按科目顺序排列并带有特殊标记"""
+        snapshot = get_daily_snapshot(self.date)
+
+        self.assertEqual([a.title for a in snapshot], ['语文作业', '数学作业'])
+        self.assertEqual([a.special_mark for a in snapshot], ['明不收', ''])
+
+    def test_snapshot_shared_between_students(self):
+        """测试快照只计算一次，每个学生只需查询自己的完成状态"""
+        student_assignments_for_date(self.students[0], self.date, hidden_subject_ids=[])
+
+        with self.assertNumQueries(1):
+            assignments = student_assignments_for_date(self.students[1], self.date, hidden_subject_ids=[])
+        self.assertEqual(len(assignments), 2)
+
+    def test_overlay_hidden_subjects_and_completion(self):
+        """测试在快照上叠加隐藏科目和完成状态"""
+        toggle_completion_record(CompletionRecord.objects.get(
+            student=self.students[0], assignment=self.math_assignment
+        ))
+
+        assignments = student_assignments_for_date(self.students[0], self.date, hidden_subject_ids=[self.chinese.id])
+        self.assertEqual([(a.title, a.completed) for a in assignments], [('数学作业', True)])
+
+        other = student_assignments_for_date(self.students[1], self.date, hidden_subject_ids=[])
+        self.assertEqual([a.completed for a in other], [False, False])
+
+    def test_snapshot_rebuilt_after_assignment_change(self):
+        """测试作业变化后快照重新计算"""
+        get_daily_snapshot(self.date)
+        self.math_assignment.delete()
+
+        self.assertEqual([a.title for a in get_daily_snapshot(self.date)], ['语文作业'])
+
+    def test_build_daily_snapshot_command(self):
+        """测试预先生成快照的管理命令"""
+        out = StringIO()
+        call_command('build_daily_snapshot', date='2025-03-19', days=2, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('2025-03-19: 2 个作业', output)
+        self.assertIn('已生成 2 天的作业快照', output)
+        with self.assertNumQueries(0):
+            get_daily_snapshot(self.date)
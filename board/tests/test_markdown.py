@@ -1,5 +1,10 @@
-from django.test import TestCase
-from board.views import convert_markdown_to_html, strip_markdown
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from board import markup
+from board.markup import make_plain_excerpt, strip_markdown, clear_render_cache, render_many, PLAIN_EXCERPT_LENGTH
+from board.models import RenderedHtml
+from board.views import convert_markdown_to_html
 
 class MarkdownConversionTests(TestCase):
     """测试Markdown转换功能"""
@@ -64,6 +69,27 @@ $$
 """
         html = convert_markdown_to_html(block_math)
         self.assertIn('class="math-formula"', html)
+
+    def test_formulas_rendered_locally(self):
+        """测试公式输出为交给本地KaTeX渲染的元素，不再引用外部图片服务"""
+        html = convert_markdown_to_html("行内 $a_1 + b_1$ 和 *强调*\n\n$$\n\\frac{1}{2} < x\n$$")
+        self.assertNotIn('codecogs', html)
+        self.assertNotIn('<img', html)
+        # 公式中的下划线和反斜杠不会被当作Markdown语法
+        self.assertIn('<span class="math-formula inline">a_1 + b_1</span>', html)
+        self.assertIn('<div class="math-formula">\\frac{1}{2} &lt; x</div>', html)
+        self.assertIn('<em>强调</em>', html)
+
+    def test_formula_escaped(self):
+        """测试公式内容被转义，不能注入HTML"""
+        html = convert_markdown_to_html("$<script>alert(1)</script>$")
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    def test_formula_too_long(self):
+        """测试过长的公式显示提示信息"""
+        html = convert_markdown_to_html("$" + "x" * 400 + "$")
+        self.assertIn('公式过长', html)
     
     def test_strip_markdown(self):
         """测试去除Markdown格式，获取纯文本"""
@@ -112,4 +138,124 @@ This is a <script>alert('XSS')</script> test.
         html = convert_markdown_to_html(dangerous_markdown)
         
         # 如果项目没有实现HTML净化，这里可能需要检查是否有XSS风险
-        # 这个测试可以作为安全建议 
\ No newline at end of file
+        # 这个测试可以作为安全建议 
+
+    def test_make_plain_excerpt(self):
+        """测试生成截断后的纯文本摘要"""
+        self.assertEqual(make_plain_excerpt('**粗体**文本'), '粗体文本')
+        self.assertEqual(make_plain_excerpt(None), '')
+
+        excerpt = make_plain_excerpt('*' + '长' * 500 + '*')
+        self.assertEqual(len(excerpt), PLAIN_EXCERPT_LENGTH)
+        self.assertTrue(excerpt.endswith('…'))
+
+
+class RenderedHtmlCacheTests(TestCase):
+    """测试Markdown渲染结果缓存"""
+
+    def setUp(self):
+        clear_render_cache()
+
+    def tearDown(self):
+        clear_render_cache()
+
+    def test_render_once(self):
+        """相同文本只渲染一次，进程内缓存命中时不访问数据库"""
+        with mock.patch.object(markup, 'render_markdown', wraps=markup.render_markdown) as render:
+            html = convert_markdown_to_html('**缓存**测试')
+            with self.assertNumQueries(0):
+                self.assertEqual(convert_markdown_to_html('**缓存**测试'), html)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(RenderedHtml.objects.count(), 1)
+
+    def test_database_cache_shared_between_processes(self):
+        """进程内缓存清空后从数据库读取渲染结果"""
+        html = convert_markdown_to_html('数据库*缓存*')
+        clear_render_cache()
+        with mock.patch.object(markup, 'render_markdown') as render:
+            with self.assertNumQueries(1):
+                self.assertEqual(convert_markdown_to_html('数据库*缓存*'), html)
+        render.assert_not_called()
+
+    def test_config_change_invalidates(self):
+        """允许的标签等渲染配置变化后重新渲染"""
+        convert_markdown_to_html('# 标题')
+        old_version = markup.renderer_version()
+        with mock.patch.object(markup, 'ALLOWED_TAGS', [tag for tag in markup.ALLOWED_TAGS if tag != 'h1']), \
+                mock.patch.object(markup, 'RENDERER_VERSION', markup._compute_renderer_version()):
+            self.assertNotEqual(markup.renderer_version(), old_version)
+            html = convert_markdown_to_html('# 标题')
+            self.assertNotIn('<h1', html)
+            self.assertEqual(markup.purge_stale_rendered_html(), 1)
+        self.assertEqual(RenderedHtml.objects.count(), 1)
+
+    def test_failures_not_cached(self):
+        """渲染失败的结果不会被缓存"""
+        with mock.patch.object(markup, 'render_markdown', side_effect=ValueError('出错')):
+            self.assertIn('渲染失败', convert_markdown_to_html('失败文本'))
+        self.assertFalse(RenderedHtml.objects.exists())
+        self.assertNotIn('渲染失败', convert_markdown_to_html('失败文本'))
+
+
+class RendererPoolTests(TestCase):
+    """测试复用的渲染器"""
+
+    def test_pooled_matches_fresh(self):
+        """复用渲染器的结果与每次新建渲染器一致，且不会残留上一次渲染的状态"""
+        texts = ['# 标题\n\n[TOC]', '```\ncode\n```', '脚注[^1]\n\n[^1]: 说明', '$$x^2$$ 与 $y$']
+        for text in texts * 2:
+            fresh = markup._render_with(markup._new_markdown(), markup._new_cleaner(), text)
+            self.assertEqual(markup.render_markdown(text), fresh)
+
+    def test_instances_reused(self):
+        """同一线程内复用同一个Markdown实例和净化器"""
+        version = markup.renderer_version()
+        self.assertIs(markup._get_markdown(version), markup._get_markdown(version))
+        self.assertIs(markup._get_cleaner(version), markup._get_cleaner(version))
+
+    def test_benchmark(self):
+        """基准测试返回两种方式的单次渲染耗时"""
+        result = markup.benchmark_render(['**粗体**', '', '$x$'], repeat=2)
+        self.assertEqual(result['texts'], 2)
+        self.assertEqual(result['renders'], 4)
+        self.assertGreater(result['fresh_us'], 0)
+        self.assertGreater(result['pooled_us'], 0)
+
+
+class RenderManyTests(TestCase):
+    """测试批量渲染"""
+
+    def setUp(self):
+        clear_render_cache()
+
+    def tearDown(self):
+        clear_render_cache()
+
+    def test_order_and_dedupe(self):
+        """结果与输入顺序对应，相同文本只渲染一次"""
+        texts = ['**一**', '', '*二*', '**一**', None]
+        with mock.patch.object(markup, 'render_markdown', wraps=markup.render_markdown) as render:
+            htmls = render_many(texts)
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(htmls[0], htmls[3])
+        self.assertIn('<strong>一</strong>', htmls[0])
+        self.assertIn('<em>二</em>', htmls[2])
+        self.assertEqual(htmls[1], '')
+        self.assertEqual(htmls[4], '')
+
+    def test_bulk_queries(self):
+        """未命中缓存的文本用一次查询读取、一次查询写入"""
+        texts = [f'第{i}条**评论**' for i in range(15)]
+        with self.assertNumQueries(2):
+            first = render_many(texts)
+        clear_render_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual(render_many(texts), first)
+
+    @override_settings(MARKDOWN_RENDER_WORKERS=2)
+    def test_process_pool(self):
+        """配置工作进程后，大量未命中缓存的文本在进程池中渲染，结果相同"""
+        texts = [f'并行*渲染* {i} $x_{i}$' for i in range(markup.PARALLEL_RENDER_THRESHOLD)]
+        expected = [markup.render_markdown(text) for text in texts]
+        self.assertEqual(render_many(texts), expected)
+        self.assertEqual(RenderedHtml.objects.count(), len(texts))
@@ -4,6 +4,7 @@ from datetime import date, timedelta
 from django.test import TestCase
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from board.models import Subject, HotTopic, Comment, HotTopicLike, CommentLike, Assignment, CompletionRecord, Rating, UserRating, RatingComment, RatingCommentLike
 
 User = get_user_model()
@@ -63,6 +64,15 @@ class HotTopicModelTests(TestCase):
         
         # 现在应该有3条评论
         self.assertEqual(self.topic.comments_count, 3)
+
+    def test_plain_excerpt(self):
+        """测试保存时生成纯文本摘要"""
+        self.topic.content = "## 小标题\n\n这是**重点**内容"
+        self.topic.save()
+        self.assertEqual(HotTopic.objects.get(id=self.topic.id).plain_excerpt, "小标题\n\n这是重点内容")
+
+        comment = Comment.objects.create(topic=self.topic, author=self.user, content="`代码`评论")
+        self.assertEqual(comment.plain_excerpt, "代码评论")
     
     def test_heat_score(self):
         """测试热搜热度计算"""
@@ -250,6 +260,30 @@ class CommentModelTests(TestCase):
         # 考虑到浮点数计算的误差，使用近似比较
         self.assertAlmostEqual(comment.heat_score, expected_heat, places=2)
     
+    def test_with_engagement(self):
+        """测试 with_engagement() 的标注值与逐条统计一致且不再查询数据库"""
+        for i in range(2):
+            user = User.objects.create_user(username=f'engaged{i}', password='password', user_type='student')
+            CommentLike.objects.create(comment=self.comment, user=user)
+            Comment.objects.create(topic=self.topic, author=user, content=f"回复{i}", parent=self.comment)
+
+        comment = Comment.objects.with_engagement().get(id=self.comment.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(comment.likes_count, 2)
+            self.assertEqual(comment.replies_count, 2)
+            self.assertEqual(comment.author.username, 'testuser')
+            heat_score = comment.heat_score
+        self.assertAlmostEqual(heat_score, Comment.objects.get(id=self.comment.id).heat_score)
+    
+    def test_with_liked_by(self):
+        """测试 with_liked_by() 按用户标注点赞状态"""
+        liker = User.objects.create_user(username='liker', password='password', user_type='student')
+        CommentLike.objects.create(comment=self.comment, user=liker)
+
+        self.assertTrue(Comment.objects.with_liked_by(liker).get(id=self.comment.id).is_liked)
+        self.assertFalse(Comment.objects.with_liked_by(self.user).get(id=self.comment.id).is_liked)
+        self.assertFalse(Comment.objects.with_liked_by(AnonymousUser()).get(id=self.comment.id).is_liked)
+    
     def test_str_representation(self):
         """测试评论字符串表示"""
         expected_str = f"testuser 评论了 测试热搜标题"
@@ -351,6 +385,41 @@ class AssignmentModelTests(TestCase):
         self.assertEqual(assignments[1], assignment1)  # 5天后截止
         self.assertEqual(assignments[2], self.assignment)  # 7天后截止
 
+    def test_with_completion_stats(self):
+        """测试一次查询统计所有作业的完成情况"""
+        students = [
+            User.objects.create_user(username=f'statsstudent{i}', password='password', user_type='student')
+            for i in range(3)
+        ]
+        empty_assignment = Assignment.objects.create(
+            title="空作业",
+            description="没有完成记录",
+            teacher=self.teacher,
+            subject=self.subject,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=1)
+        )
+        CompletionRecord.objects.create(student=students[0], assignment=self.assignment, completed=True)
+        CompletionRecord.objects.create(student=students[1], assignment=self.assignment, completed=False)
+        CompletionRecord.objects.create(student=students[2], assignment=self.assignment, completed=False)
+
+        with self.assertNumQueries(1):
+            live_stats = {a.id: a for a in Assignment.objects.with_live_completion_stats()}
+
+        self.assertEqual(live_stats[self.assignment.id].live_completed_count, 1)
+        self.assertEqual(live_stats[self.assignment.id].live_total_count, 3)
+
+        # 直接创建的记录不会更新计数器，校对后计数器与实际一致
+        Assignment.objects.filter(id=self.assignment.id).update(completed_count=1, total_count=3)
+        with self.assertNumQueries(1):
+            stats = {a.id: a for a in Assignment.objects.with_completion_stats()}
+
+        self.assertEqual(stats[self.assignment.id].completed_count, 1)
+        self.assertEqual(stats[self.assignment.id].total_count, 3)
+        self.assertEqual(stats[self.assignment.id].completion_percentage, 33)
+        self.assertEqual(stats[empty_assignment.id].total_count, 0)
+        self.assertEqual(stats[empty_assignment.id].completion_percentage, 0)
+
 
 class CompletionRecordModelTests(TestCase):
     """测试完成记录模型的方法"""
@@ -752,6 +821,16 @@ class RatingCommentModelTests(TestCase):
         # 允许一定的浮点数误差
         self.assertAlmostEqual(comment.heat_score, expected_heat, places=2)
     
+    def test_with_engagement(self):
+        """测试 with_engagement() 的标注值与逐条统计一致"""
+        user = User.objects.create_user(username='engaged', password='password', user_type='student')
+        RatingCommentLike.objects.create(comment=self.comment, user=user)
+        RatingComment.objects.create(rating=self.rating, author=user, content="回复", parent=self.comment)
+
+        comment = RatingComment.objects.with_engagement().get(id=self.comment.id)
+        with self.assertNumQueries(0):
+            self.assertEqual((comment.likes_count, comment.replies_count), (1, 1))
+    
     def test_str_representation(self):
         """测试评论字符串表示"""
         expected_str = f"testuser 评论了 测试评分标题"
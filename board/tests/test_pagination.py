@@ -0,0 +1,61 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from board.models import User, HotTopic
+from board.pagination import paginate_by_cursor, encode_cursor, decode_cursor, NEXT
+
+
+class CursorPaginationTests(TestCase):
+    """测试基于 (created_at, id) 的游标分页"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='pager', password='testpassword', user_type='student')
+        now = timezone.now()
+        self.topics = []
+        for i in range(25):
+            topic = HotTopic.objects.create(title=f'热搜{i}', author=self.author, content='内容')
+            # 每两条热搜的创建时间相同，检验以 id 区分先后
+            topic.created_at = now - datetime.timedelta(minutes=i // 2)
+            topic.save()
+            self.topics.append(topic)
+        self.expected = [t.id for t in HotTopic.objects.order_by('-created_at', '-id')]
+
+    def test_walk_forward_and_back(self):
+        """依次向后翻页覆盖全部记录，再向前翻页得到相同的页"""
+        pages = []
+        page = paginate_by_cursor(HotTopic.objects.all())
+        self.assertFalse(page.has_previous())
+        while True:
+            pages.append([t.id for t in page])
+            if not page.has_next():
+                break
+            page = paginate_by_cursor(HotTopic.objects.all(), page.next_cursor)
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        page = paginate_by_cursor(HotTopic.objects.all(), page.previous_cursor)
+        self.assertEqual([t.id for t in page], pages[1])
+        page = paginate_by_cursor(HotTopic.objects.all(), page.previous_cursor)
+        self.assertEqual([t.id for t in page], pages[0])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """无效的游标返回第一页"""
+        for cursor in ('', 'not-a-cursor', '!!!', encode_cursor('sideways', self.topics[0])):
+            page = paginate_by_cursor(HotTopic.objects.all(), cursor)
+            self.assertEqual([t.id for t in page], self.expected[:10])
+
+    def test_cursor_round_trip(self):
+        """游标可以还原出方向和记录位置"""
+        topic = self.topics[3]
+        self.assertEqual(decode_cursor(encode_cursor(NEXT, topic)), (NEXT, topic.created_at, topic.id))
+
+    def test_count_is_optional(self):
+        """默认不统计总数，每页只需一次查询"""
+        with self.assertNumQueries(1):
+            page = paginate_by_cursor(HotTopic.objects.all())
+        self.assertIsNone(page.count)
+        self.assertEqual(paginate_by_cursor(HotTopic.objects.all(), with_count=True).count, 25)
@@ -0,0 +1,82 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from board.completion import fan_out_completion_records
+from board.models import Assignment, User, Subject
+
+
+class StudentDashboardScalingTests(TestCase):
+    """测试学生仪表盘的开销不随历史作业数量增长"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='benchteacher',
+            password='testpassword',
+            user_type='teacher'
+        )
+        self.student = User.objects.create_user(
+            username='benchstudent',
+            password='testpassword',
+            user_type='student'
+        )
+        self.subject = Subject.objects.create(name='测试科目')
+        self.today = datetime.date.today()
+        self.history_days = 0
+
+        # 当前有效的作业
+        current = Assignment.objects.create(
+            title='当前作业',
+            description='描述',
+            subject=self.subject,
+            teacher=self.teacher,
+            start_date=self.today,
+            end_date=self.today + datetime.timedelta(days=1)
+        )
+        fan_out_completion_records([current])
+        self.client.login(username='benchstudent', password='testpassword')
+
+    def add_history(self, count):
+        """添加已经过期的历史作业"""
+        assignments = []
+        for _ in range(count):
+            self.history_days += 1
+            end_date = self.today - datetime.timedelta(days=40 + self.history_days)
+            assignments.append(Assignment(
+                title=f'历史作业{self.history_days}',
+                description='描述',
+                subject=self.subject,
+                teacher=self.teacher,
+                start_date=end_date - datetime.timedelta(days=1),
+                end_date=end_date
+            ))
+        Assignment.objects.bulk_create(assignments)
+        fan_out_completion_records(Assignment.objects.filter(title__startswith='历史作业', total_count=0))
+
+    def measure(self):
+        """返回仪表盘执行的查询列表，不使用每日快照缓存"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(len(items) for items in response.context['subject_assignments'].values()), 1)
+        return queries.captured_queries
+
+    def test_dashboard_cost_is_flat_as_history_grows(self):
+        """历史作业从50增加到500时，查询数量不变且每个查询都按日期限定范围"""
+        self.add_history(50)
+        small_queries = self.measure()
+
+        self.add_history(450)
+        large_queries = self.measure()
+
+        self.assertEqual(len(small_queries), len(large_queries))
+
+        assignment_queries = [q['sql'] for q in large_queries if 'FROM "board_assignment"' in q['sql']]
+        self.assertTrue(assignment_queries)
+        for sql in assignment_queries:
+            self.assertIn('"board_assignment"."end_date"', sql.split('WHERE', 1)[1])
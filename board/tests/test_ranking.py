@@ -0,0 +1,282 @@
+import datetime
+
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from board.models import (
+    User, HotTopic, HotTopicLike, Comment, CommentLike, Rating, UserRating, RatingComment, RatingCommentLike
+)
+from board.ranking import (
+    hot_topics_by_heat, rank_score_to_heat, recount_topic_heat, top_comments_for_topics,
+    COMMENT_DECAY, RATING_DECAY, TOPIC_DECAY
+)
+
+
+class TopicHeatColumnsTests(TestCase):
+    """测试热搜热度汇总字段的维护"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='rankauthor',
+            password='testpassword',
+            user_type='student'
+        )
+        self.users = [
+            User.objects.create_user(username=f'ranker{i}', password='testpassword', user_type='student')
+            for i in range(3)
+        ]
+        self.topic = HotTopic.objects.create(title='热度测试', author=self.author, content='内容')
+
+    def assertColumnsMatchLiveHeat(self, topic):
+        topic.refresh_from_db()
+        ranked = {t.id: t.heat for t in hot_topics_by_heat(limit=None)}
+        self.assertEqual(topic.likes_total, topic.likes_count)
+        self.assertEqual(topic.base_score, 5 + topic.likes_count)
+        self.assertAlmostEqual(ranked[topic.id], topic.heat_score, places=4)
+
+    def test_likes_update_columns(self):
+        """点赞和取消点赞会更新点赞总数和基础热度"""
+        likes = [HotTopicLike.objects.create(topic=self.topic, user=user) for user in self.users]
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.likes_total, 3)
+        self.assertEqual(self.topic.base_score, 8)
+
+        likes[0].delete()
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.likes_total, 2)
+        self.assertEqual(self.topic.base_score, 7)
+
+    def test_comments_replies_and_likes_update_columns(self):
+        """评论、回复和评论点赞都会计入评论热度总和"""
+        comment = Comment.objects.create(topic=self.topic, author=self.author, content='评论')
+        comment.created_at = timezone.now() - datetime.timedelta(days=1)
+        comment.save()
+        Comment.objects.create(topic=self.topic, author=self.users[0], content='回复', parent=comment)
+        CommentLike.objects.create(comment=comment, user=self.users[1])
+        HotTopicLike.objects.create(topic=self.topic, user=self.users[2])
+        self.assertColumnsMatchLiveHeat(self.topic)
+
+        comment.delete()
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.comments_heat_sum, 0)
+        self.assertColumnsMatchLiveHeat(self.topic)
+
+    def test_stale_instance_save_keeps_columns(self):
+        """保存过期的热搜实例不会覆盖汇总字段"""
+        stale = HotTopic.objects.get(id=self.topic.id)
+        HotTopicLike.objects.create(topic=self.topic, user=self.users[0])
+        stale.is_pinned = True
+        stale.created_at = timezone.now() - datetime.timedelta(days=2)
+        stale.save()
+        self.assertColumnsMatchLiveHeat(stale)
+
+
+    def test_cascade_delete_keeps_columns(self):
+        """删除带有回复和点赞的评论后，按增量维护的字段与重新汇总的结果一致"""
+        comment = Comment.objects.create(topic=self.topic, author=self.author, content='评论')
+        reply = Comment.objects.create(topic=self.topic, author=self.users[0], content='回复', parent=comment)
+        CommentLike.objects.create(comment=comment, user=self.users[1])
+        CommentLike.objects.create(comment=reply, user=self.users[2])
+        Comment.objects.create(topic=self.topic, author=self.users[1], content='另一条评论')
+        self.assertEqual(recount_topic_heat(dry_run=True), [])
+
+        comment.delete()
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(recount_topic_heat(dry_run=True), [])
+        self.assertColumnsMatchLiveHeat(self.topic)
+
+    def test_like_cost_independent_of_comments(self):
+        """点赞和评论点赞的查询数量不随热搜的评论数量增长"""
+        def measure():
+            comment = Comment.objects.create(topic=self.topic, author=self.author, content='评论')
+            with CaptureQueriesContext(connection) as queries:
+                like = HotTopicLike.objects.create(topic=self.topic, user=self.users[0])
+                CommentLike.objects.create(comment=comment, user=self.users[0])
+            like.delete()
+            return len(queries)
+
+        few = measure()
+        for i in range(20):
+            Comment.objects.create(topic=self.topic, author=self.author, content=f'评论{i}')
+        self.assertEqual(measure(), few)
+
+    def test_recount_repairs_drift(self):
+        """重新汇总可以修正被直接修改的热度字段"""
+        HotTopicLike.objects.create(topic=self.topic, user=self.users[0])
+        HotTopic.objects.filter(id=self.topic.id).update(likes_total=10, base_score=15)
+
+        drifted = recount_topic_heat(dry_run=True)
+        self.assertEqual([(topic.id, columns['likes_total']) for topic, columns in drifted], [(self.topic.id, 1)])
+        recount_topic_heat()
+        self.assertEqual(recount_topic_heat(dry_run=True), [])
+        self.assertColumnsMatchLiveHeat(self.topic)
+
+
+class HotTopicsByHeatTests(TestCase):
+    """测试按热度排序的热搜查询"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='rankauthor',
+            password='testpassword',
+            user_type='student'
+        )
+        now = timezone.now()
+        self.topics = []
+        for i in range(15):
+            topic = HotTopic.objects.create(title=f'热搜{i}', author=self.author, content='内容')
+            topic.created_at = now - datetime.timedelta(hours=7 * i)
+            topic.save()
+            for j in range(i % 4):
+                user = User.objects.create_user(username=f'liker{i}_{j}', password='testpassword',
+                                                user_type='student')
+                HotTopicLike.objects.create(topic=topic, user=user)
+                Comment.objects.create(topic=topic, author=user, content='评论')
+            self.topics.append(topic)
+
+    def test_matches_python_ranking(self):
+        """数据库排序结果与逐条计算热度后的排序一致"""
+        expected = sorted(HotTopic.objects.all(), key=lambda t: (-t.is_pinned, -t.heat_score))[:10]
+        ranked = list(hot_topics_by_heat())
+        self.assertEqual([t.id for t in ranked], [t.id for t in expected])
+        for topic, expected_topic in zip(ranked, expected):
+            self.assertAlmostEqual(topic.heat, expected_topic.heat_score, places=4)
+
+    def test_pinned_first(self):
+        """置顶的热搜排在最前面"""
+        coldest = self.topics[-1]
+        coldest.is_pinned = True
+        coldest.save()
+        self.assertEqual(hot_topics_by_heat()[0].id, coldest.id)
+
+    def test_matches_python_ranking_across_batches(self):
+        """需要读取多批候选记录时结果仍与逐条计算一致"""
+        expected = sorted(HotTopic.objects.all(), key=lambda t: -t.heat_score)[:3]
+        self.assertEqual([t.id for t in hot_topics_by_heat(limit=3)], [t.id for t in expected])
+
+    def test_query_count_bounded(self):
+        """置顶查询加上一批候选记录即可得到前10条热搜"""
+        with self.assertNumQueries(2):
+            hot_topics_by_heat()
+
+    def test_rank_score_orders_like_heat(self):
+        """没有评论的热搜排序分数可以还原出实时热度"""
+        topic = HotTopic.objects.filter(comments__isnull=True).first()
+        self.assertAlmostEqual(rank_score_to_heat(topic.rank_score, TOPIC_DECAY), topic.heat_score, places=4)
+
+
+class CommentAndRatingRankTests(TestCase):
+    """测试评论和评分排序分数的维护"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'rankuser{i}', password='testpassword', user_type='student')
+            for i in range(3)
+        ]
+        self.topic = HotTopic.objects.create(title='热搜', author=self.users[0], content='内容')
+        self.rating = Rating.objects.create(title='评分', description='描述', author=self.users[0])
+
+    def assertRankMatchesHeat(self, obj, decay):
+        obj.refresh_from_db()
+        self.assertAlmostEqual(rank_score_to_heat(obj.rank_score, decay), obj.heat_score, places=4)
+
+    def test_comment_rank_follows_likes_and_replies(self):
+        """评论的排序分数随点赞和回复更新"""
+        comment = Comment.objects.create(topic=self.topic, author=self.users[0], content='评论')
+        comment.created_at = timezone.now() - datetime.timedelta(days=2)
+        comment.save()
+        self.assertRankMatchesHeat(comment, COMMENT_DECAY)
+
+        like = CommentLike.objects.create(comment=comment, user=self.users[1])
+        reply = Comment.objects.create(topic=self.topic, author=self.users[2], content='回复', parent=comment)
+        self.assertRankMatchesHeat(comment, COMMENT_DECAY)
+        self.assertRankMatchesHeat(reply, COMMENT_DECAY)
+
+        like.delete()
+        reply.delete()
+        self.assertRankMatchesHeat(comment, COMMENT_DECAY)
+
+    def test_rating_comment_rank(self):
+        """评分评论的排序分数随点赞和回复更新"""
+        comment = RatingComment.objects.create(rating=self.rating, author=self.users[0], content='评论')
+        RatingCommentLike.objects.create(comment=comment, user=self.users[1])
+        RatingComment.objects.create(rating=self.rating, author=self.users[2], content='回复', parent=comment)
+        self.assertRankMatchesHeat(comment, COMMENT_DECAY)
+
+    def test_rating_rank(self):
+        """评分项目的排序分数随评分和评论更新"""
+        self.assertRankMatchesHeat(self.rating, RATING_DECAY)
+        UserRating.objects.create(rating=self.rating, user=self.users[1], score=4)
+        comment = RatingComment.objects.create(rating=self.rating, author=self.users[2], content='评论')
+        self.assertRankMatchesHeat(self.rating, RATING_DECAY)
+
+        comment.delete()
+        self.assertRankMatchesHeat(self.rating, RATING_DECAY)
+
+    def test_hot_ratings_order(self):
+        """评分列表按热度排序时与逐条计算热度的顺序一致"""
+        older = Rating.objects.create(title='旧评分', description='描述', author=self.users[0])
+        older.created_at = timezone.now() - datetime.timedelta(days=30)
+        older.save()
+        for user in self.users:
+            UserRating.objects.create(rating=older, user=user, score=5)
+
+        expected = sorted(Rating.objects.all(), key=lambda r: -r.heat_score)
+        ranked = Rating.objects.order_by('-rank_score')
+        self.assertEqual([r.id for r in ranked], [r.id for r in expected])
+
+
+class TopCommentsForTopicsTests(TestCase):
+    """测试批量获取每个热搜热度最高的评论"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'topuser{i}', password='testpassword', user_type='student')
+            for i in range(4)
+        ]
+        self.topics = [
+            HotTopic.objects.create(title=f'热搜{i}', author=self.users[0], content='内容')
+            for i in range(5)
+        ]
+        now = timezone.now()
+        for i, topic in enumerate(self.topics[:4]):
+            for j in range(3):
+                comment = Comment.objects.create(topic=topic, author=self.users[j], content=f'评论{j}')
+                comment.created_at = now - datetime.timedelta(hours=10 * j)
+                comment.save()
+                for user in self.users[:(i + j) % 4]:
+                    CommentLike.objects.create(comment=comment, user=user)
+            # 回复不参与评选
+            reply = Comment.objects.create(topic=topic, author=self.users[3], content='回复', parent=comment)
+            for user in self.users:
+                CommentLike.objects.create(comment=reply, user=user)
+
+    def expected_top_comments(self):
+        expected = {}
+        for topic in self.topics:
+            comments = Comment.objects.filter(topic=topic, parent__isnull=True)
+            if comments.exists():
+                expected[topic.id] = max(comments, key=lambda c: c.heat_score).id
+        return expected
+
+    def test_window_function(self):
+        """使用窗口函数时结果与逐条计算热度一致，只需两次查询"""
+        with self.assertNumQueries(2):
+            top_comments = top_comments_for_topics(self.topics)
+        self.assertEqual({topic_id: c.id for topic_id, c in top_comments.items()}, self.expected_top_comments())
+
+    def test_subquery_fallback(self):
+        """不支持窗口函数时回退到关联子查询，结果相同"""
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            with self.assertNumQueries(2):
+                top_comments = top_comments_for_topics([topic.id for topic in self.topics])
+        self.assertEqual({topic_id: c.id for topic_id, c in top_comments.items()}, self.expected_top_comments())
+
+    def test_empty(self):
+        """没有热搜时不查询数据库"""
+        with self.assertNumQueries(0):
+            self.assertEqual(top_comments_for_topics([]), {})
@@ -0,0 +1,57 @@
+import asyncio
+
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.urls import reverse
+
+from board import activity, unread_channel
+from board.models import User, Notification
+from board.unread_channel import wait_for_unread_count, waiting_count
+
+
+class UnreadChannelTests(TestCase):
+    """测试未读通知数量的长轮询通道"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='testpassword', user_type='student')
+        Notification.objects.create(recipient=self.user, type='system', content='第一条通知')
+        self.async_client.force_login(self.user)
+        # 轮询请求会暂存最后活动时间，测试结束后丢弃，避免后台定时器写入其他测试的数据库
+        self.addCleanup(activity.discard_pending)
+
+    def create_notification(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(recipient=self.user, type='like', content='新通知')
+
+    async def test_returns_immediately_when_changed(self):
+        """已知未读数与当前值不同时立即返回"""
+        self.assertEqual(await wait_for_unread_count(self.user.id, 0), 1)
+        self.assertEqual(waiting_count(), 0)
+
+    async def test_wakes_on_new_notification(self):
+        """挂起的请求在新通知创建后被唤醒"""
+        task = asyncio.ensure_future(wait_for_unread_count(self.user.id, 1))
+        await asyncio.sleep(0.05)
+        self.assertFalse(task.done())
+        await sync_to_async(self.create_notification)()
+        self.assertEqual(await asyncio.wait_for(task, 5), 2)
+        self.assertEqual(waiting_count(), 0)
+
+    async def test_timeout_returns_current_count(self):
+        """没有变化时等待超时后返回当前值"""
+        with mock.patch.object(unread_channel, 'LONG_POLL_TIMEOUT', 0.05):
+            self.assertEqual(await wait_for_unread_count(self.user.id, 1), 1)
+        self.assertEqual(waiting_count(), 0)
+
+    async def test_asgi_poll(self):
+        """ASGI 下的长轮询接口支持挂起等待"""
+        response = await self.async_client.get(reverse('unread_notifications_poll'), {'since': ''})
+        self.assertEqual(response.json(), {'count': 1, 'push': True})
+
+    def test_wsgi_poll_falls_back(self):
+        """WSGI 下的长轮询接口立即返回，并让前端改为定时轮询"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('unread_notifications_poll'), {'since': '1'})
+        self.assertEqual(response.json(), {'count': 1, 'push': False})
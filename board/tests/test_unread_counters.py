@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from board.models import User, Notification, UnreadNotificationCounter
+from board.unread_counters import count_unread
+
+
+class UnreadCounterTests(TestCase):
+    """测试未读通知计数器的维护"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='counted', password='testpassword', user_type='student')
+
+    def notify(self, notification_type='like', **kwargs):
+        return Notification.objects.create(recipient=self.user, type=notification_type, content='通知', **kwargs)
+
+    def assertCountsMatch(self):
+        for notification_type in (None, 'like', 'reply', 'system'):
+            unread = Notification.objects.filter(recipient=self.user, is_read=False)
+            if notification_type:
+                unread = unread.filter(type=notification_type)
+            self.assertEqual(count_unread(self.user.id, notification_type), unread.count())
+
+    def test_create_save_and_delete(self):
+        """创建、标记已读和删除通知都会更新计数器"""
+        first = self.notify()
+        self.notify('reply')
+        self.notify('system', is_read=True)
+        self.assertEqual(count_unread(self.user.id), 2)
+        self.assertCountsMatch()
+
+        first.is_read = True
+        first.save()
+        self.assertCountsMatch()
+
+        Notification.objects.filter(type='reply').first().delete()
+        self.assertEqual(count_unread(self.user.id), 0)
+        self.assertCountsMatch()
+
+    def test_mark_read_view(self):
+        """批量标记已读后计数器归零，读取未读数不再统计通知表"""
+        for notification_type in ('like', 'like', 'reply'):
+            self.notify(notification_type)
+        self.client.force_login(self.user)
+
+        self.client.post(reverse('mark_notifications_read_by_type', args=['like']))
+        self.assertCountsMatch()
+        self.client.post(reverse('mark_notifications_read'))
+        self.assertCountsMatch()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(count_unread(self.user.id), 0)
+
+    def test_mark_read_rejects_unknown_type(self):
+        """未知的通知类型返回错误，不创建计数器"""
+        self.notify()
+        self.client.force_login(self.user)
+        before = set(UnreadNotificationCounter.objects.values_list('type', flat=True))
+
+        response = self.client.post(reverse('mark_notifications_read_by_type', args=['bogus']))
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(set(UnreadNotificationCounter.objects.values_list('type', flat=True)), before)
+        self.assertEqual(count_unread(self.user.id), 1)
+
+    def test_delete_user(self):
+        """删除用户时级联删除未读通知和计数器"""
+        self.notify()
+        self.user.delete()
+        self.assertFalse(Notification.objects.exists())
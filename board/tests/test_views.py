@@ -1,13 +1,17 @@
 import json
+from unittest import mock
 from django.test import TestCase, Client
-from django.urls import reverse
+from django.urls import reverse, resolve
 from django.contrib.auth import get_user_model
 from board.models import Subject, HotTopic, Comment, HotTopicLike, CommentLike, Assignment, CompletionRecord, Rating, RatingComment, UserRating, RatingCommentLike, Notification
 from django.utils import timezone
 from datetime import timedelta
 import datetime
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib import messages
+from board import markup
+from board.markup import clear_render_cache
 
 User = get_user_model()
 
@@ -245,6 +249,61 @@ class CommentViewTests(TestCase):
         # 由于admin_comment有两个点赞，它应该是热门评论
         self.assertIn('管理员的测试评论', data['html'])
     
+    def test_comment_lists_query_count_constant(self):
+        """测试评论列表和热门评论的查询次数不随评论数量增加"""
+        self.client.login(username='teststudent', password='testpassword')
+
+        def count_queries(url_name):
+            # 先请求一次，使Markdown渲染结果进入缓存
+            self.client.get(reverse(url_name), {'topic_id': self.topic.id})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(url_name), {'topic_id': self.topic.id})
+            self.assertTrue(json.loads(response.content)['success'])
+            return len(queries)
+
+        def add_comments(count):
+            for i in range(count):
+                comment = Comment.objects.create(topic=self.topic, author=self.another_student, content=f"评论{i}")
+                Comment.objects.create(topic=self.topic, author=self.student_user, content="回复", parent=comment)
+                CommentLike.objects.create(comment=comment, user=self.student_user)
+
+        add_comments(2)
+        baseline = {name: count_queries(name) for name in ('get_comments', 'get_hot_comments')}
+        add_comments(3)
+        self.assertEqual({name: count_queries(name) for name in baseline}, baseline)
+    
+    def test_get_comments_cursor(self):
+        """测试评论列表按游标翻页，不重复也不遗漏"""
+        for i in range(12):
+            Comment.objects.create(topic=self.topic, author=self.another_student, content=f"翻页评论{i}")
+        self.client.login(username='teststudent', password='testpassword')
+
+        data = self.client.get(reverse('get_comments'), {'topic_id': self.topic.id, 'count': '1'}).json()
+        self.assertTrue(data['has_next'])
+        self.assertFalse(data['has_previous'])
+        self.assertEqual(data['total_count'], Comment.objects.filter(topic=self.topic, parent__isnull=True).count())
+        self.assertIn(f'data-cursor="{data["next_cursor"]}"', data['html'])
+
+        next_page = self.client.get(
+            reverse('get_comments'), {'topic_id': self.topic.id, 'cursor': data['next_cursor']}
+        ).json()
+        self.assertFalse(next_page['has_next'])
+        self.assertTrue(next_page['has_previous'])
+        self.assertIsNone(next_page['total_count'])
+        self.assertIn('学生的测试评论', next_page['html'])
+        self.assertNotIn('翻页评论11', next_page['html'])
+    
+    def test_liked_comments_scoped_to_page(self):
+        """测试已点赞评论只在当前返回的评论中查询，结果为集合"""
+        other_topic = HotTopic.objects.create(title="其他热搜", content="内容", author=self.admin_user)
+        other_comment = Comment.objects.create(topic=other_topic, author=self.admin_user, content="其他评论")
+        CommentLike.objects.create(comment=other_comment, user=self.student_user)
+        CommentLike.objects.create(comment=self.comment, user=self.student_user)
+        self.client.login(username='teststudent', password='testpassword')
+
+        response = self.client.get(reverse('get_comments'), {'topic_id': self.topic.id})
+        self.assertEqual(response.context['user_liked_comments'], {self.comment.id})
+    
     def test_create_comment(self):
         """测试创建评论"""
         # 登录学生用户
@@ -364,6 +423,17 @@ class HotTopicViewTests(TestCase):
         # 创建测试客户端
         self.client = Client()
     
+    def test_liked_topics_scoped_to_page(self):
+        """测试热搜页面和最近热搜接口只查询本页热搜的点赞状态"""
+        HotTopicLike.objects.create(topic=self.topic1, user=self.student_user)
+        self.client.login(username='teststudent', password='testpassword')
+
+        response = self.client.get(reverse('hot_topics'))
+        self.assertEqual(response.context['user_liked_topics'], {self.topic1.id})
+
+        response = self.client.get(reverse('get_recent_topics'))
+        self.assertEqual(response.context['user_liked_topics'], {self.topic1.id})
+    
     def test_create_hot_topic(self):
         """测试创建热搜主题"""
         # 登录学生用户
@@ -2361,6 +2431,57 @@ class RatingViewTests(TestCase):
         
         # 不检查回复内容，因为回复可能不直接显示在页面上
         # self.assertContains(response, "回复测试")
+
+    def test_rating_detail_renders_current_page_only(self):
+        """测试评分详情只渲染当前页的评论"""
+        for i in range(25):
+            RatingComment.objects.create(rating=self.rating, author=self.student_user, content=f"分页评论**{i}**")
+        self.client.login(username='teststudent', password='testpassword')
+
+        clear_render_cache()
+        with mock.patch('board.markup.render_markdown', wraps=markup.render_markdown) as render_markdown:
+            response = self.client.get(reverse('rating_detail', args=[self.rating.id]) + '?page=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(render_markdown.call_count, 11)  # 评分详情 + 当前页的10条评论
+        self.assertContains(response, "分页评论<strong>14</strong>")
+        self.assertNotContains(response, "分页评论<strong>24</strong>")
+    
+    def test_rating_detail_query_count_constant(self):
+        """测试评分详情的查询次数不随评论和回复数量增加"""
+        self.client.login(username='teststudent', password='testpassword')
+
+        def count_queries():
+            # 先请求一次，使Markdown渲染结果进入缓存
+            self.client.get(reverse('rating_detail', args=[self.rating.id]))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('rating_detail', args=[self.rating.id]))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        def add_comments(count):
+            for i in range(count):
+                comment = RatingComment.objects.create(rating=self.rating, author=self.student_user, content=f"评论{i}")
+                RatingComment.objects.create(rating=self.rating, author=self.another_student, content="回复", parent=comment)
+                RatingCommentLike.objects.create(comment=comment, user=self.another_student)
+
+        add_comments(2)
+        baseline = count_queries()
+        add_comments(6)
+        self.assertEqual(count_queries(), baseline)
+    
+    def test_rating_detail_liked_state(self):
+        """测试评分详情按当前用户标记已点赞的评论"""
+        RatingCommentLike.objects.create(comment=self.comment, user=self.student_user)
+        self.client.login(username='teststudent', password='testpassword')
+        response = self.client.get(reverse('rating_detail', args=[self.rating.id]))
+        liked = {comment.id: comment.is_liked for comment in response.context['comments']}
+        self.assertTrue(liked[self.comment.id])
+
+        self.client.login(username='anotherstudent', password='testpassword')
+        response = self.client.get(reverse('rating_detail', args=[self.rating.id]))
+        liked = {comment.id: comment.is_liked for comment in response.context['comments']}
+        self.assertFalse(liked[self.comment.id])
     
     def test_rating_detail_anonymous(self):
         """测试匿名评分详情视图"""
@@ -2671,4 +2792,36 @@ class RatingViewTests(TestCase):
             recipient=self.student_user,  # 评论作者
             sender=self.another_student,
             type='like'
-        ).exists())
\ No newline at end of file
+        ).exists())
+
+class StaticVendorTests(TestCase):
+    """测试第三方静态文件的路由"""
+
+    def test_katex_served_with_long_cache(self):
+        """KaTeX文件使用允许长期缓存的路由，其他静态文件不受影响"""
+        self.assertEqual(resolve('/static/js/katex/katex.min.js').url_name, 'static_vendor')
+        self.assertEqual(resolve('/static/css/katex/fonts/KaTeX_Main-Regular.woff2').url_name, 'static_vendor')
+        self.assertEqual(resolve('/static/js/base.js').url_name, 'static')
+
+
+class NotificationViewTests(TestCase):
+    """测试通知页面和通知接口"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='notified', password='testpassword', user_type='student')
+        for i in range(15):
+            Notification.objects.create(recipient=self.user, type='like', content=f'点赞通知{i}')
+        self.client.login(username='notified', password='testpassword')
+
+    def test_load_more_by_cursor(self):
+        """通知页面只显示第一页，加载更多按游标获取剩余通知"""
+        response = self.client.get(reverse('notifications'))
+        likes = response.context['likes']
+        self.assertEqual(len(likes), 10)
+        self.assertContains(response, f'data-cursor="{likes.next_cursor}"')
+
+        data = self.client.get(reverse('get_notifications_ajax'), {'type': 'like', 'cursor': likes.next_cursor}).json()
+        self.assertEqual(len(data['notifications']), 5)
+        self.assertFalse(data['has_next'])
+        seen = {n.id for n in likes} | {n['id'] for n in data['notifications']}
+        self.assertEqual(seen, set(Notification.objects.values_list('id', flat=True)))
@@ -0,0 +1,76 @@
+"""未读通知数量的长轮询推送通道
+
+浏览器带上已知的未读数 since 发起请求：未读数已经变化时立即返回，否则请求在 asyncio
+中挂起，直到该用户有通知创建、删除或被标记为已读时被唤醒，最长等待 LONG_POLL_TIMEOUT
+秒后返回当前值。挂起的请求只占用一个 Future，不占用线程和数据库连接。
+
+只有通过 ASGI（homework_board/asgi.py）部署时才会挂起等待；WSGI 下请求立即返回并告知
+前端继续按固定间隔轮询。唤醒只在当前进程内传递，多进程部署时其他进程的请求最迟在超时后
+取得最新值。
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from .unread_counters import count_unread
+
+# 长轮询的最长等待时间（秒），空闲时前端大约每隔这么久重新发起一次请求
+LONG_POLL_TIMEOUT = 50
+
+# 用户ID -> 挂起请求的 (事件循环, Future) 集合
+_waiters = defaultdict(set)
+_lock = threading.Lock()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def wake_waiters(user_id):
+    """唤醒该用户所有挂起的长轮询请求，可以在任意线程中调用"""
+    with _lock:
+        waiters = _waiters.pop(user_id, ())
+    for loop, future in waiters:
+        loop.call_soon_threadsafe(_wake, future)
+
+
+def notify_unread_changed(user_id):
+    """用户的未读数可能发生变化，在事务提交后唤醒挂起的请求，保证它们能读到新数据"""
+    transaction.on_commit(partial(wake_waiters, user_id))
+
+
+def waiting_count():
+    """当前挂起的长轮询请求数量"""
+    with _lock:
+        return sum(len(waiters) for waiters in _waiters.values())
+
+
+async def wait_for_unread_count(user_id, since):
+    """返回用户当前的未读数；与 since 相同时挂起等待变化，最长 LONG_POLL_TIMEOUT 秒"""
+    loop = asyncio.get_running_loop()
+    entry = (loop, loop.create_future())
+    # 先登记再查询，查询期间发生的变化也能唤醒本次请求
+    with _lock:
+        _waiters[user_id].add(entry)
+    try:
+        count = await sync_to_async(count_unread)(user_id)
+        if count != since:
+            return count
+        try:
+            await asyncio.wait_for(entry[1], LONG_POLL_TIMEOUT)
+        except asyncio.TimeoutError:
+            # 超时后重新查询，其他进程中发生的变化也能被发现
+            pass
+        return await sync_to_async(count_unread)(user_id)
+    finally:
+        with _lock:
+            waiters = _waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(entry)
+                if not waiters:
+                    del _waiters[user_id]
@@ -0,0 +1,77 @@
+"""按用户和通知类型维护的未读通知计数器
+
+导航栏的未读数、通知页面和长轮询都直接读取计数器，不再对通知表执行 COUNT(*)。
+计数器在通知创建、修改、删除（信号）和批量标记已读（mark_notifications_read）时更新，
+通过其他方式修改通知后可以运行 reconcile_unread_counters 命令校对。
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Notification, UnreadNotificationCounter
+
+NOTIFICATION_TYPES = [notification_type for notification_type, _ in Notification.TYPE_CHOICES]
+
+
+def count_unread(user_id, notification_type=None):
+    """读取用户的未读通知数量，不指定类型时返回所有类型之和"""
+    counters = UnreadNotificationCounter.objects.filter(user_id=user_id)
+    if notification_type:
+        counters = counters.filter(type=notification_type)
+    return counters.aggregate(total=Sum('count'))['total'] or 0
+
+
+def _live_unread_counts(notifications):
+    """从通知表统计未读数，返回 {(用户ID, 类型): 数量}"""
+    return {
+        (user_id, notification_type): count
+        for user_id, notification_type, count in notifications.filter(is_read=False).order_by().values_list(
+            'recipient_id', 'type'
+        ).annotate(count=Count('id'))
+    }
+
+
+def increment_unread(user_id, notification_type):
+    """新增一条未读通知时计数器加一，计数器不存在时从通知表统计"""
+    updated = UnreadNotificationCounter.objects.filter(user_id=user_id, type=notification_type).update(
+        count=F('count') + 1
+    )
+    if not updated:
+        refresh_unread_counters(user_id, [notification_type])
+
+
+def refresh_unread_counters(user_id, types=None, create_missing=True):
+    """从通知表重新统计用户的未读计数器，types 为空时统计所有类型"""
+    types = types or NOTIFICATION_TYPES
+    live = _live_unread_counts(Notification.objects.filter(recipient_id=user_id, type__in=types))
+    for notification_type in types:
+        count = live.get((user_id, notification_type), 0)
+        if create_missing:
+            UnreadNotificationCounter.objects.update_or_create(
+                user_id=user_id, type=notification_type, defaults={'count': count}
+            )
+        else:
+            UnreadNotificationCounter.objects.filter(user_id=user_id, type=notification_type).update(count=count)
+
+
+def reconcile_unread_counters(dry_run=False):
+    """根据通知表校对所有未读计数器
+
+    返回存在偏差的 (用户ID, 类型, 计数器值, 实际未读数) 列表，dry_run 为真时只报告偏差。
+    """
+    live = _live_unread_counts(Notification.objects.all())
+    stored = {
+        (user_id, notification_type): count
+        for user_id, notification_type, count in UnreadNotificationCounter.objects.values_list('user_id', 'type', 'count')
+    }
+    drifted = [
+        (user_id, notification_type, stored.get((user_id, notification_type), 0), live.get((user_id, notification_type), 0))
+        for user_id, notification_type in sorted(set(live) | set(stored))
+        if stored.get((user_id, notification_type), 0) != live.get((user_id, notification_type), 0)
+    ]
+    if not dry_run:
+        with transaction.atomic():
+            for user_id, notification_type, _, count in drifted:
+                UnreadNotificationCounter.objects.update_or_create(
+                    user_id=user_id, type=notification_type, defaults={'count': count}
+                )
+    return drifted
@@ -5,32 +5,47 @@ import re
 import math
 from functools import wraps
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db import models
-from django.http import JsonResponse
+from django.db import models, transaction
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count, Q, Avg
+from django.db.models import Count, Q, Avg, Prefetch
 from django.contrib import messages
 from django.urls import reverse
-import markdown
 import ipaddress
 from user_agents import parse as user_agents_parse
-import requests
-import bleach
 
+from .activity import online_users
+from .allocator import save_assignment_with_free_id
+from .api_tokens import issue_token, revoke_token, authenticate_token, get_request_token
+from .background import device_login_queue
+from .completion import (
+    fan_out_completion_records, fan_out_for_new_student, student_assignment_queryset, get_completion_record,
+    completion_records_for_assignment, toggle_completion_record
+)
 from .forms import (
     CustomUserCreationForm, CustomAuthenticationForm, AssignmentForm, BatchAssignmentForm,
     UpdateUsernameForm, ChangePasswordForm, RatingForm, UserRatingForm, RatingCommentForm,
     HotTopicForm
 )
+from .geoip import get_geolocator
+from .homework import get_today_homework_text, student_assignments_for_date
+from .markup import convert_markdown_to_html, render_many
 from .models import (
     User, Subject, Assignment, CompletionRecord, HotTopic, HotTopicLike, Comment, 
     CommentLike, Notification, DeviceLogin, Rating, UserRating, RatingComment, RatingCommentLike
 )
+from .pagination import paginate_by_cursor
+from .ranking import hot_topics_by_heat, top_comments_for_topics
+from .unread_channel import notify_unread_changed, wait_for_unread_count
+from .unread_counters import NOTIFICATION_TYPES, count_unread, refresh_unread_counters
 
 
 def user_type_required(user_types):
@@ -59,8 +74,8 @@ def login_view(request):
             if user is not None:
                 login(request, user)
                 
-                # 记录设备登录信息
-                record_device_login(request, user)
+                # 在后台记录设备登录信息
+                enqueue_device_login(request, user)
                 
                 return redirect('dashboard')
     else:
@@ -80,20 +95,12 @@ def register_view(request):
 
             # 如果是学生用户，为其创建所有现有作业的完成记录
             if user.user_type == 'student':
-                assignments = Assignment.objects.all()
-                for assignment in assignments:
-                    # 检查记录是否已存在
-                    if not CompletionRecord.objects.filter(student=user, assignment=assignment).exists():
-                        CompletionRecord.objects.create(
-                            student=user,
-                            assignment=assignment,
-                            completed=False
-                        )
+                fan_out_for_new_student(user)
 
             login(request, user)
             
-            # 记录设备登录信息
-            record_device_login(request, user)
+            # 在后台记录设备登录信息
+            enqueue_device_login(request, user)
             
             return redirect('dashboard')
         else:
@@ -112,132 +119,91 @@ def logout_view(request):
 
 @csrf_exempt
 def get_today_homework(request):
-    """API: 获取今天的作业（不含今天截止的作业）"""
-    if request.method == 'POST':
+    """API: 获取今天的作业（不含今天截止的作业）
+
+    支持两种认证方式：请求头携带设备令牌（可使用GET或POST），或在POST请求体中提供用户名和密码。
+    """
+    raw_token = get_request_token(request)
+    if request.method == 'POST' or (raw_token and request.method == 'GET'):
         try:
-            data = json.loads(request.body)
-            username = data.get('username')
-            password = data.get('password')
+            if raw_token:
+                # 令牌认证，跳过密码哈希
+                user = authenticate_token(raw_token)
+                if user is None:
+                    return JsonResponse({'success': False, 'message': '令牌无效或已吊销'}, status=401)
+            else:
+                data = json.loads(request.body)
+                username = data.get('username')
+                password = data.get('password')
 
-            if not username or not password:
-                return JsonResponse({'success': False, 'message': '用户名或密码缺失'}, status=400)
+                if not username or not password:
+                    return JsonResponse({'success': False, 'message': '用户名或密码缺失'}, status=400)
 
-            # 验证用户身份
-            user = authenticate(username=username, password=password)
-            if user is None:
-                return JsonResponse({'success': False, 'message': '用户名或密码错误'}, status=401)
+                # 验证用户身份
+                user = authenticate(username=username, password=password)
+                if user is None:
+                    return JsonResponse({'success': False, 'message': '用户名或密码错误'}, status=401)
 
             # 确保是学生账号
             if user.user_type != 'student':
                 return JsonResponse({'success': False, 'message': '只有学生账号可以使用此功能'}, status=403)
 
-            # 获取今天的日期
-            today = timezone.now().date()
-            tomorrow = today + datetime.timedelta(days=1)
-
-            # 判断今天是周几（0是周一，6是周日）
-            today_weekday = today.weekday()
-
-            # 如果今天是周五、六、日，计算下周一的日期
-            next_monday = None
-            if today_weekday == 4:  # 周五
-                next_monday = today + datetime.timedelta(days=3)  # 加3天得到下周一
-            elif today_weekday == 5:  # 周六
-                next_monday = today + datetime.timedelta(days=2)  # 加2天得到下周一
-            elif today_weekday == 6:  # 周日
-                next_monday = today + datetime.timedelta(days=1)  # 加1天得到下周一
-
-            # 获取学生的所有作业（通过完成记录关联），且是今天需要做的作业（开始日期<=今天，且截止日期>今天）
-            student_completion_records = CompletionRecord.objects.filter(
-                student=user,
-                assignment__start_date__lte=today,
-                assignment__end_date__gt=today
-            ).select_related('assignment', 'assignment__subject', 'assignment__teacher')
-
-            # 获取用户隐藏的科目ID列表
-            hidden_subject_ids = list(user.hidden_subjects.values_list('id', flat=True))
-
-            # 如果有隐藏科目，则过滤掉这些科目的作业
-            if hidden_subject_ids:
-                student_completion_records = student_completion_records.exclude(
-                    assignment__subject_id__in=hidden_subject_ids
-                )
-
-            # 按科目分组作业
-            subject_assignments = {}
-            for record in student_completion_records:
-                assignment = record.assignment
-                subject_name = assignment.subject.name
-
-                if subject_name not in subject_assignments:
-                    subject_assignments[subject_name] = []
-
-                # 添加特殊标记
-                special_mark = ""
-                if next_monday:
-                    if assignment.end_date > next_monday:
-                        special_mark = "周一不收"
-                elif assignment.end_date != tomorrow:
-                    special_mark = "明不收"
-
-                subject_assignments[subject_name].append({
-                    'id': assignment.id,
-                    'title': assignment.title,
-                    'description': assignment.description,
-                    'teacher': assignment.teacher.username,
-                    'end_date': assignment.end_date,
-                    'completed': record.completed,
-                    'special_mark': special_mark
-                })
+            # 获取今天的作业文本（按学生和日期缓存）
+            result_str, etag = get_today_homework_text(user, timezone.now().date())
 
-            # 构建返回的字符串
-            result_str = ""
-
-            # 科目的自定义排序顺序
-            subject_order = {
-                '其他': 0,
-                '语文': 1,
-                '数学': 2,
-                '英语': 3,
-                '物理': 4,
-                '化学': 5,
-                '生物': 6,
-                '历史': 7,
-                '地理': 8,
-                '政治': 9
-            }
+            # 轮询客户端的缓存仍然有效时返回304
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+            else:
+                # 返回纯文本格式
+                response = HttpResponse(result_str, content_type='text/plain; charset=utf-8')
+            response['ETag'] = etag
+            return response
 
-            # 按自定义顺序排序科目
-            sorted_subjects = sorted(
-                subject_assignments.keys(),
-                key=lambda x: subject_order.get(x, 100)  # 如果科目不在预定义列表中，放到最后
-            )
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'message': '无效的请求数据'}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': f'获取作业失败: {str(e)}'}, status=500)
 
-            # 按照排序后的科目顺序输出
-            for subject_name in sorted_subjects:
-                result_str += f"{subject_name}：\n"
+    return JsonResponse({'success': False, 'message': '方法不允许'}, status=405)
 
-                # 对每个科目内的作业按截止日期排序
-                assignments = sorted(subject_assignments[subject_name], key=lambda x: x['end_date'])
 
-                # 添加每个作业
-                for i, assignment in enumerate(assignments, 1):
-                    title = assignment['title']
-                    mark = f" ({assignment['special_mark']})" if assignment['special_mark'] else ""
-                    result_str += f"{i}.{title}{mark}\n"
-                result_str.strip()
+@csrf_exempt
+def issue_api_token(request):
+    """API: 使用用户名和密码为设备签发令牌"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            username = data.get('username')
+            password = data.get('password')
+            device_name = str(data.get('device_name') or '')
 
-            if not result_str:
-                result_str = "今天暂时没有需要完成的作业"
+            if not username or not password:
+                return JsonResponse({'success': False, 'message': '用户名或密码缺失'}, status=400)
 
-            # 返回纯文本格式
-            from django.http import HttpResponse
-            return HttpResponse(result_str.strip(), content_type='text/plain; charset=utf-8')
+            user = authenticate(username=username, password=password)
+            if user is None:
+                return JsonResponse({'success': False, 'message': '用户名或密码错误'}, status=401)
 
+            token, raw_token = issue_token(user, device_name)
+            return JsonResponse({'success': True, 'token': raw_token, 'token_id': token.id})
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'message': '无效的请求数据'}, status=400)
-        except Exception as e:
-            return JsonResponse({'success': False, 'message': f'获取作业失败: {str(e)}'}, status=500)
+
+    return JsonResponse({'success': False, 'message': '方法不允许'}, status=405)
+
+
+@csrf_exempt
+def revoke_api_token(request):
+    """API: 吊销请求头中携带的设备令牌"""
+    if request.method == 'POST':
+        raw_token = get_request_token(request)
+        if not raw_token:
+            return JsonResponse({'success': False, 'message': '缺少令牌'}, status=400)
+
+        if revoke_token(raw_token):
+            return JsonResponse({'success': True})
+        return JsonResponse({'success': False, 'message': '令牌不存在'}, status=404)
 
     return JsonResponse({'success': False, 'message': '方法不允许'}, status=405)
 
@@ -268,7 +234,7 @@ def admin_dashboard(request):
     students_list = User.objects.filter(user_type='student').order_by('student_id', 'username')
     teachers_list = User.objects.filter(user_type='teacher').order_by('username')
     admins_list = User.objects.filter(user_type='admin').exclude(id=request.user.id).order_by('username')
-    assignments_list = Assignment.objects.all().order_by('-created_at')
+    assignments_list = Assignment.objects.with_completion_stats().order_by('-created_at')
 
     # 创建分页器
     students_paginator = Paginator(students_list, 10)  # 每页10条
@@ -289,28 +255,11 @@ def admin_dashboard(request):
         admins = admins_paginator.page(1)
         assignments = assignments_paginator.page(1)
 
-    # 预先计算每个作业的完成情况
-    for assignment in assignments:
-        # 计算完成的学生数量
-        completed_count = CompletionRecord.objects.filter(
-            assignment=assignment,
-            completed=True
-        ).count()
-
-        # 计算总学生数量
-        total_count = CompletionRecord.objects.filter(
-            assignment=assignment
-        ).count()
-
-        # 添加到作业对象中
-        assignment.completed_count = completed_count
-        assignment.total_count = total_count
-        assignment.completion_percentage = 0 if total_count == 0 else int((completed_count / total_count) * 100)
-
     # 统计信息用于显示总数
     total_students = students_list.count()
     total_teachers = teachers_list.count()
     total_assignments = assignments_list.count()
+    online_count = online_users().count()
 
     return render(request, 'admin_dashboard.html', {
         'students': students,
@@ -319,32 +268,15 @@ def admin_dashboard(request):
         'assignments': assignments,
         'total_students': total_students,
         'total_teachers': total_teachers,
-        'total_assignments': total_assignments
+        'total_assignments': total_assignments,
+        'online_count': online_count
     })
 
 
 @user_type_required(['teacher'])
 def teacher_dashboard(request):
-    # 获取当前教师的所有作业
-    assignments = Assignment.objects.filter(teacher=request.user).order_by('-created_at')
-
-    # 预先计算每个作业的完成情况
-    for assignment in assignments:
-        # 计算完成的学生数量
-        completed_count = CompletionRecord.objects.filter(
-            assignment=assignment,
-            completed=True
-        ).count()
-
-        # 计算总学生数量
-        total_count = CompletionRecord.objects.filter(
-            assignment=assignment
-        ).count()
-
-        # 添加到作业对象中
-        assignment.completed_count = completed_count
-        assignment.total_count = total_count
-        assignment.completion_percentage = 0 if total_count == 0 else int((completed_count / total_count) * 100)
+    # 获取当前教师的所有作业，并在同一查询中统计完成情况
+    assignments = Assignment.objects.filter(teacher=request.user).with_completion_stats().order_by('-created_at')
 
     return render(request, 'teacher_dashboard.html', {'assignments': assignments})
 
@@ -387,76 +319,43 @@ def student_dashboard(request):
     # 获取用户隐藏的科目ID列表
     hidden_subject_ids = list(request.user.hidden_subjects.values_list('id', flat=True))
 
-    # 获取学生的所有作业（通过完成记录关联）
-    student_completion_records = CompletionRecord.objects.filter(
-        student=request.user
-    ).select_related('assignment', 'assignment__subject')
+    # 获取学生的所有作业（附带完成状态）
+    student_assignments = student_assignment_queryset(request.user)
 
     # 如果有隐藏科目，则过滤掉这些科目的作业
     if hidden_subject_ids:
-        student_completion_records = student_completion_records.exclude(
-            assignment__subject_id__in=hidden_subject_ids
+        student_assignments = student_assignments.exclude(
+            subject_id__in=hidden_subject_ids
         )
 
-    # 筛选出当前日期有效的作业（开始日期<=所选日期，且截止日期>所选日期（不包含截止日期当天））
-    assignments_for_selected_date = []
-    for record in student_completion_records:
-        assignment = record.assignment
-        if assignment.start_date <= selected_date and assignment.end_date > selected_date:
-            # 判断是否明天到期
-            assignment.due_tomorrow = assignment.end_date == tomorrow
-            # 判断是否今天到期，用于前端标记
-            assignment.due_today = assignment.end_date == today
-            # 添加完成状态
-            assignment.completed = record.completed
-            assignments_for_selected_date.append(assignment)
-
-            # 如果有选中的作业ID，获取对应的作业对象
-            if selected_assignment_id and str(assignment.id) == selected_assignment_id:
-                selected_assignment = assignment
-
-    # 按科目分组作业
-    subject_assignments = {}
+    # 从全班共用的每日快照中取出所选日期有效的作业（开始日期<=所选日期，且截止日期>所选日期（不包含截止日期当天）），
+    # 并叠加该学生的隐藏科目和完成状态
+    assignments_for_selected_date = student_assignments_for_date(request.user, selected_date, hidden_subject_ids)
     for assignment in assignments_for_selected_date:
-        subject_name = assignment.subject.name
-        if subject_name not in subject_assignments:
-            subject_assignments[subject_name] = []
-        subject_assignments[subject_name].append(assignment)
-
-    # 对每个科目内的作业进行排序 - 先按截止日期（近的先显示），后按创建时间（新的先显示）
-    for subject, assignments in subject_assignments.items():
-        subject_assignments[subject] = sorted(
-            assignments,
-            key=lambda a: (a.end_date, -a.created_at.timestamp())
-        )
+        # 判断是否明天到期
+        assignment.due_tomorrow = assignment.end_date == tomorrow
+        # 判断是否今天到期，用于前端标记
+        assignment.due_today = assignment.end_date == today
 
-    # 计算当月每天是否有作业
-    days_with_assignments = set()
-    for record in student_completion_records:
-        assignment = record.assignment
-        end_date = assignment.end_date
-        if end_date.year == current_year and end_date.month == current_month:
-            days_with_assignments.add(end_date.day)
-
-    # 科目的自定义排序顺序
-    subject_order = {
-        '其他': 0,
-        '语文': 1,
-        '数学': 2,
-        '英语': 3,
-        '物理': 4,
-        '化学': 5,
-        '生物': 6,
-        '历史': 7,
-        '地理': 8,
-        '政治': 9
-    }
+        # 如果有选中的作业ID，获取对应的作业对象
+        if selected_assignment_id and str(assignment.id) == selected_assignment_id:
+            selected_assignment = assignment
 
-    # 按自定义顺序排序科目
-    sorted_subject_assignments = dict(sorted(
-        subject_assignments.items(),
-        key=lambda x: subject_order.get(x[0], 100)  # 如果科目不在预定义列表中，放到最后
-    ))
+    # 按科目分组作业，快照已按科目顺序排序，科目内先按截止日期（近的先显示），后按创建时间（新的先显示）
+    subject_assignments = {}
+    for assignment in assignments_for_selected_date:
+        subject_assignments.setdefault(assignment.subject.name, []).append(assignment)
+
+    # 计算当月每天是否有作业，只查询当月截止的作业日期
+    month_start = datetime.date(current_year, current_month, 1)
+    month_end = datetime.date(current_year, current_month, calendar.monthrange(current_year, current_month)[1])
+    days_with_assignments = {
+        end_date.day
+        for end_date in student_assignments.filter(
+            end_date__gte=month_start,
+            end_date__lte=month_end
+        ).values_list('end_date', flat=True).distinct()
+    }
 
     context = {
         'calendar': cal,
@@ -466,7 +365,7 @@ def student_dashboard(request):
         'current_year': current_year,
         'current_month': current_month,
         'current_month_name': current_month_name,
-        'subject_assignments': sorted_subject_assignments,
+        'subject_assignments': subject_assignments,
         'days_with_assignments': days_with_assignments,
         'selected_assignment': selected_assignment,
     }
@@ -474,27 +373,6 @@ def student_dashboard(request):
     return render(request, 'student_dashboard.html', context)
 
 
-def get_next_available_assignment_id():
-    """查找可用的最小作业ID"""
-    # 获取当前所有作业ID
-    used_ids = set(Assignment.objects.values_list('id', flat=True))
-
-    # 找出未使用的ID
-    if not used_ids:
-        return 1
-
-    # 寻找中间空缺的ID
-    max_id = max(used_ids)
-    missing_ids = set(range(1, max_id + 1)) - used_ids
-
-    if missing_ids:
-        # 返回最小的未使用ID
-        return min(missing_ids)
-    else:
-        # 如果没有空缺ID，则返回最大ID+1
-        return max_id + 1
-
-
 @user_type_required(['teacher', 'admin'])
 def create_assignment(request):
     # 获取当前教师最近的一个作业作为默认值参考
@@ -538,17 +416,13 @@ def create_assignment(request):
                 assignments_list = batch_form.cleaned_data['assignments']
 
                 # 批量创建作业
-                students = User.objects.filter(user_type='student')
+                created_assignments = []
                 for assignment_data in assignments_list:
                     # 如果描述为空，设置为"暂无"
                     description = assignment_data['description'].strip() or "暂无"
 
-                    # 获取可用的最小ID
-                    next_id = get_next_available_assignment_id()
-
-                    # 使用指定ID创建作业
+                    # 使用可用的最小ID创建作业
                     assignment = Assignment(
-                        id=next_id,
                         title=assignment_data['title'],
                         description=description,
                         subject=subject,
@@ -556,17 +430,11 @@ def create_assignment(request):
                         end_date=end_date,
                         teacher=request.user
                     )
+                    save_assignment_with_free_id(assignment)
+                    created_assignments.append(assignment)
 
-                    # 使用save方法的force_insert确保使用指定ID
-                    assignment.save(force_insert=True)
-
-                    # 为所有学生创建完成记录
-                    for student in students:
-                        CompletionRecord.objects.create(
-                            student=student,
-                            assignment=assignment,
-                            completed=False
-                        )
+                # 为所有学生一次性创建这批作业的完成记录
+                fan_out_completion_records(created_assignments)
 
                 return redirect('teacher_dashboard')
         else:
@@ -582,21 +450,11 @@ def create_assignment(request):
                 if not assignment.description.strip():
                     assignment.description = "暂无"
 
-                # 获取可用的最小ID
-                next_id = get_next_available_assignment_id()
-                assignment.id = next_id
-
-                # 使用force_insert确保使用指定ID
-                assignment.save(force_insert=True)
+                # 使用可用的最小ID保存作业
+                save_assignment_with_free_id(assignment)
 
                 # 为所有学生创建完成记录
-                students = User.objects.filter(user_type='student')
-                for student in students:
-                    CompletionRecord.objects.create(
-                        student=student,
-                        assignment=assignment,
-                        completed=False
-                    )
+                fan_out_completion_records([assignment])
 
                 return redirect('teacher_dashboard')
     else:
@@ -672,22 +530,14 @@ def edit_assignment(request, pk):
 @user_type_required(['teacher', 'admin'])
 def assignment_detail(request, pk):
     # 管理员可以查看任何作业，教师只能查看自己的作业
+    # 查询作业的同时统计完成情况
+    assignments = Assignment.objects.with_completion_stats()
     if request.user.user_type == 'admin':
-        assignment = get_object_or_404(Assignment, pk=pk)
+        assignment = get_object_or_404(assignments, pk=pk)
     else:
-        assignment = get_object_or_404(Assignment, pk=pk, teacher=request.user)
+        assignment = get_object_or_404(assignments, pk=pk, teacher=request.user)
 
-    completion_records = CompletionRecord.objects.filter(assignment=assignment)
-
-    # 计算完成情况统计
-    completed_count = completion_records.filter(completed=True).count()
-    total_count = completion_records.count()
-    completion_percentage = 0 if total_count == 0 else int((completed_count / total_count) * 100)
-
-    # 添加到作业对象
-    assignment.completed_count = completed_count
-    assignment.total_count = total_count
-    assignment.completion_percentage = completion_percentage
+    completion_records = completion_records_for_assignment(assignment)
 
     return render(request, 'assignment_detail.html', {
         'assignment': assignment,
@@ -710,21 +560,10 @@ def toggle_assignment_completion(request):
                 }, status=400)
 
             try:
-                record = CompletionRecord.objects.get(
-                    student=request.user,
-                    assignment_id=assignment_id
-                )
+                record = get_completion_record(request.user, assignment_id)
 
-                # 切换完成状态
-                record.completed = not record.completed
-
-                # 如果标记为完成，记录完成时间
-                if record.completed:
-                    record.completed_at = timezone.now()
-                else:
-                    record.completed_at = None
-
-                record.save()
+                # 切换完成状态，同时更新作业的完成计数器
+                toggle_completion_record(record)
 
                 print(
                     f"学生 {request.user.username} 将作业 {assignment_id} 标记为: {'已完成' if record.completed else '未完成'}")
@@ -828,13 +667,7 @@ def create_user(request):
 
             # 如果创建的是学生账号，为该学生添加已有作业的完成记录
             if user_type == 'student':
-                existing_assignments = Assignment.objects.all()
-                for assignment in existing_assignments:
-                    CompletionRecord.objects.create(
-                        student=user,
-                        assignment=assignment,
-                        completed=False
-                    )
+                fan_out_for_new_student(user)
 
             return JsonResponse({'success': True})
         except Exception as e:
@@ -1061,134 +894,37 @@ def delete_my_account(request):
     return redirect('settings')
 
 
-def strip_markdown(text):
-    """将Markdown文本转换为纯文本（去除Markdown语法标记）"""
-    if not text:
-        return ""
-        
-    # 去除行间公式标记$$...$$，保留内部内容
-    text = re.sub(r"\$\$(.*?)\$\$", r"[\1]", text, flags=re.S)
-    
-    # 去除行内公式标记$...$，保留内部内容
-    text = re.sub(r"\$(.*?)\$", r"[\1]", text, flags=re.S)
-    
-    # 去除标题标记
-    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.M)
-    
-    # 去除粗体和斜体
-    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
-    text = re.sub(r"\*(.*?)\*", r"\1", text)
-    text = re.sub(r"__(.*?)__", r"\1", text)
-    text = re.sub(r"_(.*?)_", r"\1", text)
-    
-    # 去除行内代码和代码块
-    text = re.sub(r"`{1,3}(.*?)`{1,3}", r"\1", text, flags=re.S)
-
-    # 去除图片标记，用[图片]替代
-    text = re.sub(r"!\[.*?\]\(.*?\)", "[图片]", text)
-    
-    # 去除链接，保留链接文本
-    text = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", text)
-    
-    # 去除引用标记
-    text = re.sub(r"^>\s+", "", text, flags=re.M)
-    
-    # 去除分割线
-    text = re.sub(r"^-{3,}$", "", text, flags=re.M)
-    text = re.sub(r"^={3,}$", "", text, flags=re.M)
-    text = re.sub(r"^\*{3,}$", "", text, flags=re.M)
-    
-    # 去除列表标记
-    text = re.sub(r"^[\*\-+]\s+", "", text, flags=re.M)
-    text = re.sub(r"^\d+\.\s+", "", text, flags=re.M)
-    
-    return text.strip()
-
-
 @user_type_required(['student', 'admin'])
 def hot_topics_view(request):
     """热搜页面视图"""
-    # 获取所有热搜
-    topics = HotTopic.objects.all()
-
-    # 计算每个热搜的热度分数并按热度排序
-    topics_with_score = [(topic, topic.heat_score) for topic in topics]
+    # 由数据库根据热度汇总字段排序，取前10条热搜（置顶的在最前面）
+    top_topics = [(topic, topic.heat) for topic in hot_topics_by_heat()]
 
-    # 排序：置顶的在最前面，然后按热度分数降序排序
-    sorted_topics = sorted(
-        topics_with_score,
-        key=lambda x: (-x[0].is_pinned, -x[1])
-    )
-
-    # 取前10条热搜
-    top_topics = sorted_topics[:10]
+    # 获取最近热搜（按创建时间降序排序），按游标分页，每页10条
+    recent_topics = paginate_by_cursor(HotTopic.objects.all(), request.GET.get('cursor'))
 
-    # 获取用户已点赞的热搜ID列表
-    if request.user.is_authenticated:
-        user_liked_topics = list(HotTopicLike.objects.filter(
-            user=request.user
-        ).values_list('topic_id', flat=True))
-    else:
-        user_liked_topics = []
+    # 批量获取热门热搜和当前页最近热搜各自热度最高的评论
+    page_topics = [topic for topic, _ in top_topics] + list(recent_topics)
+    top_comments = top_comments_for_topics(page_topics)
 
-    # 获取最近热搜（按创建时间降序排序）
-    recent_topics_list = HotTopic.objects.all().order_by('-created_at')
+    # 只查询本页展示的热搜中用户点赞过的
+    user_liked_topics = liked_ids(HotTopicLike, request.user, 'topic_id', page_topics)
 
-    # 创建分页器，每页显示10条最近热搜
-    page = request.GET.get('page', 1)
-    paginator = Paginator(recent_topics_list, 10)
+    # 为每个热搜附上热度最高的评论
+    top_topics_with_top_comment = [
+        (topic, score, top_comments.get(topic.id), topic.comments_count)
+        for topic, score in top_topics
+    ]
 
-    try:
-        recent_topics = paginator.page(page)
-    except:
-        # 如果页码无效，返回第一页
-        recent_topics = paginator.page(1)
-
-    # 为每个热搜获取热度最高的评论
-    top_topics_with_top_comment = []
-    for topic, score in top_topics:
-        # 处理内容为纯文本
-        if topic.content:
-            topic.plain_content = strip_markdown(topic.content)
-            
-        comments = Comment.objects.filter(topic=topic, parent__isnull=True)
-        top_comment = None
-        if comments.exists():
-            # 计算每个评论的热度分数并按热度排序
-            comments_with_score = [(comment, comment.heat_score) for comment in comments]
-            sorted_comments = sorted(comments_with_score, key=lambda x: -x[1])
-            if sorted_comments:
-                top_comment = sorted_comments[0][0]
-                # 处理评论内容为纯文本
-                if top_comment.content:
-                    top_comment.plain_content = strip_markdown(top_comment.content)
-
-        top_topics_with_top_comment.append((topic, score, top_comment, topic.comments_count))
-
-    # 为最近热搜获取热度最高的评论
-    recent_topics_with_comment = []
-    for topic in recent_topics:
-        # 处理内容为纯文本
-        if topic.content:
-            topic.plain_content = strip_markdown(topic.content)
-            
-        comments = Comment.objects.filter(topic=topic, parent__isnull=True)
-        top_comment = None
-        if comments.exists():
-            # 计算每个评论的热度分数并按热度排序
-            comments_with_score = [(comment, comment.heat_score) for comment in comments]
-            sorted_comments = sorted(comments_with_score, key=lambda x: -x[1])
-            if sorted_comments:
-                top_comment = sorted_comments[0][0]
-                # 处理评论内容为纯文本
-                if top_comment.content:
-                    top_comment.plain_content = strip_markdown(top_comment.content)
-
-        recent_topics_with_comment.append({
+    # 为最近热搜附上热度最高的评论
+    recent_topics_with_comment = [
+        {
             'topic': topic,
-            'top_comment': top_comment,
+            'top_comment': top_comments.get(topic.id),
             'comments_count': topic.comments_count
-        })
+        }
+        for topic in recent_topics
+    ]
 
     context = {
         'top_topics': top_topics_with_top_comment,
@@ -1328,55 +1064,26 @@ def toggle_hot_topic_like(request):
 
 @user_type_required(['student', 'admin'])
 def get_recent_topics(request):
-    """AJAX获取最近热搜数据"""
+    """AJAX按游标分页获取最近热搜数据，cursor 为空时返回第一页"""
     try:
-        # 获取页码参数
-        page = request.GET.get('page', 1)
-
-        # 获取最近热搜（按创建时间降序排序）
-        recent_topics_list = HotTopic.objects.all().order_by('-created_at')
+        # 获取最近热搜（按创建时间降序排序），每页10条
+        recent_topics = paginate_by_cursor(
+            HotTopic.objects.all(), request.GET.get('cursor'), with_count=request.GET.get('count') == '1'
+        )
 
-        # 创建分页器
-        paginator = Paginator(recent_topics_list, 10)  # 每页10条
+        # 获取用户在当前页点赞过的热搜ID
+        user_liked_topics = liked_ids(HotTopicLike, request.user, 'topic_id', recent_topics)
 
-        try:
-            recent_topics = paginator.page(page)
-        except:
-            # 如果页码无效，返回第一页
-            recent_topics = paginator.page(1)
-
-        # 获取用户已点赞的热搜ID列表
-        if request.user.is_authenticated:
-            user_liked_topics = list(HotTopicLike.objects.filter(
-                user=request.user
-            ).values_list('topic_id', flat=True))
-        else:
-            user_liked_topics = []
-
-        # 为每个热搜获取热度最高的评论
-        recent_topics_with_comment = []
-        for topic in recent_topics:
-            # 处理内容为纯文本
-            if topic.content:
-                topic.plain_content = strip_markdown(topic.content)
-                
-            comments = Comment.objects.filter(topic=topic, parent__isnull=True)
-            top_comment = None
-            if comments.exists():
-                # 计算每个评论的热度分数并按热度排序
-                comments_with_score = [(comment, comment.heat_score) for comment in comments]
-                sorted_comments = sorted(comments_with_score, key=lambda x: -x[1])
-                if sorted_comments:
-                    top_comment = sorted_comments[0][0]
-                    # 处理评论内容为纯文本
-                    if top_comment.content:
-                        top_comment.plain_content = strip_markdown(top_comment.content)
-
-            recent_topics_with_comment.append({
+        # 批量获取每个热搜热度最高的评论
+        top_comments = top_comments_for_topics(recent_topics)
+        recent_topics_with_comment = [
+            {
                 'topic': topic,
-                'top_comment': top_comment,
+                'top_comment': top_comments.get(topic.id),
                 'comments_count': topic.comments_count
-            })
+            }
+            for topic in recent_topics
+        ]
 
         # 渲染部分模板
         html_content = render(request, 'partials/recent_topics.html', {
@@ -1390,8 +1097,9 @@ def get_recent_topics(request):
             'html': html_content,
             'has_next': recent_topics.has_next(),
             'has_previous': recent_topics.has_previous(),
-            'total_pages': paginator.num_pages,
-            'current_page': recent_topics.number
+            'next_cursor': recent_topics.next_cursor,
+            'previous_cursor': recent_topics.previous_cursor,
+            'total_count': recent_topics.count
         })
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
@@ -1446,7 +1154,7 @@ def get_admin_students(request):
         # 渲染部分模板
         html_content = render(request, 'partials/admin_students.html', {
             'students': students,
-            'total_students': students_list.count()
+            'total_students': paginator.count
         }).content.decode('utf-8')
 
         return JsonResponse({
@@ -1485,7 +1193,7 @@ def get_admin_teachers(request):
         # 渲染部分模板
         html_content = render(request, 'partials/admin_teachers.html', {
             'teachers': teachers,
-            'total_teachers': teachers_list.count()
+            'total_teachers': paginator.count
         }).content.decode('utf-8')
 
         return JsonResponse({
@@ -1510,7 +1218,7 @@ def get_admin_assignments(request):
         page = request.GET.get('page', 1)
 
         # 获取作业列表数据
-        assignments_list = Assignment.objects.all().order_by('-created_at')
+        assignments_list = Assignment.objects.with_completion_stats().order_by('-created_at')
 
         # 创建分页器
         paginator = Paginator(assignments_list, 10)  # 每页10条
@@ -1521,28 +1229,10 @@ def get_admin_assignments(request):
             # 如果页码无效，返回第一页
             assignments = paginator.page(1)
 
-        # 预先计算每个作业的完成情况
-        for assignment in assignments:
-            # 计算完成的学生数量
-            completed_count = CompletionRecord.objects.filter(
-                assignment=assignment,
-                completed=True
-            ).count()
-
-            # 计算总学生数量
-            total_count = CompletionRecord.objects.filter(
-                assignment=assignment
-            ).count()
-
-            # 添加到作业对象中
-            assignment.completed_count = completed_count
-            assignment.total_count = total_count
-            assignment.completion_percentage = 0 if total_count == 0 else int((completed_count / total_count) * 100)
-
         # 渲染部分模板
         html_content = render(request, 'partials/admin_assignments.html', {
             'assignments': assignments,
-            'total_assignments': assignments_list.count()
+            'total_assignments': paginator.count
         }).content.decode('utf-8')
 
         return JsonResponse({
@@ -1577,19 +1267,11 @@ def hot_topic_detail_view(request, topic_id):
     else:
         topic.html_content = ""
 
-    # 获取用户已点赞的热搜ID列表
-    if request.user.is_authenticated:
-        user_liked_topics = list(HotTopicLike.objects.filter(
-            user=request.user
-        ).values_list('topic_id', flat=True))
+    # 获取用户是否点赞了该热搜
+    user_liked_topics = liked_ids(HotTopicLike, request.user, 'topic_id', [topic])
 
-        # 获取用户已点赞的评论ID列表
-        user_liked_comments = list(CommentLike.objects.filter(
-            user=request.user
-        ).values_list('comment_id', flat=True))
-    else:
-        user_liked_topics = []
-        user_liked_comments = []
+    # 评论通过AJAX分页加载，点赞状态在各评论接口中查询
+    user_liked_comments = set()
 
     context = {
         'topic': topic,
@@ -1771,6 +1453,24 @@ def toggle_comment_like(request):
     return JsonResponse({'success': False, 'message': '请求方法错误'})
 
 
+def attach_html_content(comments):
+    """批量渲染评论的Markdown内容，结果保存在每个评论的 html_content 属性中"""
+    comments = list(comments)
+    for comment, html in zip(comments, render_many(comment.content for comment in comments)):
+        comment.html_content = html
+
+
+def liked_ids(like_model, user, field, objects):
+    """查询用户在给定对象中点赞过的ID集合
+
+    只按当前页对象的ID查询点赞记录，结果为集合，模板中的 in 判断是常数时间。
+    """
+    ids = {obj.id for obj in objects}
+    if not ids or not user.is_authenticated:
+        return set()
+    return set(like_model.objects.filter(user=user, **{f'{field}__in': ids}).values_list(field, flat=True))
+
+
 @user_type_required(['student', 'admin'])
 def get_hot_comments(request):
     """获取热门评论（按热度排序的前5条）"""
@@ -1779,32 +1479,17 @@ def get_hot_comments(request):
     try:
         topic = HotTopic.objects.get(id=topic_id)
 
-        # 只获取顶级评论（非回复）
-        comments = Comment.objects.filter(
+        # 只获取顶级评论（非回复），按排序分数（与热度顺序一致）取前5条热门评论
+        hot_comments = list(Comment.objects.with_engagement().filter(
             topic=topic,
             parent__isnull=True
-        )
-
-        # 计算每个评论的热度分数并按热度排序
-        comments_with_score = [(comment, comment.heat_score) for comment in comments]
-
-        # 按热度分数降序排序
-        sorted_comments = sorted(comments_with_score, key=lambda x: -x[1])
-
-        # 取前5条热门评论
-        hot_comments = [comment for comment, _ in sorted_comments[:5]]
+        ).order_by('-rank_score', '-created_at')[:5])
         
         # 为每个评论添加HTML内容（Markdown渲染）
-        for comment in hot_comments:
-            comment.html_content = convert_markdown_to_html(comment.content)
-
-        # 获取用户已点赞的评论ID列表
-        if request.user.is_authenticated:
-            user_liked_comments = list(CommentLike.objects.filter(
-                user=request.user
-            ).values_list('comment_id', flat=True))
-        else:
-            user_liked_comments = []
+        attach_html_content(hot_comments)
+
+        # 获取用户在这些评论中点赞过的ID
+        user_liked_comments = liked_ids(CommentLike, request.user, 'comment_id', hot_comments)
 
         # 渲染部分模板
         html_content = render(request, 'partials/hot_comments.html', {
@@ -1823,39 +1508,28 @@ def get_hot_comments(request):
 
 @user_type_required(['student', 'admin'])
 def get_comments(request):
-    """分页获取所有评论"""
+    """按游标分页获取所有评论，cursor 为空时返回第一页，count=1 时额外返回评论总数"""
     topic_id = request.GET.get('topic_id')
-    page = request.GET.get('page', 1)
 
     try:
         topic = HotTopic.objects.get(id=topic_id)
 
         # 获取顶级评论（非回复）
-        comments_list = Comment.objects.filter(
+        comments_list = Comment.objects.with_engagement().filter(
             topic=topic,
             parent__isnull=True
-        ).order_by('-created_at')
+        )
 
-        # 创建分页器
-        paginator = Paginator(comments_list, 10)  # 每页10条评论
+        # 游标分页，每页10条评论
+        comments = paginate_by_cursor(
+            comments_list, request.GET.get('cursor'), with_count=request.GET.get('count') == '1'
+        )
 
-        try:
-            comments = paginator.page(page)
-        except:
-            # 如果页码无效，返回第一页
-            comments = paginator.page(1)
-            
         # 为每个评论添加HTML内容（Markdown渲染）
-        for comment in comments:
-            comment.html_content = convert_markdown_to_html(comment.content)
-
-        # 获取用户已点赞的评论ID列表
-        if request.user.is_authenticated:
-            user_liked_comments = list(CommentLike.objects.filter(
-                user=request.user
-            ).values_list('comment_id', flat=True))
-        else:
-            user_liked_comments = []
+        attach_html_content(comments)
+
+        # 获取用户在这些评论中点赞过的ID
+        user_liked_comments = liked_ids(CommentLike, request.user, 'comment_id', comments)
 
         # 渲染部分模板
         html_content = render(request, 'partials/comments.html', {
@@ -1869,9 +1543,9 @@ def get_comments(request):
             'html': html_content,
             'has_previous': comments.has_previous(),
             'has_next': comments.has_next(),
-            'current_page': comments.number,
-            'total_pages': paginator.num_pages,
-            'page_range': list(paginator.page_range)
+            'previous_cursor': comments.previous_cursor,
+            'next_cursor': comments.next_cursor,
+            'total_count': comments.count
         })
     except HotTopic.DoesNotExist:
         return JsonResponse({'success': False, 'message': '热搜不存在'})
@@ -1886,19 +1560,13 @@ def get_replies(request):
         comment = Comment.objects.get(id=comment_id)
 
         # 获取所有回复，按创建时间排序
-        replies = Comment.objects.filter(parent=comment).order_by('created_at')
-        
+        replies = list(Comment.objects.with_engagement().filter(parent=comment).order_by('created_at'))
+
         # 为每个回复添加HTML内容（Markdown渲染）
-        for reply in replies:
-            reply.html_content = convert_markdown_to_html(reply.content)
-
-        # 获取用户已点赞的评论ID列表
-        if request.user.is_authenticated:
-            user_liked_comments = list(CommentLike.objects.filter(
-                user=request.user
-            ).values_list('comment_id', flat=True))
-        else:
-            user_liked_comments = []
+        attach_html_content(replies)
+
+        # 获取用户在这些评论中点赞过的ID
+        user_liked_comments = liked_ids(CommentLike, request.user, 'comment_id', replies)
 
         # 渲染部分模板
         html_content = render(request, 'partials/replies.html', {
@@ -1939,137 +1607,6 @@ def delete_hot_topic_comment(request):
     return JsonResponse({'success': False, 'message': '请求方法错误'})
 
 
-def convert_markdown_to_html(text):
-    """将Markdown文本转换为HTML，包括数学公式支持和HTML净化"""
-    if not text:
-        return ""
-    
-    # 文本过长可能导致内存问题，添加长度限制
-    MAX_TEXT_LENGTH = 50000  # 设置一个合理的最大长度
-    if len(text) > MAX_TEXT_LENGTH:
-        text = text[:MAX_TEXT_LENGTH] + "\n\n**内容过长，已截断显示**"
-        
-    try:
-        # 定义允许的HTML标签和属性
-        allowed_tags = [
-            'a', 'abbr', 'acronym', 'b', 'blockquote', 'br', 'code', 'div', 'em', 
-            'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'i', 'img', 'li', 'ol', 'p', 
-            'pre', 'span', 'strong', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'ul'
-        ]
-        
-        allowed_attrs = {
-            'a': ['href', 'title', 'class', 'rel'],
-            'abbr': ['title'],
-            'acronym': ['title'],
-            'div': ['class', 'id', 'style'],
-            'h1': ['id', 'class'],
-            'h2': ['id', 'class'],
-            'h3': ['id', 'class'],
-            'h4': ['id', 'class'],
-            'h5': ['id', 'class'],
-            'h6': ['id', 'class'],
-            'img': ['src', 'alt', 'title', 'class', 'align'],
-            'li': ['class'],
-            'ol': ['class'],
-            'p': ['class'],
-            'pre': ['class'],
-            'span': ['class', 'style'],
-            'table': ['class', 'border'],
-            'td': ['class', 'colspan', 'rowspan'],
-            'th': ['class', 'colspan', 'rowspan', 'scope'],
-            'ul': ['class']
-        }
-        
-        # 定义安全的URL协议
-        allowed_protocols = ['http', 'https', 'mailto', 'tel']
-        
-        # 使用markdown库转换基本markdown语法
-        md = markdown.Markdown(extensions=[
-            'markdown.extensions.extra',
-            'markdown.extensions.codehilite',
-            'markdown.extensions.toc',
-        ])
-        
-        # 先转换为HTML
-        html = md.convert(text)
-        
-        # 检测是否启用简单模式（当检测到服务器内存压力大时使用）
-        USE_SIMPLE_MODE = False
-        
-        # 安全替换函数，处理可能过长的公式
-        def safe_formula_replace(match):
-            formula = match.group(1).strip()
-            # 限制公式长度
-            if len(formula) > 500:
-                return '<div class="alert alert-warning">公式过长，无法显示</div>'
-                
-            if USE_SIMPLE_MODE:
-                # 简单模式：直接显示代码格式的公式
-                return f'<div class="math-block"><code>$${formula}$$</code></div>'
-                
-            try:
-                # 对公式进行URL编码，确保特殊字符能正确传递
-                import urllib.parse
-                encoded_formula = urllib.parse.quote(formula)
-                return f'<div><img align="center" src="https://latex.codecogs.com/svg.latex?{encoded_formula}" class="math-formula"></div>'
-            except Exception:
-                return f'<div class="math-block"><code>$${formula}$$</code></div>'
-        
-        def safe_inline_formula_replace(match):
-            formula = match.group(1).strip()
-            # 限制公式长度
-            if len(formula) > 300:
-                return '<span class="text-warning">公式过长</span>'
-                
-            if USE_SIMPLE_MODE:
-                # 简单模式：直接显示代码格式的公式
-                return f'<code>${formula}$</code>'
-                
-            try:
-                # 对公式进行URL编码，确保特殊字符能正确传递
-                import urllib.parse
-                encoded_formula = urllib.parse.quote(formula)
-                return f'<img align="center" alt="${formula}$" src="https://latex.codecogs.com/svg.latex?{encoded_formula}" class="math-formula inline">'
-            except Exception:
-                return f'<code>${formula}$</code>'
-        
-        # 使用正则表达式一次性替换所有公式，避免多次字符串替换操作
-        # 处理行间公式：$$...$$（限制最多处理10个公式，避免内存问题）
-        html = re.sub(
-            r"\$\$(.*?)\$\$", 
-            safe_formula_replace, 
-            html, 
-            count=20,  # 限制替换次数
-            flags=re.S
-        )
-        
-        # 处理行内公式：$...$（限制最多处理20个公式，避免内存问题）
-        html = re.sub(
-            r"\$(.*?)\$", 
-            safe_inline_formula_replace, 
-            html, 
-            count=40,  # 限制替换次数
-            flags=re.S
-        )
-        
-        # 使用bleach库净化HTML内容
-        cleaned_html = bleach.clean(
-            html,
-            tags=allowed_tags,
-            attributes=allowed_attrs,
-            protocols=allowed_protocols,
-            strip=True
-        )
-        
-        return cleaned_html
-    except MemoryError:
-        # 捕获内存错误，返回简化版本
-        return f"<p>内容过于复杂，无法渲染。原文：</p><pre>{text[:200]}...</pre>"
-    except Exception as e:
-        # 捕获其他错误
-        return f"<p>渲染失败：{str(e)}</p><pre>{text[:200]}...</pre>"
-
-
 @login_required
 def user_notifications(request):
     """用户通知页面"""
@@ -2081,31 +1618,12 @@ def user_notifications(request):
     replies = notifications.filter(type='reply').order_by('-created_at')
     system = notifications.filter(type='system').order_by('-created_at')
     
-    # 分页处理
-    paginator_likes = Paginator(likes, 10)
-    paginator_replies = Paginator(replies, 10)
-    paginator_system = Paginator(system, 10)
-    
-    page = request.GET.get('page', 1)
-    
-    try:
-        likes_page = paginator_likes.page(page)
-        replies_page = paginator_replies.page(page)
-        system_page = paginator_system.page(page)
-    except PageNotAnInteger:
-        likes_page = paginator_likes.page(1)
-        replies_page = paginator_replies.page(1)
-        system_page = paginator_system.page(1)
-    except EmptyPage:
-        likes_page = paginator_likes.page(paginator_likes.num_pages)
-        replies_page = paginator_replies.page(paginator_replies.num_pages)
-        system_page = paginator_system.page(paginator_system.num_pages)
-    
+    # 每类通知只显示第一页，之后通过“加载更多”按游标获取
     context = {
-        'likes': likes_page,
-        'replies': replies_page,
-        'system': system_page,
-        'unread_count': notifications.filter(is_read=False).count()
+        'likes': paginate_by_cursor(likes),
+        'replies': paginate_by_cursor(replies),
+        'system': paginate_by_cursor(system),
+        'unread_count': count_unread(request.user.id)
     }
     
     return render(request, 'notifications.html', context)
@@ -2115,6 +1633,9 @@ def user_notifications(request):
 def mark_notifications_read(request, notification_type=None):
     """标记通知为已读"""
     if request.method == 'POST':
+        if notification_type and notification_type not in NOTIFICATION_TYPES:
+            return JsonResponse({'status': 'error', 'message': '无效的通知类型'})
+
         if notification_type:
             # 标记特定类型的通知为已读
             Notification.objects.filter(
@@ -2129,6 +1650,10 @@ def mark_notifications_read(request, notification_type=None):
                 is_read=False
             ).update(is_read=True)
         
+        # update() 不会发送信号，需要手动更新未读计数器并唤醒未读数长轮询
+        refresh_unread_counters(request.user.id, [notification_type] if notification_type else None)
+        notify_unread_changed(request.user.id)
+        
         return JsonResponse({'status': 'success'})
     
     return JsonResponse({'status': 'error', 'message': '仅支持POST请求'})
@@ -2140,8 +1665,47 @@ def unread_notifications_count(request):
     if request.user.user_type not in ['student', 'admin']:
         return JsonResponse({'count': 0})
     
-    count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-    return JsonResponse({'count': count})
+    return JsonResponse({'count': count_unread(request.user.id)})
+
+
+async def unread_notifications_poll(request):
+    """长轮询获取未读通知数量
+
+    since 为前端已知的未读数，数量变化时立即返回，否则在ASGI下挂起等待变化。
+    返回的 push 表示是否支持挂起等待，为 False 时前端改为定时轮询 unread_notifications_count。
+    """
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None or user.user_type not in ['student', 'admin']:
+        return JsonResponse({'count': 0, 'push': False})
+
+    if not isinstance(request, ASGIRequest):
+        # WSGI 下挂起会占用工作线程，直接返回当前值
+        count = await sync_to_async(count_unread)(user.id)
+        return JsonResponse({'count': count, 'push': False})
+
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+    count = await wait_for_unread_count(user.id, since)
+    return JsonResponse({'count': count, 'push': True})
+
+
+def get_client_ip(request):
+    """从请求中取得客户端IP，格式无效时返回 127.0.0.1"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0].strip()
+    else:
+        ip = request.META.get('REMOTE_ADDR', '127.0.0.1')  # 默认为本地IP
+
+    # 确保IP地址有效
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        print(f"IP地址格式无效: {ip}，使用默认IP")
+        ip = '127.0.0.1'
+    return ip
 
 
 def record_device_login(request, user):
@@ -2149,25 +1713,40 @@ def record_device_login(request, user):
     if not request:
         print("请求对象为空，无法记录设备信息")
         return
-    
+    return save_device_login(user, get_client_ip(request), request.META.get('HTTP_USER_AGENT', ''))
+
+
+def enqueue_device_login(request, user):
+    """在后台记录设备登录，登录请求不必等待User-Agent解析、IP位置查询和数据库写入
+
+    请求中只取出IP和User-Agent，事务提交后（保证新注册的用户已经写入）交给后台队列处理。
+    队列已满时在当前请求中记录，但跳过耗时的IP位置查询。
+    """
+    ip = get_client_ip(request)
+    user_agent_string = request.META.get('HTTP_USER_AGENT', '')
+    login_time = timezone.now()
+
+    def submit():
+        if not device_login_queue().submit(process_device_login, user.id, ip, user_agent_string, login_time):
+            print(f"设备登录队列已满，直接记录: 用户={user.username}")
+            save_device_login(user, ip, user_agent_string, login_time, lookup_location=False)
+
+    transaction.on_commit(submit)
+
+
+def process_device_login(user_id, ip, user_agent_string, login_time):
+    """后台队列中的任务：记录设备登录信息并创建系统通知，记录失败时抛出异常以计入队列的失败数"""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return False
+    if not save_device_login(user, ip, user_agent_string, login_time):
+        raise RuntimeError(f"设备登录记录失败: 用户ID={user_id}")
+    return True
+
+
+def save_device_login(user, ip, user_agent_string, login_time=None, lookup_location=True):
+    """解析User-Agent、查询IP位置，保存设备登录记录并创建系统通知"""
     try:
-        # 获取IP地址
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')  # 默认为本地IP
-        
-        # 确保IP地址有效
-        try:
-            # 验证IP地址格式
-            ipaddress.ip_address(ip)
-        except ValueError:
-            print(f"IP地址格式无效: {ip}，使用默认IP")
-            ip = '127.0.0.1'
-        
-        # 解析User-Agent
-        user_agent_string = request.META.get('HTTP_USER_AGENT', '')
         print(f"收到的User-Agent: {user_agent_string}")
         
         try:
@@ -2194,7 +1773,7 @@ def record_device_login(request, user):
             device_type = "未知类型"
         
         # 获取位置信息
-        location = get_location_from_ip(ip)
+        location = get_location_from_ip(ip) if lookup_location else "未知位置"
         print(f"IP地址 {ip} 的位置: {location}")
         
         # 创建设备登录记录
@@ -2207,6 +1786,10 @@ def record_device_login(request, user):
             user_agent=user_agent_string[:500] if user_agent_string else "无设备信息",  # 限制长度
             location=location
         )
+        if login_time is not None:
+            # 后台处理时 login_time 为用户实际登录的时间，而不是处理任务的时间
+            DeviceLogin.objects.filter(id=device_login.id).update(login_time=login_time)
+            device_login.login_time = login_time
         
         # 创建系统通知
         login_time = device_login.login_time.strftime('%Y-%m-%d %H:%M:%S')
@@ -2256,6 +1839,7 @@ def test_device_detection(request):
         },
         "User_Agent": request.META.get('HTTP_USER_AGENT', '无'),
         "设备记录结果": "成功" if result else "失败",
+        "后台登录队列": device_login_queue().stats(),
         "当前IP": ip,
         "当前位置": location,
         "最近设备记录": []
@@ -2277,38 +1861,9 @@ def test_device_detection(request):
 def get_location_from_ip(ip):
     """
     通过IP地址获取地理位置信息
-    使用免费的IP-API服务
+    优先查询本地IP段数据库，ip-api.com 仅作为可选的后备（见 board/geoip.py）
     """
-    if not ip or ip == '127.0.0.1' or ip.startswith('192.168.') or ip.startswith('10.'):
-        return "本地网络"
-    
-    try:
-        # 使用IP-API的免费服务，不需要API密钥
-        response = requests.get(f'http://ip-api.com/json/{ip}?lang=zh-CN', timeout=5)
-        data = response.json()
-        
-        if data['status'] == 'success':
-            # 返回城市和国家/地区
-            city = data.get('city', '')
-            country = data.get('country', '')
-            region = data.get('regionName', '')
-            
-            location_parts = []
-            if country:
-                location_parts.append(country)
-            if region and region != city:  # 避免重复显示相同的城市和地区名
-                location_parts.append(region)
-            if city:
-                location_parts.append(city)
-                
-            location = ' '.join(location_parts)
-            return location or "未知位置"
-        else:
-            print(f"IP位置查询失败: {data.get('message', '未知错误')}")
-            return "未知位置"
-    except Exception as e:
-        print(f"IP位置查询异常: {str(e)}")
-        return "未知位置"
+    return get_geolocator().locate(ip)
 
 
 @user_type_required(['student', 'admin'])
@@ -2335,8 +1890,8 @@ def ratings_list(request):
         # 按评价人数排序
         ratings = sorted(ratings, key=lambda x: x.ratings_count, reverse=True)
     elif sort_by == 'hot':
-        # 按热度排序
-        ratings = sorted(ratings, key=lambda x: x.heat_score, reverse=True)
+        # 按热度排序，排序分数与热度的顺序一致，由数据库完成排序
+        ratings = ratings.order_by('-rank_score', '-created_at')
     
     # 分页处理
     paginator = Paginator(ratings, 9)  # 每页显示9条评分
@@ -2367,16 +1922,13 @@ def rating_detail(request, rating_id):
     if request.user.is_authenticated:
         user_rating = UserRating.objects.filter(rating=rating, user=request.user).first()
     
-    # 获取该评分项目的所有评论，按热度排序
-    comments = RatingComment.objects.filter(rating=rating, parent=None).order_by('-created_at')
-    
-    # 为每条评论转换Markdown格式
-    for comment in comments:
-        comment.html_content = convert_markdown_to_html(comment.content)
+    # 获取该评分项目的所有评论
+    comments = RatingComment.objects.with_engagement().with_liked_by(request.user).filter(
+        rating=rating, parent=None
+    ).prefetch_related(
+        Prefetch('replies', queryset=RatingComment.objects.with_engagement().with_liked_by(request.user))
+    ).order_by('-created_at')
 
-    # 转换评分详情的Markdown
-    rating.html_description = convert_markdown_to_html(rating.description)
-    
     # 分页
     paginator = Paginator(comments, 10)  # 每页10条评论
     page = request.GET.get('page')
@@ -2387,6 +1939,10 @@ def rating_detail(request, rating_id):
         comments = paginator.page(1)
     except EmptyPage:
         comments = paginator.page(paginator.num_pages)
+
+    # 转换评分详情的Markdown，评论只渲染当前页
+    rating.html_description = convert_markdown_to_html(rating.description)
+    attach_html_content(comments)
     
     # 计算评分分布
     score_distribution = []
@@ -2633,22 +2189,18 @@ def delete_rating(request, rating_id):
 
 @login_required
 def get_notifications_ajax(request):
-    """AJAX获取通知数据"""
+    """AJAX按游标分页获取通知数据，cursor 为上一次返回的 next_cursor"""
     notification_type = request.GET.get('type', 'like')
-    page = request.GET.get('page', 1)
     
     # 获取用户的通知
-    notifications = Notification.objects.filter(recipient=request.user, type=notification_type).order_by('-created_at')
-    
-    # 分页处理
-    paginator = Paginator(notifications, 10)  # 每页10条
+    notifications = Notification.objects.filter(
+        recipient=request.user, type=notification_type
+    ).select_related('sender')
     
-    try:
-        notifications_page = paginator.page(page)
-    except PageNotAnInteger:
-        notifications_page = paginator.page(1)
-    except EmptyPage:
-        notifications_page = paginator.page(paginator.num_pages)
+    # 游标分页，每页10条
+    notifications_page = paginate_by_cursor(
+        notifications, request.GET.get('cursor'), with_count=request.GET.get('count') == '1'
+    )
     
     # 准备返回的数据
     notifications_data = []
@@ -2659,8 +2211,8 @@ def get_notifications_ajax(request):
             'is_read': notification.is_read,
             'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M'),
             'sender_username': notification.sender.username if notification.sender else '系统',
-            'comment_id': notification.comment.id if notification.comment else None,
-            'topic_id': notification.topic.id if notification.topic else None,
+            'comment_id': notification.comment_id,
+            'topic_id': notification.topic_id,
         }
         notifications_data.append(notification_data)
     
@@ -2668,6 +2220,7 @@ def get_notifications_ajax(request):
         'notifications': notifications_data,
         'has_next': notifications_page.has_next(),
         'has_previous': notifications_page.has_previous(),
-        'current_page': notifications_page.number,
-        'total_pages': paginator.num_pages,
+        'next_cursor': notifications_page.next_cursor,
+        'previous_cursor': notifications_page.previous_cursor,
+        'total_count': notifications_page.count,
     })
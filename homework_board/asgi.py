@@ -3,6 +3,9 @@ ASGI config for homework_board project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+通过ASGI服务器（如 uvicorn、daphne）部署时，未读通知的长轮询接口会在事件循环中挂起等待，
+不占用工作线程；WSGI 部署下该接口立即返回，前端退回到定时轮询。
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -133,3 +133,31 @@ AUTH_USER_MODEL = 'board.User'
 LOGIN_URL = 'login'  # 使用主登录页面
 LOGIN_REDIRECT_URL = 'dashboard'  # 登录成功后重定向到仪表盘
 LOGOUT_REDIRECT_URL = 'login'  # 登出后重定向到登录页面
+
+# 稀疏完成记录模式：只保存已完成或被学生切换过的记录，未完成状态由缺少记录推导
+# 启用后请运行 python manage.py compact_completion_records 清理已有的默认记录
+SPARSE_COMPLETION_RECORDS = False
+
+# 批量渲染Markdown时使用的工作进程数，0表示在当前进程中渲染。
+# 评论较多的页面首次渲染时可以分发到多个进程并行处理（渲染结果会被缓存，之后不再重复渲染）
+MARKDOWN_RENDER_WORKERS = 0
+
+# 用户最后活动时间暂存在各进程的内存中，最迟每隔多少秒批量写入一次数据库（由后台定时器触发），
+# 0表示每次记录都立即写入。其他进程判断在线状态时最多滞后这么长时间
+ACTIVITY_FLUSH_INTERVAL = 30
+
+# 登录后在后台记录设备信息（解析User-Agent、查询IP位置）的线程数和队列长度。
+# 线程数设为 0 时在请求中同步记录
+DEVICE_LOGIN_WORKERS = 2
+DEVICE_LOGIN_QUEUE_SIZE = 1000
+
+# IP地理位置查询：本地IP段数据库（用 python manage.py import_ip_ranges 生成，文件不存在时跳过），
+# 本地查不到时是否改用 ip-api.com 在线查询（默认关闭，开启后每个未缓存的公网IP都会发起一次网络请求），
+# 查询结果的缓存条数，以及查不到位置的地址缓存多少秒后重新查询
+GEOIP_DATABASE = os.path.join(BASE_DIR, 'data', 'ip_ranges.csv')
+GEOIP_HTTP_FALLBACK = False
+GEOIP_CACHE_SIZE = 4096
+GEOIP_MISS_CACHE_TTL = 300
+
+# 今日作业文本缓存使用默认缓存（进程内存）。多进程部署时建议配置共享缓存（如数据库缓存或Redis），
+# 否则一个进程中的数据变化无法使其他进程的缓存失效，只能等待缓存过期
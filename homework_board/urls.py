@@ -18,6 +18,7 @@ from django.conf.urls import url
 from django.contrib import admin
 from django.urls import path
 from django.views import static
+from django.views.decorators.cache import cache_control
 
 from board import views
 from homework_board import settings
@@ -59,6 +60,7 @@ urlpatterns = [
     path("api/notifications/mark-read/", views.mark_notifications_read, name="mark_notifications_read"),
     path("api/notifications/mark-read/<str:notification_type>/", views.mark_notifications_read, name="mark_notifications_read_by_type"),
     path("api/notifications/unread-count/", views.unread_notifications_count, name="unread_notifications_count"),
+    path("api/notifications/unread-poll/", views.unread_notifications_poll, name="unread_notifications_poll"),
     path("api/notifications/get/", views.get_notifications_ajax, name="get_notifications_ajax"),
 
     path("api/toggle-assignment/", views.toggle_assignment_completion, name="toggle_assignment"),
@@ -70,6 +72,8 @@ urlpatterns = [
     path("api/subject-suggestions/", views.subject_suggestions, name="subject_suggestions"),
     path("api/cleanup-old-assignments/", views.cleanup_old_assignments, name="cleanup_old_assignments"),
     path("api/get_today_homework/", views.get_today_homework, name="get_today_homework"),
+    path("api/tokens/issue/", views.issue_api_token, name="issue_api_token"),
+    path("api/tokens/revoke/", views.revoke_api_token, name="revoke_api_token"),
     path("api/hot-topics/create/", views.create_hot_topic, name="create_hot_topic"),
     path("api/hot-topics/delete/", views.delete_hot_topic, name="delete_hot_topic"),
     path("api/hot-topics/pin/", views.pin_hot_topic, name="pin_hot_topic"),
@@ -84,5 +88,9 @@ urlpatterns = [
     path("api/admin/students/", views.get_admin_students, name="get_admin_students"),
     path("api/admin/teachers/", views.get_admin_teachers, name="get_admin_teachers"),
     path("api/admin/assignments/", views.get_admin_assignments, name="get_admin_assignments"),
+    # KaTeX等第三方库的文件不会修改，允许浏览器长期缓存，公式渲染不再依赖外部服务
+    url(r'^static/(?P<path>(?:js|css)/katex/.*)$',
+        cache_control(public=True, max_age=31536000, immutable=True)(static.serve),
+        {'document_root': settings.STATIC_ROOT}, name='static_vendor'),
     url(r'^static/(?P<path>.*)$', static.serve, {'document_root': settings.STATIC_ROOT}, name='static'),
 ]
@@ -0,0 +1,31 @@
+// 使用本地的KaTeX渲染服务端输出的公式（带 math-formula 类的元素），
+// 包括之后通过AJAX加载的评论和回复
+(function () {
+    function renderFormulas(root) {
+        if (typeof katex === 'undefined' || !root.querySelectorAll) {
+            return;
+        }
+        root.querySelectorAll('.math-formula:not([data-rendered])').forEach(function (element) {
+            element.setAttribute('data-rendered', 'true');
+            katex.render(element.textContent, element, {
+                displayMode: !element.classList.contains('inline'),
+                throwOnError: false
+            });
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        renderFormulas(document);
+
+        // 评论等内容通过AJAX插入页面后也需要渲染其中的公式
+        new MutationObserver(function (mutations) {
+            mutations.forEach(function (mutation) {
+                mutation.addedNodes.forEach(function (node) {
+                    if (node.nodeType === Node.ELEMENT_NODE && node.parentNode) {
+                        renderFormulas(node.parentNode);
+                    }
+                });
+            });
+        }).observe(document.body, { childList: true, subtree: true });
+    });
+})();